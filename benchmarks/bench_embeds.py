@@ -0,0 +1,73 @@
+"""
+Benchmarks EmbedService against the in-memory DatabaseManager.
+
+    python -m benchmarks.bench_embeds --guilds 50 --embeds 10 --latency-ms 2
+"""
+import asyncio
+
+from benchmarks.harness import build_parser, drain, make_manager, measure, print_report
+from cogs.EmbedBuilder.services.embed_service import EmbedService
+from config import EMBEDS_COLLECTION
+from settings_cache import GuildSettingsCache
+
+def _config(guild: int, embed: int, buttons: int) -> dict:
+    return {
+        "title": f"Embed {embed}",
+        "description": "Benchmark embed " * 20,
+        "color": "#5865F2",
+        "buttons": [
+            {"label": f"Button {index}", "custom_id": f"g{guild}-e{embed}-b{index}", "style": "primary", "actions": []}
+            for index in range(buttons)
+        ],
+    }
+
+async def full_document_button_lookup(db, guild_id: str, custom_id: str):
+    """The previous get_button_config: decodes the whole embeds document to find one button. Kept as a baseline."""
+    doc = await db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
+    for embed_name, embed_data in (doc or {}).get("embeds", {}).items():
+        for button in embed_data.get("config", {}).get("buttons", []):
+            if button.get("custom_id") == custom_id:
+                return button, embed_name
+    return None
+
+async def main():
+    parser = build_parser("Benchmark EmbedService against the in-memory DatabaseManager.")
+    parser.add_argument("--guilds", type=int, default=20, help="Guilds to seed (default: 20).")
+    parser.add_argument("--embeds", type=int, default=10, help="Embeds per guild (default: 10).")
+    parser.add_argument("--buttons", type=int, default=3, help="Buttons per embed (default: 3).")
+    args = parser.parse_args()
+
+    db = make_manager(args)
+    service = EmbedService(db, GuildSettingsCache(db))
+    await db.ensure_indexes()
+    for guild in range(args.guilds):
+        for embed in range(args.embeds):
+            # Every other embed has no buttons, so the persistent view scan has something to filter
+            await service.save_embed_config(str(guild), f"embed{embed}", _config(guild, embed, args.buttons if embed % 2 == 0 else 0))
+
+    def guild_id(run: int) -> str:
+        return str(run % args.guilds)
+
+    last_embed = f"embed{(args.embeds - 1) // 2 * 2}"
+    last_button = lambda run: f"g{guild_id(run)}-e{(args.embeds - 1) // 2 * 2}-b{args.buttons - 1}"
+
+    results = [
+        await measure(db, "iter_embeds_with_buttons (all guilds)", lambda run: drain(service.iter_embeds_with_buttons()), args.repeat),
+        await measure(db, "get_guild_embeds", lambda run: service.get_guild_embeds(guild_id(run)), args.repeat),
+        await measure(db, "get_embed_config", lambda run: service.get_embed_config(guild_id(run), "embed0"), args.repeat),
+        await measure(db, "get_button_config (last button)",
+                      lambda run: service.get_button_config(guild_id(run), last_button(run)), args.repeat),
+        await measure(db, "get_button_config (full document)",
+                      lambda run: full_document_button_lookup(db, guild_id(run), last_button(run)), args.repeat),
+        await measure(db, "save_embed_config",
+                      lambda run: service.save_embed_config(guild_id(run), "embed0", _config(run, 0, args.buttons)), args.repeat),
+        await measure(db, "save_button_action",
+                      lambda run: service.save_button_action(guild_id(run), last_embed, last_button(run), {"type": "add_role", "role_id": run}),
+                      args.repeat),
+        await measure(db, "attach_channel", lambda run: service.attach_channel(guild_id(run), "embed0", 1000 + run), args.repeat),
+        await measure(db, "detach_channel", lambda run: service.detach_channel(guild_id(run), "embed0", 1000 + run), args.repeat),
+    ]
+    print_report(f"EmbedService: {args.guilds} guilds x {args.embeds} embeds x {args.buttons} buttons", results, args)
+
+if __name__ == "__main__":
+    asyncio.run(main())
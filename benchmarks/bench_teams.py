@@ -0,0 +1,108 @@
+"""
+Benchmarks TeamDatabaseService against the in-memory DatabaseManager.
+
+    python -m benchmarks.bench_teams --teams 200 --members 5 --latency-ms 2
+"""
+import asyncio
+import random
+from datetime import datetime
+
+from benchmarks.harness import build_parser, drain, make_manager, measure, print_report
+from cogs.TeamsPanel.services.team_manager import TeamManager
+from cogs.TeamsPanel.services.team_service import TeamDatabaseService
+from config import TEAMS_COLLECTION
+from settings_cache import GuildSettingsCache
+
+GUILD_ID = 1
+
+def _member(user_id: str, role_title: str) -> dict:
+    return {
+        "user_id": user_id,
+        "username": f"user{user_id}",
+        "display_name": f"User {user_id}",
+        "role_title": role_title,
+        "profile_data": {"skills": ["python", "design"], "interests": ["games"]},
+    }
+
+async def seed(service: TeamDatabaseService, teams: int, members: int, unregistered: int, rng: random.Random):
+    batch = service.batch()
+    for number in range(1, teams + 1):
+        ids = [str(number * 1000 + index) for index in range(members)]
+        team_members = {uid: _member(uid, "Team Leader" if index == 0 else "Team Member") for index, uid in enumerate(ids)}
+        await service.insert_team({
+            "guild_id": GUILD_ID, "team_role": f"Team {number}", "team_number": number,
+            "channel_name": f"team-{number}", "members": team_members
+        }, batch=batch)
+    for index in range(unregistered):
+        user_id = str(10_000_000 + index)
+        role_type = "leaders" if rng.random() < 0.2 else "members"
+        data = _member(user_id, "Team Leader" if role_type == "leaders" else "Team Member")
+        data.pop("user_id")
+        await service.save_unregistered_member(GUILD_ID, user_id, data, role_type, batch=batch)
+    report = await batch.flush()
+    if not report.ok:
+        raise RuntimeError(f"Seeding failed: {report.errors}")
+
+async def main():
+    parser = build_parser("Benchmark TeamDatabaseService against the in-memory DatabaseManager.")
+    parser.add_argument("--teams", type=int, default=100, help="Teams to seed (default: 100).")
+    parser.add_argument("--members", type=int, default=5, help="Members per team (default: 5).")
+    parser.add_argument("--unregistered", type=int, default=200, help="Unregistered members to seed (default: 200).")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = make_manager(args)
+    service = TeamDatabaseService(db, GuildSettingsCache(db))
+    manager = TeamManager(service)
+    await db.ensure_indexes()
+    await seed(service, args.teams, args.members, args.unregistered, rng)
+
+    def team_name(run: int) -> str:
+        return f"Team {run % args.teams + 1}"
+
+    def member_id(run: int) -> str:
+        return str((run % args.teams + 1) * 1000)
+
+    results = [
+        await measure(db, "get_team_by_name", lambda run: service.get_team_by_name(GUILD_ID, team_name(run)), args.repeat),
+        await measure(db, "get_teams", lambda run: service.get_teams(GUILD_ID), args.repeat),
+        await measure(db, "iter_teams", lambda run: drain(service.iter_teams(GUILD_ID)), args.repeat),
+        await measure(db, "get_team_summaries", lambda run: service.get_team_summaries(GUILD_ID), args.repeat),
+        await measure(db, "find_team_by_member", lambda run: service.find_team_by_member(GUILD_ID, member_id(run)), args.repeat),
+        await measure(db, "find_teams_by_members (25 ids)",
+                      lambda run: service.find_teams_by_members(GUILD_ID, [member_id(run + i) for i in range(25)]), args.repeat),
+        await measure(db, "add_team_members",
+                      lambda run: service.add_team_members(GUILD_ID, team_name(run), {f"x{run}": _member(f"x{run}", "Team Member")}), args.repeat),
+        await measure(db, "update_member_in_teams",
+                      lambda run: service.update_member_in_teams(GUILD_ID, member_id(run), {"display_name": f"Renamed {run}"}), args.repeat),
+        await measure(db, "reserve_team_numbers", lambda run: service.reserve_team_numbers(GUILD_ID, 3), args.repeat),
+        await measure(db, "get_unregistered_ids", lambda run: service.get_unregistered_ids(GUILD_ID), args.repeat),
+        await measure(db, "get_unregistered_members (page of 25)",
+                      lambda run: service.get_unregistered_members(GUILD_ID, limit=25), args.repeat),
+        await measure(db, "get_unregistered_member",
+                      lambda run: service.get_unregistered_member(GUILD_ID, str(10_000_000 + run % max(args.unregistered, 1))), args.repeat),
+    ]
+
+    async def batched_formation(run: int):
+        """Mirrors batch_create_teams: reserve numbers, insert teams and clear unregistered members in one flush."""
+        first = await service.reserve_team_numbers(GUILD_ID, 5)
+        batch = service.batch()
+        for offset in range(5):
+            await service.insert_team({
+                "guild_id": GUILD_ID, "team_role": f"Formed {run}-{offset}", "team_number": first + offset,
+                "channel_name": f"formed-{run}-{offset}", "members": {}, "created_at": datetime.utcnow()
+            }, batch=batch)
+        await service.remove_unregistered_members(GUILD_ID, [str(10_000_000 + run * 5 + i) for i in range(5)], batch=batch)
+        await batch.flush()
+
+    results.append(await measure(db, "form 5 teams (batched)", batched_formation, args.repeat))
+
+    # TeamManager reads go through the team cache; the first run of each case is the miss
+    results.append(await measure(db, "TeamManager.get_team (cached)", lambda run: manager.get_team(GUILD_ID, "Team 1"), args.repeat))
+    results.append(await measure(db, "TeamManager.get_all_teams (cached)", lambda run: manager.get_all_teams(GUILD_ID), args.repeat))
+
+    print_report(f"TeamDatabaseService: {args.teams} teams x {args.members} members, {args.unregistered} unregistered", results, args)
+    print(f"\n{TEAMS_COLLECTION} documents after run: {await db.count_documents(TEAMS_COLLECTION, {})}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Round trips and reply sizes are exact. "decode us" is the client-side BSON decoding time, the CPU
+the bot spends per call on a reply. Wall time also includes the simulated latency and the in-memory
+server's own (pure Python) query work, so compare it between runs rather than against production.
+"""
+import argparse
+import logging
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List
+
+from db_memory import InMemoryDatabaseManager, LatencyProfile
+
+@dataclass
+class BenchResult:
+    """Wall time, simulated round trips and reply decoding cost of one benchmarked call, over `repeat` runs."""
+    name: str
+    wall_ms: List[float] = field(default_factory=list)
+    round_trips: List[int] = field(default_factory=list)
+    decode_us: List[float] = field(default_factory=list)
+    reply_bytes: List[int] = field(default_factory=list)
+    commands: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def median_ms(self) -> float:
+        return statistics.median(self.wall_ms)
+
+    @property
+    def max_ms(self) -> float:
+        return max(self.wall_ms)
+
+    @property
+    def median_round_trips(self) -> float:
+        return statistics.median(self.round_trips)
+
+    @property
+    def median_decode_us(self) -> float:
+        return statistics.median(self.decode_us)
+
+    @property
+    def median_reply_kb(self) -> float:
+        return statistics.median(self.reply_bytes) / 1024
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    """Arguments shared by every benchmark script."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Simulated round-trip latency per command (default: 1ms).")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform jitter added to every round trip.")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per benchmarked call (default: 20).")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for generated data and latency jitter.")
+    parser.add_argument("--log-slow", action="store_true", help="Log slow queries while seeding and measuring.")
+    return parser
+
+def make_manager(args: argparse.Namespace) -> InMemoryDatabaseManager:
+    logging.basicConfig(level=logging.WARNING if args.log_slow else logging.ERROR)
+    return InMemoryDatabaseManager(
+        "benchmark", LatencyProfile(default_ms=args.latency_ms, jitter_ms=args.jitter_ms), seed=args.seed
+    )
+
+async def measure(db: InMemoryDatabaseManager, name: str, call: Callable[[int], Awaitable[Any]], repeat: int) -> BenchResult:
+    """
+    Runs `call(run_index)` `repeat` times, recording the wall time, number of round trips and
+    client-side BSON decoding time of each run.
+
+    Args:
+        db (InMemoryDatabaseManager): The manager the benchmarked services use.
+        name (str): Label shown in the report.
+        call (callable): Coroutine function taking the run index, so runs can vary their input.
+        repeat (int): Number of runs.
+    """
+    result = BenchResult(name)
+    for run in range(repeat):
+        db.reset_stats()
+        start = time.perf_counter()
+        await call(run)
+        result.wall_ms.append((time.perf_counter() - start) * 1000)
+        trips = db.round_trips()
+        result.round_trips.append(sum(trips.values()))
+        result.decode_us.append(db.decode_seconds * 1_000_000)
+        result.reply_bytes.append(db.bytes_received)
+        if run == 0:
+            result.commands = trips
+    db.reset_stats()
+    return result
+
+async def drain(iterator) -> int:
+    """Consumes an async iterator, returning the number of items."""
+    count = 0
+    async for _ in iterator:
+        count += 1
+    return count
+
+def print_report(title: str, results: List[BenchResult], args: argparse.Namespace):
+    print(f"\n{title} (latency {args.latency_ms}ms +/- {args.jitter_ms}ms, {args.repeat} runs)")
+    print(f"{'operation':<40} {'round trips':>11} {'median ms':>10} {'max ms':>9} {'decode us':>10} {'reply KB':>9}   commands")
+    for result in results:
+        commands = ", ".join(f"{name} x{count}" for name, count in sorted(result.commands.items()))
+        print(
+            f"{result.name:<40} {result.median_round_trips:>11g} {result.median_ms:>10.2f} {result.max_ms:>9.2f} "
+            f"{result.median_decode_us:>10.1f} {result.median_reply_kb:>9.2f}   {commands}"
+        )
@@ -8,7 +8,7 @@ from .services.embed_service import EmbedService
 from .services.button_action_engine import ButtonActionEngine
 from .services.embed_sender import EmbedSender
 from .utils.panel_manager import PanelManager
-from config import EMBEDS_COLLECTION
+from database import DatabaseUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +16,7 @@ class EmbedBuilderCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db = bot.db
-        self.embed_service = EmbedService(self.db)
+        self.embed_service = EmbedService(self.db, bot.settings_cache)
         self.action_engine = ButtonActionEngine(self.embed_service)
         self.embed_sender = EmbedSender(self.embed_service, self.action_engine)
         self.panel_manager = PanelManager(self.embed_service, self.embed_sender)
@@ -32,22 +32,15 @@ class EmbedBuilderCog(commands.Cog):
         await self.bot.wait_until_ready()
 
         try:
-            docs = await self.db.find_many(EMBEDS_COLLECTION, {})
             restored_count = 0
 
-            for doc in docs:
-                guild_id = doc["guild_id"]
-                for embed_name, embed_data in doc.get("embeds", {}).items():
-                    buttons = embed_data.get("config", {}).get("buttons", [])
-                    if not buttons:
-                        continue
-
-                    try:
-                        view = await self.action_engine.create_persistent_view(buttons)
-                        self.bot.add_view(view)
-                        restored_count += 1
-                    except Exception as e:
-                        logger.error(f"Failed to restore view for embed '{embed_name}' in guild {guild_id}: {e}")
+            async for doc in self.embed_service.iter_embeds_with_buttons():
+                try:
+                    view = await self.action_engine.create_persistent_view(doc["buttons"])
+                    self.bot.add_view(view)
+                    restored_count += 1
+                except Exception as e:
+                    logger.error(f"Failed to restore view for embed '{doc['embed_name']}' in guild {doc['guild_id']}: {e}")
 
             logger.info(f"✅ Restored {restored_count} persistent embed views on startup.")
 
@@ -86,6 +79,14 @@ class EmbedBuilderCog(commands.Cog):
         await self.embed_service.save_embed_panel(interaction.guild.id, interaction.channel.id, msg.id)
         await interaction.followup.send("✅ Embed Builder panel created!", ephemeral=True)
 
+    async def cog_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        """Tells the user when a command failed because the database is unavailable."""
+        original = getattr(error, "original", error)
+        if isinstance(original, DatabaseUnavailableError):
+            logger.warning(f"Command failed in EmbedBuilderCog, database unavailable: {original}")
+            response_method = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+            await response_method("⚠️ The database is temporarily unavailable. Please try again in a moment.", ephemeral=True)
+
 
 async def setup(bot: commands.Bot):
     """Setup function to add the cog to the bot."""
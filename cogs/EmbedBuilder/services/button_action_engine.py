@@ -3,6 +3,8 @@ from discord.ui import View, Button
 import logging
 from typing import Optional, List, Dict, Any
 
+from database import DatabaseUnavailableError
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,7 +29,12 @@ class ButtonActionEngine:
             return
 
         guild_id = str(interaction.guild.id)
-        result = await self.embed_service.get_button_config(guild_id, custom_id)
+        try:
+            result = await self.embed_service.get_button_config(guild_id, custom_id)
+        except DatabaseUnavailableError as e:
+            logger.warning(f"Button {custom_id} pressed while the database is unavailable: {e}")
+            await self._safe_respond_text(interaction, "⚠️ The database is temporarily unavailable. Please try again in a moment.", ephemeral=True)
+            return
         if not result:
             await self._safe_respond_text(interaction, "This button is no longer valid.", ephemeral=True)
             return
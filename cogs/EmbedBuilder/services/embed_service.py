@@ -1,37 +1,70 @@
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, Optional
 from config import SETTINGS_COLLECTION, EMBEDS_COLLECTION
+from database import IndexSpec
 from discord import Embed, Color
 
 class EmbedService:
-    def __init__(self, db):
+    INDEXES = {
+        EMBEDS_COLLECTION: [
+            IndexSpec("guild_id_unique", (("guild_id", 1),), unique=True),
+        ],
+    }
+
+    def __init__(self, db, settings_cache):
         self.db = db
+        self.settings_cache = settings_cache
+        self.db.register_indexes(self.INDEXES)
 
     # ---- Settings: Embed Panel ----
 
     async def save_embed_panel(self, guild_id: int, channel_id: int, message_id: int) -> bool:
         panel_data = {"channel_id": channel_id, "message_id": message_id}
         update_data = {"embed_manager_panel": panel_data, "updated_at": datetime.utcnow()}
-        return await self.db.update_one(
+        result = await self.db.update_one(
             SETTINGS_COLLECTION,
             {"guild_id": guild_id},
             {"$set": update_data},
             upsert=True
         )
+        self.settings_cache.invalidate(guild_id)
+        return result
 
     async def get_embed_panel(self, guild_id: int) -> Optional[Dict[str, Any]]:
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
-        return settings_doc.get("embed_manager_panel") if settings_doc else None
+        return await self.settings_cache.get_field(guild_id, "embed_manager_panel")
 
     async def delete_embed_panel(self, guild_id: int) -> bool:
-        return await self.db.update_one(
+        result = await self.db.update_one(
             SETTINGS_COLLECTION,
             {"guild_id": guild_id},
             {"$unset": {"embed_manager_panel": ""}, "$set": {"updated_at": datetime.utcnow()}}
         )
+        self.settings_cache.invalidate(guild_id)
+        return result
 
     # ---- Embed configs ----
 
+    async def iter_embeds_with_buttons(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams every embed that has buttons, across all guilds, as
+        {"guild_id", "embed_name", "buttons"} documents. Only the button configs leave the server.
+        """
+        pipeline = [
+            {"$project": {
+                "_id": 0,
+                "guild_id": 1,
+                "embeds": {"$filter": {
+                    "input": {"$objectToArray": "$embeds"},
+                    "as": "embed",
+                    "cond": {"$gt": [{"$size": {"$ifNull": ["$$embed.v.config.buttons", []]}}, 0]}
+                }}
+            }},
+            {"$unwind": "$embeds"},
+            {"$project": {"guild_id": 1, "embed_name": "$embeds.k", "buttons": "$embeds.v.config.buttons"}},
+        ]
+        async for doc in self.db.aggregate_iter(EMBEDS_COLLECTION, pipeline):
+            yield doc
+
     async def get_guild_embeds(self, guild_id: str) -> Dict[str, dict]:
         doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
         return doc.get("embeds", {}) if doc else {}
@@ -55,32 +88,52 @@ class EmbedService:
             {"$unset": {f"embeds.{embed_name}": ""}}
         )
 
-    async def get_embed_config(self, guild_id: str, embed_name: str) -> Optional[dict]:
-        doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
-        if not doc or "embeds" not in doc or embed_name not in doc["embeds"]:
+    async def _find_embed_field(self, guild_id: str, embed_name: str, path: str = "") -> Optional[dict]:
+        """
+        Reads a single embed (or one field of it, e.g. "config.buttons") from the guild's embeds
+        document. The projection runs server-side, so the guild's other embeds are never sent or decoded.
+        """
+        field_path = f"embeds.{embed_name}.{path}" if path else f"embeds.{embed_name}"
+        doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id}, {"_id": 0, field_path: 1})
+        if not doc or embed_name not in doc.get("embeds", {}):
             return None
-        return doc["embeds"].get(embed_name)
+        return doc["embeds"][embed_name]
+
+    async def get_embed_config(self, guild_id: str, embed_name: str) -> Optional[dict]:
+        return await self._find_embed_field(guild_id, embed_name)
 
     async def get_button_config(self, guild_id: str, custom_id: str) -> Optional[tuple[dict, str]]:
-        doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
-        if not doc or "embeds" not in doc:
+        """
+        Finds a button by custom_id across the guild's embeds. Runs on every persistent button
+        click, so the button is located server-side and only it and its embed name are returned.
+        """
+        pipeline = [
+            {"$match": {"guild_id": guild_id}},
+            {"$project": {"_id": 0, "embeds": {"$objectToArray": {"$ifNull": ["$embeds", {}]}}}},
+            {"$unwind": "$embeds"},
+            {"$project": {
+                "embed_name": "$embeds.k",
+                "button": {"$filter": {
+                    "input": {"$ifNull": ["$embeds.v.config.buttons", []]},
+                    "as": "button",
+                    "cond": {"$eq": ["$$button.custom_id", custom_id]}
+                }}
+            }},
+            {"$unwind": "$button"},
+            {"$limit": 1},
+        ]
+        results = await self.db.aggregate(EMBEDS_COLLECTION, pipeline)
+        if not results:
             return None
-
-        for embed_name, embed_data in doc["embeds"].items():
-            buttons = embed_data.get("config", {}).get("buttons", [])
-            for button in buttons:
-                if button.get("custom_id") == custom_id:
-                    return button, embed_name
-        return None
+        return results[0]["button"], results[0]["embed_name"]
 
     async def save_button_action(self, guild_id: str, embed_name: str, custom_id: str, action: dict):
         """Add or update an action for a button."""
-        doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
-        if not doc or "embeds" not in doc or embed_name not in doc["embeds"]:
+        embed = await self._find_embed_field(guild_id, embed_name, "config.buttons")
+        if embed is None:
             raise ValueError(f"Embed `{embed_name}` not found in guild {guild_id}")
 
-        embed_config = doc["embeds"][embed_name]["config"]
-        buttons = embed_config.get("buttons", [])
+        buttons = embed.get("config", {}).get("buttons", [])
 
         # Find button by custom_id
         for button in buttons:
@@ -114,12 +167,12 @@ class EmbedService:
         Replace actions array for the given button. If new_actions is empty, remove the actions key.
         Returns True on success.
         """
-        # fetch doc
-        doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
-        if not doc or "embeds" not in doc or embed_name not in doc["embeds"]:
+        # fetch only this embed's buttons
+        embed = await self._find_embed_field(guild_id, embed_name, "config.buttons")
+        if embed is None:
             raise ValueError(f"Embed `{embed_name}` not found for guild {guild_id}")
 
-        buttons = doc["embeds"][embed_name]["config"].get("buttons", [])
+        buttons = embed.get("config", {}).get("buttons", [])
         changed = False
         for b in buttons:
             if b.get("custom_id") == custom_id:
@@ -140,11 +193,11 @@ class EmbedService:
 
     async def remove_button_action(self, guild_id: str, embed_name: str, custom_id: str, index: int):
         """Remove a specific action from a button by index."""
-        doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
-        if not doc or "embeds" not in doc or embed_name not in doc["embeds"]:
+        embed = await self._find_embed_field(guild_id, embed_name, "config.buttons")
+        if embed is None:
             raise ValueError(f"Embed `{embed_name}` not found in guild {guild_id}")
 
-        buttons = doc["embeds"][embed_name]["config"].get("buttons", [])
+        buttons = embed.get("config", {}).get("buttons", [])
         for button in buttons:
             if button["custom_id"] == custom_id:
                 if "actions" in button and 0 <= index < len(button["actions"]):
@@ -196,9 +249,5 @@ class EmbedService:
         """
         Get all channel IDs an embed is attached to.
         """
-        doc = await self.db.find_one(EMBEDS_COLLECTION, {"guild_id": guild_id})
-        if not doc:
-            return []
-
-        embed_data = doc.get("embeds", {}).get(embed_name, {})
-        return embed_data.get("channels", [])
+        embed_data = await self._find_embed_field(guild_id, embed_name, "channels")
+        return (embed_data or {}).get("channels", [])
@@ -6,7 +6,8 @@ from typing import List, Dict, Any
 from ..TeamsPanel.permissions import moderator_required
 
 from .services.settings_service import SettingsService
-from .ui.ai_model_selection import AIModelSelectionView
+from .ui.ai_model_selection import AIModelSelectionView, MODEL_MAP
+from database import DatabaseUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +41,7 @@ class SettingsCog(commands.Cog):
         self.bot = bot
         self.db = bot.db
         self.SETTING_TYPES = SETTING_TYPES
-        self.settings_service = SettingsService(self.db)
+        self.settings_service = SettingsService(self.db, bot.settings_cache)
 
     # ========== AUTOCOMPLETE FUNCTIONS ==========
 
@@ -273,6 +274,47 @@ class SettingsCog(commands.Cog):
             if not interaction.response.is_done():
                 await interaction.response.send_message("❌ An error occurred while starting the selection process.", ephemeral=True)
 
+    @settings_group.command(name="ai_fallback_models", description="Set the AI models tried when the active model fails.")
+    @app_commands.describe(
+        models="Comma-separated model names, tried in order. Use 'default' to restore the default chain."
+    )
+    @moderator_required
+    async def set_ai_fallback_models(self, interaction: Interaction, models: str):
+        """Sets the server's AI fallback chain."""
+        await interaction.response.defer(ephemeral=True)
+
+        if models.strip().lower() == "default":
+            await self.settings_service.set_ai_fallback_models(interaction.guild_id, None)
+            chain = await self.settings_service.get_ai_fallback_models(interaction.guild_id)
+        else:
+            chain = [model.strip() for model in models.split(",") if model.strip()]
+            known_models = {model for brand in MODEL_MAP.values() for model in brand["models"]}
+            unknown = [model for model in chain if model not in known_models]
+            if not chain or unknown:
+                return await interaction.followup.send(
+                    f"❌ Unknown model name(s): `{', '.join(unknown) or models}`. Please check the spelling and try again.", ephemeral=True
+                )
+            await self.settings_service.set_ai_fallback_models(interaction.guild_id, chain)
+
+        embed = discord.Embed(
+            title="Configuration Saved ✅",
+            description="The AI fallback chain for this server has been updated.",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="Fallback Models", value="```\n" + "\n".join(f"{i}. {model}" for i, model in enumerate(chain, 1)) + "\n```", inline=False)
+        embed.set_footer(text=f"Set by {interaction.user.display_name}")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    # ========== ERROR HANDLING ==========
+
+    async def cog_app_command_error(self, interaction: Interaction, error: app_commands.AppCommandError):
+        """Tells the user when a command failed because the database is unavailable."""
+        original = getattr(error, "original", error)
+        if isinstance(original, DatabaseUnavailableError):
+            logger.warning(f"Command failed in SettingsCog, database unavailable: {original}")
+            response_method = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+            await response_method("⚠️ The database is temporarily unavailable. Please try again in a moment.", ephemeral=True)
+
 async def setup(bot: commands.Bot):
     """Setup function to add the cog to the bot."""
     await bot.add_cog(SettingsCog(bot))
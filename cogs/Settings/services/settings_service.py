@@ -1,7 +1,8 @@
 import logging
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from config import SETTINGS_COLLECTION, DEFAULT_AI_MODEL
+from config import SETTINGS_COLLECTION, DEFAULT_AI_MODEL, AI_FALLBACK_MODELS
+from database import IndexSpec
 
 logger = logging.getLogger(__name__)
 
@@ -10,36 +11,54 @@ class SettingsService:
     Database service layer that provides team-specific operations
     using the generic DatabaseManager CRUD methods.
     """
-    def __init__(self, db):
+    INDEXES = {
+        SETTINGS_COLLECTION: [
+            IndexSpec("guild_id_unique", (("guild_id", 1),), unique=True),
+        ],
+    }
+
+    def __init__(self, db, settings_cache):
         self.db = db
+        self.settings_cache = settings_cache
+        self.db.register_indexes(self.INDEXES)
 
     # ========== SETTINGS: AI MODEL ==========
 
     async def get_active_ai_model(self, guild_id: int) -> str:
         """Retrieves the active AI model for the guild, returning the default if not set."""
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
-        if settings_doc and "ai_model" in settings_doc:
-            return settings_doc["ai_model"]
-        return DEFAULT_AI_MODEL
+        return await self.settings_cache.get_field(guild_id, "ai_model", DEFAULT_AI_MODEL)
 
     async def set_active_ai_model(self, guild_id: int, model_name: str) -> bool:
         """Sets the active AI model for the guild."""
         update_data = {"ai_model": model_name, "updated_at": datetime.utcnow()}
-        return await self.db.update_one(
+        result = await self.db.update_one(
             SETTINGS_COLLECTION,
             {"guild_id": guild_id},
             {"$set": update_data},
             upsert=True
         )
+        self.settings_cache.invalidate(guild_id)
+        return result
+
+    async def get_ai_fallback_models(self, guild_id: int) -> List[str]:
+        """Retrieves the models tried after the active one fails, returning the default chain if not set."""
+        return await self.settings_cache.get_field(guild_id, "ai_fallback_models", AI_FALLBACK_MODELS)
+
+    async def set_ai_fallback_models(self, guild_id: int, models: Optional[List[str]]) -> bool:
+        """Sets the guild's fallback models, in the order they are tried. None restores the default chain."""
+        if models is None:
+            update = {"$unset": {"ai_fallback_models": ""}, "$set": {"updated_at": datetime.utcnow()}}
+        else:
+            update = {"$set": {"ai_fallback_models": models, "updated_at": datetime.utcnow()}}
+        result = await self.db.update_one(SETTINGS_COLLECTION, {"guild_id": guild_id}, update, upsert=True)
+        self.settings_cache.invalidate(guild_id)
+        return result
 
     # ========== SETTINGS: EXTENSIBLE CONFIGURATION SYSTEM ==========
 
     async def get_setting_object(self, guild_id: int, object_type: str) -> Dict[str, Any]:
         """Retrieves a settings object (categories or channels) from the guild's settings document."""
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
-        if settings_doc and object_type in settings_doc:
-            return settings_doc[object_type]
-        return {}
+        return await self.settings_cache.get_field(guild_id, object_type, {})
 
     async def get_setting_field(self, guild_id: int, object_type: str, field_name: str) -> Optional[Any]:
         """Retrieves a specific field from a settings object."""
@@ -49,24 +68,28 @@ class SettingsService:
     async def set_setting_field(self, guild_id: int, object_type: str, field_name: str, value: Any) -> bool:
         """Sets a specific field in a settings object."""
         update_data = {f"{object_type}.{field_name}": value, "updated_at": datetime.utcnow()}
-        return await self.db.update_one(
+        result = await self.db.update_one(
             SETTINGS_COLLECTION,
             {"guild_id": guild_id},
             {"$set": update_data},
             upsert=True
         )
+        self.settings_cache.invalidate(guild_id)
+        return result
 
     async def remove_setting_field(self, guild_id: int, object_type: str, field_name: str) -> bool:
         """Removes a specific field from a settings object."""
-        return await self.db.update_one(
+        result = await self.db.update_one(
             SETTINGS_COLLECTION,
             {"guild_id": guild_id},
             {"$unset": {f"{object_type}.{field_name}": ""}, "$set": {"updated_at": datetime.utcnow()}}
         )
+        self.settings_cache.invalidate(guild_id)
+        return result
 
     async def get_all_settings(self, guild_id: int) -> Dict[str, Any]:
         """Retrieves the complete settings document for a guild."""
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
+        settings_doc = await self.settings_cache.get(guild_id)
         if not settings_doc:
             return {}
 
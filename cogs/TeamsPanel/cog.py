@@ -7,6 +7,7 @@ from typing import Dict, Optional
 from .services.team_service import TeamDatabaseService
 from .services.team_manager import TeamManager
 from .services.marathon_service import MarathonService
+from .services.profile_jobs import ProfileJobQueue
 from .models.team import TeamConfig, TeamError, InvalidTeamError
 from .ui.views import MainPanelView
 
@@ -16,6 +17,7 @@ from .utils.panel_management import PanelManager
 from .utils.profile_parsing import ProfileParser
 
 from config import REACTION_EMOJI
+from database import DatabaseUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +26,7 @@ class TeamsCog(commands.Cog):
         self.bot = bot
         self.db = bot.db
         self.config = TeamConfig()
-        self.team_service = TeamDatabaseService(self.db)
+        self.team_service = TeamDatabaseService(self.db, bot.settings_cache)
 
         # --- Singletons (owned by cog) ---
         self.team_manager = TeamManager(self.team_service)
@@ -32,12 +34,34 @@ class TeamsCog(commands.Cog):
         # --- Lightweight services/managers ---
         self.permission_manager = PermissionManager()
         self.marathon_service = MarathonService(self.team_manager)
-        self.profile_parser = ProfileParser(self.team_manager)
+        self.profile_parser = ProfileParser(self.team_manager, self.bot)
+        self.profile_jobs = ProfileJobQueue(
+            self.db, self.profile_parser.process_job, self.profile_parser.show_job_status, batch_handler=self.profile_parser.process_jobs
+        )
         self.panel_manager = PanelManager(self.bot, self.team_manager, self.marathon_service)
 
         # Restore and Add persistent view
         bot.add_view(MainPanelView(self.team_manager, self.marathon_service, self.panel_manager))
 
+    async def cog_load(self):
+        # Loaded after startup (e.g. reloaded): the database is already migrated
+        if self.bot.database_ready:
+            self._start_services()
+
+    @commands.Cog.listener()
+    async def on_database_ready(self):
+        """Starts the background services once indexes and migrations are in place."""
+        self._start_services()
+
+    def _start_services(self):
+        self.team_manager.team_cache.start()
+        self.profile_jobs.start()
+
+    async def cog_unload(self):
+        await self.profile_jobs.stop()
+        await self.team_manager.team_cache.stop()
+        await self.team_manager.ai_handler.close()
+
     # ========== EVENT LISTENERS ==========
 
     @commands.Cog.listener()
@@ -45,6 +69,12 @@ class TeamsCog(commands.Cog):
         """Handles profile parsing via reaction."""
         if str(payload.emoji) != REACTION_EMOJI:
             return
+        try:
+            await self._queue_profile_extraction(payload)
+        except DatabaseUnavailableError as e:
+            logger.warning(f"Dropped profile extraction for message {payload.message_id}, database unavailable: {e}")
+
+    async def _queue_profile_extraction(self, payload: discord.RawReactionActionEvent):
         communication_channel_id = await self.team_service.get_communication_channel_id(payload.guild_id)
         if not communication_channel_id:
             return
@@ -62,9 +92,11 @@ class TeamsCog(commands.Cog):
             message = await channel.fetch_message(payload.message_id)
             if message.author.bot:
                 return
-            await self.profile_parser.handle_profile_parsing(message, payload.guild_id)
         except discord.NotFound:
-            pass
+            return
+        # Extraction runs on the job queue's workers, not in the gateway event handler
+        if await self.profile_jobs.enqueue(payload.guild_id, payload.channel_id, payload.message_id) is None:
+            logger.info(f"Profile extraction for message {payload.message_id} is already pending or the queue is full.")
 
     # ========== SLASH COMMANDS ==========
 
@@ -312,8 +344,13 @@ class TeamsCog(commands.Cog):
 
     async def cog_app_command_error(self, interaction: Interaction, error: app_commands.AppCommandError):
         """Global error handler for slash commands in this cog."""
+        original = getattr(error, "original", error)
         if isinstance(error, app_commands.MissingPermissions):
             await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+        elif isinstance(original, DatabaseUnavailableError):
+            logger.warning(f"Command failed in TeamsCog, database unavailable: {original}")
+            response_method = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+            await response_method("⚠️ The database is temporarily unavailable. Please try again in a moment.", ephemeral=True)
         elif isinstance(error, TeamError):
             await interaction.response.send_message(f"❌ {error}", ephemeral=True)
         else:
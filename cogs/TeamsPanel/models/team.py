@@ -50,6 +50,7 @@ class Team:
     channel_name: str
     members: Dict[str, TeamMember]  # user_id -> TeamMember
     _team_number: Optional[int] = None
+    version: int = 0  # Incremented on every member change; used for optimistic concurrency
 
     @property
     def team_number(self) -> int:
@@ -90,9 +91,26 @@ class Team:
             "team_role": self.team_role,
             "channel_name": self.channel_name,
             "members": {uid: member.to_dict() for uid, member in self.members.items()},
-            "_team_number": self._team_number,
+            "team_number": self._team_number,
+            "version": self.version,
         }
 
+@dataclass
+class TeamSummary:
+    """Lightweight view of a team for panels and dropdowns, without member profiles."""
+    team_role: str
+    channel_name: str
+    member_count: int
+    _team_number: Optional[int] = None
+
+    @property
+    def team_number(self) -> int:
+        """Extract the numeric part from team_role (e.g. "Team 1" -> 1)."""
+        if self._team_number is not None:
+            return self._team_number
+        match = re.search(r"\d+", self.team_role)
+        return int(match.group()) if match else 0
+
 class TeamError(Exception):
     """Base exception for team-related errors."""
     pass
@@ -108,3 +126,7 @@ class TeamNotFoundError(TeamError):
 class TeamMemberError(TeamError):
     """Raised when member operations fail."""
     pass
+
+class TeamConflictError(TeamError):
+    """Raised when a team was modified by someone else between reading and writing it."""
+    pass
@@ -4,10 +4,12 @@ import asyncio
 import numpy as np
 import tenacity
 import re
-from typing import Optional, Dict, List, Any
+import time
+from typing import Optional, Dict, List, Any, Tuple, Callable
 
 # --- API Client Imports ---
-from huggingface_hub import InferenceClient
+import httpx
+from huggingface_hub import AsyncInferenceClient
 import openai
 import google.generativeai as genai
 
@@ -15,11 +17,22 @@ import google.generativeai as genai
 from config import (
     HUGGINGFACE_API_TOKEN, POE_API_KEY, GOOGLE_API_KEY, DEEPSEEK_API_KEY, OPENROUTER_API_KEY,
     HUGGINGFACE_MODELS, POE_MODELS, GOOGLE_MODELS, DEEPSEEK_MODELS, OPENROUTER_MODELS,
+    AI_TIMEOUT, AI_PROVIDER_TIMEOUTS, AI_CONNECT_TIMEOUT, AI_HTTP_MAX_CONNECTIONS, AI_HTTP_MAX_KEEPALIVE, AI_HTTP_KEEPALIVE_EXPIRY,
+    AI_BATCH_MAX_PROFILES, AI_BATCH_CONTEXT_SHARE, AI_BATCH_OUTPUT_TOKENS_PER_PROFILE, AI_DEFAULT_CONTEXT_TOKENS,
+    AI_DEFAULT_MAX_OUTPUT_TOKENS, AI_MODEL_CONTEXT_TOKENS, AI_MODEL_MAX_OUTPUT_TOKENS,
+    LOCAL_EXTRACTION_ENABLED, LOCAL_EXTRACTION_MIN_CONFIDENCE,
 )
 from ..utils.timezone_utils import TimezoneProcessor
+from .rate_limiter import AIRateLimiter, QuotaExceededError
+from .extraction_cache import ExtractionCache
+from .provider_router import ProviderRouter
+from .local_extractor import LocalProfileExtractor
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the extraction prompt or the handling of its replies changes; cached extractions of other versions are not served
+EXTRACTION_PROMPT_VERSION = 1
+
 # --- SBERT Semantic Similarity Implementation (remains unchanged) ---
 _model_cache: Optional[Any] = None
 _model_load_lock = asyncio.Lock()
@@ -65,59 +78,142 @@ class SimilarityCalculator:
 
 class AIHandlerError(Exception): pass
 class AIExtractionError(AIHandlerError): pass
+class AIRateLimitedError(AIExtractionError): pass
 
 class AIHandler:
     """
     Handles AI operations by dispatching to the appropriate API
     based on the configured active model for a given guild.
+
+    Provider calls are native async requests, so concurrent extractions hold no executor
+    threads. The OpenAI-compatible providers (Poe, DeepSeek, OpenRouter) share one keep-alive
+    HTTP connection pool sized by AI_HTTP_MAX_CONNECTIONS; Hugging Face and Gemini use their
+    SDKs' own async transports. Each provider's requests time out after its entry in
+    AI_PROVIDER_TIMEOUTS, or AI_TIMEOUT.
+
+    Calls wait in a shared AIRateLimiter for their model's quota instead of running into
+    rate-limit errors; `get_quota_state()` reports the live quota usage.
+
+    Extraction results are cached by profile text, model and prompt version (see ExtractionCache),
+    so repeated extractions are answered without a provider call; `get_cache_stats()` reports the hit rate.
+
+    Each call runs down the guild's model chain (its active model, then its fallback models): a model
+    that fails hands over to the next, and a call that outlasts its provider's p95 latency is hedged
+    with the next model, keeping the first valid reply (see ProviderRouter, `get_provider_health()`).
+
+    Before any of that, LocalProfileExtractor tries the profile with rules; only profiles it cannot
+    extract with LOCAL_EXTRACTION_MIN_CONFIDENCE are sent to a model.
     """
 
+    # OpenAI-compatible providers: (base URL, API key, name of the key's setting)
+    OPENAI_COMPATIBLE_PROVIDERS = {
+        "poe": ("https://api.poe.com/v1", POE_API_KEY, "POE_API_KEY"),
+        "deepseek": ("https://api.deepseek.com/v1", DEEPSEEK_API_KEY, "DEEPSEEK_API_KEY"),
+        "openrouter": ("https://openrouter.ai/api/v1", OPENROUTER_API_KEY, "OPENROUTER_API_KEY"),
+    }
+
     def __init__(self, db: Any):
         """AIHandler is now guild-agnostic at initialization."""
         self.db = db
         self.similarity_calculator = SimilarityCalculator()
-        self._client_cache: Dict[str, Any] = {} # Cache for API clients
+        self._client_cache: Dict[str, Any] = {} # Cache for API clients, one per provider
+        self.rate_limiter = AIRateLimiter()
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.extraction_cache = ExtractionCache(db.db, EXTRACTION_PROMPT_VERSION)  # db is the TeamDatabaseService
+        self.router = ProviderRouter()
+        self.local_extractor = LocalProfileExtractor() if LOCAL_EXTRACTION_ENABLED else None
+        self.local_extractions = 0
+        self.escalations = 0
 
-    async def _get_client_for_guild(self, guild_id: int) -> tuple[Any, str]:
-        """
-        Loads the active model for a specific guild and returns the
-        appropriate, cached API client and the model name.
-        """
-        active_model = await self.db.get_active_ai_model(guild_id)
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Returns the HTTP connection pool shared by the OpenAI-compatible clients, creating it on first use."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=AI_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT)
+            )
+        return self._http_client
+
+    @staticmethod
+    def _provider_timeout(provider: str) -> float:
+        return AI_PROVIDER_TIMEOUTS.get(provider, AI_TIMEOUT)
+
+    def _get_client(self, active_model: str) -> Any:
+        """Returns the cached API client of the model's provider, creating it on first use."""
+        provider = self._get_provider_from_model(active_model)
 
-        if active_model in self._client_cache:
-            return self._client_cache[active_model], active_model
+        if provider in self._client_cache:
+            return self._client_cache[provider]
 
         client = None
-        if active_model in HUGGINGFACE_MODELS:
+        if provider == "huggingface":
             if not HUGGINGFACE_API_TOKEN: raise ValueError("HUGGINGFACE_API_TOKEN is not set.")
-            client = InferenceClient(token=HUGGINGFACE_API_TOKEN)
-        elif active_model in POE_MODELS:
-            if not POE_API_KEY: raise ValueError("POE_API_KEY is not set.")
-            client = openai.OpenAI(api_key=POE_API_KEY, base_url="https://api.poe.com/v1")
-        elif active_model in GOOGLE_MODELS:
+            client = AsyncInferenceClient(token=HUGGINGFACE_API_TOKEN, timeout=self._provider_timeout(provider))
+        elif provider == "google":
             if not GOOGLE_API_KEY: raise ValueError("GOOGLE_API_KEY is not set.")
             genai.configure(api_key=GOOGLE_API_KEY)
             client = genai
-        elif active_model in DEEPSEEK_MODELS:
-            if not DEEPSEEK_API_KEY: raise ValueError("DEEPSEEK_API_KEY is not set.")
-            client = openai.OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com/v1")
-        elif active_model in OPENROUTER_MODELS:
-            if not OPENROUTER_API_KEY: raise ValueError("OPENROUTER_API_KEY is not set.")
-            client = openai.OpenAI(api_key=OPENROUTER_API_KEY, base_url="https://openrouter.ai/api/v1")
+        elif provider in self.OPENAI_COMPATIBLE_PROVIDERS:
+            base_url, api_key, key_setting = self.OPENAI_COMPATIBLE_PROVIDERS[provider]
+            if not api_key: raise ValueError(f"{key_setting} is not set.")
+            # The SDK's own retries are disabled: rate limits are handled by the limiter, other errors by failover and retries
+            client = openai.AsyncOpenAI(
+                api_key=api_key, base_url=base_url, timeout=self._provider_timeout(provider), http_client=self._get_http_client(),
+                max_retries=0
+            )
         else:
-            raise ValueError(f"Active model '{active_model}' is not configured for guild {guild_id}.")
+            raise ValueError(f"Model '{active_model}' is not configured.")
 
-        logger.info(f"Initialized API client for model: {active_model}")
-        self._client_cache[active_model] = client
-        return client, active_model
+        logger.info(f"Initialized {provider} API client (first model: {active_model})")
+        self._client_cache[provider] = client
+        return client
 
+    def _provider_configured(self, provider: str) -> bool:
+        """Whether the provider's API key is set."""
+        if provider == "huggingface":
+            return bool(HUGGINGFACE_API_TOKEN)
+        if provider == "google":
+            return bool(GOOGLE_API_KEY)
+        if provider in self.OPENAI_COMPATIBLE_PROVIDERS:
+            return bool(self.OPENAI_COMPATIBLE_PROVIDERS[provider][1])
+        return False
 
-    def _build_profile_prompt(self, profile_text: str) -> str:
+    async def _model_chain(self, guild_id: int) -> List[Tuple[str, str]]:
+        """The (model, provider) pairs a guild's calls may use, in the order they are tried."""
+        active_model = await self.db.get_active_ai_model(guild_id)
+        chain = []
+        for model in [active_model, *await self.db.get_ai_fallback_models(guild_id)]:
+            provider = self._get_provider_from_model(model)
+            if (model, provider) in chain or not self._provider_configured(provider):
+                continue
+            chain.append((model, provider))
+        return self.router.order(chain)
+
+    async def close(self):
+        """Closes the provider clients and the shared HTTP connection pool."""
+        clients, self._client_cache = self._client_cache, {}
+        for provider, client in clients.items():
+            if provider == "huggingface":
+                await client.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    def _build_extraction_instructions(self, batched: bool = False) -> str:
+        """The field definitions shared by single and batched prompts."""
         valid_timezones = ", ".join(f'"{tz}"' for tz in TimezoneProcessor.TIMEZONE_MAP.keys())
+        if batched:
+            output = ("Each profile below starts with a line \"### Profile <id>\". Return ONLY a valid, compact JSON object that maps\n"
+                      "        every profile id to an object with the following fields (omit any missing fields):")
+        else:
+            output = "Return ONLY a valid, compact JSON object with the following fields (omit any missing fields):"
         return f"""
         You are an AI assistant that extracts structured data from user-written profile introductions.
-        Return ONLY a valid, compact JSON object with the following fields (omit any missing fields):
+        {output}
 
         - "timezone": A valid timezone abbreviation from this list ONLY: [{valid_timezones}]. Infer the most likely abbreviation from user input (e.g., "Central European" -> "CET").
         - "habits": A list of strings describing regular actions or hobbies.
@@ -132,44 +228,361 @@ class AIHandler:
             - "science_and_research": ["scientific_fields", "research_process_and_tools"]
 
         Do not add comments or explanations.
+        """
 
+    def _build_profile_prompt(self, profile_text: str) -> str:
+        return f"""{self._build_extraction_instructions()}
         ### User Profile Text:
         {profile_text.strip()}
         """
 
+    def _build_batch_prompt(self, profiles: Dict[str, str]) -> str:
+        sections = "\n".join(f"### Profile {profile_id}\n{text.strip()}\n" for profile_id, text in profiles.items())
+        return f"{self._build_extraction_instructions(batched=True)}\n{sections}"
+
+    async def extract_profile_data(self, text: str, guild_id: int) -> Optional[Dict]:
+        """Extracts structured data by calling the appropriate AI provider for the guild, unless the result is cached."""
+        if len(text) < 20:
+            logger.warning("Profile text too short for meaningful extraction.")
+            return None
+
+        local = self._extract_locally(text)
+        if local is not None:
+            return local
+
+        active_model = await self.db.get_active_ai_model(guild_id)
+        cached = await self.extraction_cache.get(active_model, text)
+        if cached is not None:
+            return cached
+
+        data, model = await self._extract_profile(text, guild_id)
+        if data:
+            # Stored under the model that answered, which is not the active one after a failover
+            await self.extraction_cache.put(model, text, data)
+        return data
+
+    def _extract_locally(self, text: str) -> Optional[Dict]:
+        """Returns the rule-based extraction if it is confident enough, or None to escalate to a model."""
+        if self.local_extractor is None:
+            return None
+        result = self.local_extractor.extract(text)
+        if result.confidence >= LOCAL_EXTRACTION_MIN_CONFIDENCE:
+            self.local_extractions += 1
+            return result.data
+        self.escalations += 1
+        logger.debug(f"Local extraction confidence {result.confidence:.2f} is too low; escalating to the AI model.")
+        return None
+
     @tenacity.retry(
         stop=tenacity.stop_after_attempt(3),
         wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
+        retry=tenacity.retry_if_not_exception_type(AIRateLimitedError),  # Retrying cannot help until quota refills
         reraise=True
     )
-    async def extract_profile_data(self, text: str, guild_id: int) -> Optional[Dict]:
-        """Extracts structured data by calling the appropriate AI provider for the guild."""
-        if len(text) < 20:
-            logger.warning("Profile text too short for meaningful extraction.")
-            return None
+    async def _extract_profile(self, text: str, guild_id: int) -> Tuple[Dict, str]:
+        return await self._complete(guild_id, self._build_profile_prompt(text), self._parse_extraction)
 
-        client, active_model = await self._get_client_for_guild(guild_id)
-        prompt = self._build_profile_prompt(text)
+    def _parse_extraction(self, raw_response: str) -> Dict:
         try:
-            raw_response = ""
-            api_provider = self._get_provider_from_model(active_model)
-
-            if api_provider == "huggingface":
-                raw_response = await self._call_huggingface(client, active_model, prompt)
-            elif api_provider in ["poe", "deepseek", "openrouter"]:
-                raw_response = await self._call_openai_compatible(client, active_model, prompt)
-            elif api_provider == "google":
-                raw_response = await self._call_google(client, active_model, prompt)
-            else:
-                raise AIHandlerError("No valid AI provider configured.")
-
             return self._parse_ai_response(raw_response)
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse AI JSON response: {e}. Raw response: '{raw_response}'")
             raise AIExtractionError("Failed to parse AI response.") from e
+
+    async def extract_profiles_batch(self, texts: Dict[str, str], guild_id: int) -> Dict[str, Optional[Dict]]:
+        """
+        Extracts several profiles with as few requests as the guild's model allows (see `plan_batches`).
+        Cached extractions are served without a request.
+
+        Args:
+            texts (Dict[str, str]): Profile texts keyed by an id, e.g. the message ID.
+            guild_id (int): The guild whose active model is used.
+
+        Returns:
+            Dict[str, Optional[Dict]]: Extracted data per id, or None for texts too short to extract.
+                Ids missing from the result failed (the request failed, or the model skipped or mangled
+                their entry) and can be retried.
+        """
+        results: Dict[str, Optional[Dict]] = {profile_id: None for profile_id, text in texts.items() if len(text) < 20}
+        pending = {profile_id: text for profile_id, text in texts.items() if profile_id not in results}
+        if not pending:
+            return results
+
+        for profile_id, text in list(pending.items()):
+            local = self._extract_locally(text)
+            if local is not None:
+                results[profile_id] = local
+                del pending[profile_id]
+        if not pending:
+            return results
+
+        active_model = await self.db.get_active_ai_model(guild_id)
+        for profile_id, text in list(pending.items()):
+            cached = await self.extraction_cache.get(active_model, text)
+            if cached is not None:
+                results[profile_id] = cached
+                del pending[profile_id]
+        if not pending:
+            return results
+
+        batches = self.plan_batches(active_model, pending)
+        outcomes = await asyncio.gather(*(self._extract_batch(batch, guild_id) for batch in batches), return_exceptions=True)
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Batch extraction of {len(batch)} profile(s) failed: {outcome}")
+                continue
+            extracted, model = outcome
+            for profile_id, data in extracted.items():
+                await self.extraction_cache.put(model, batch[profile_id], data)
+            results.update(extracted)
+        return results
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(3),
+        wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
+        retry=tenacity.retry_if_not_exception_type(AIRateLimitedError),
+        reraise=True
+    )
+    async def _extract_batch(self, profiles: Dict[str, str], guild_id: int) -> Tuple[Dict[str, Dict], str]:
+        """Sends one batched request and returns the entries that parsed and validated, and the model that answered."""
+        max_tokens = AI_BATCH_OUTPUT_TOKENS_PER_PROFILE * len(profiles)
+        entries, model = await self._complete(guild_id, self._build_batch_prompt(profiles), self._parse_extraction, max_tokens=max_tokens)
+
+        extracted = {}
+        for profile_id in profiles:
+            data = self._validate_profile_entry(entries.get(profile_id))
+            if data is None:
+                logger.warning(f"Batched extraction returned no valid entry for profile {profile_id}.")
+                continue
+            extracted[profile_id] = data
+        return extracted, model
+
+    def plan_batches(self, model: str, texts: Dict[str, str]) -> List[Dict[str, str]]:
+        """
+        Splits profile texts into batches that fit the model's context window and output limit,
+        with at most AI_BATCH_MAX_PROFILES profiles each. Token counts are estimated.
+        """
+        context = AI_MODEL_CONTEXT_TOKENS.get(model, AI_DEFAULT_CONTEXT_TOKENS)
+        max_output = AI_MODEL_MAX_OUTPUT_TOKENS.get(model, AI_DEFAULT_MAX_OUTPUT_TOKENS)
+        max_profiles = max(1, min(AI_BATCH_MAX_PROFILES, max_output // AI_BATCH_OUTPUT_TOKENS_PER_PROFILE))
+        input_budget = int(context * AI_BATCH_CONTEXT_SHARE) - self._estimate_tokens(self._build_extraction_instructions(batched=True))
+
+        batches: List[Dict[str, str]] = []
+        current: Dict[str, str] = {}
+        used = 0
+        for profile_id, text in texts.items():
+            # Output tokens count against the context window as well
+            cost = self._estimate_tokens(text) + AI_BATCH_OUTPUT_TOKENS_PER_PROFILE
+            if current and (len(current) >= max_profiles or used + cost > input_budget):
+                batches.append(current)
+                current, used = {}, 0
+            current[profile_id] = text
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        return len(text) // 4 + 16
+
+    @staticmethod
+    def _validate_profile_entry(entry: Any) -> Optional[Dict]:
+        """Keeps the well-formed fields of one extracted profile. None if nothing usable is left."""
+        if not isinstance(entry, dict):
+            return None
+        data = {}
+        if isinstance(entry.get("timezone"), str) and entry["timezone"]:
+            data["timezone"] = entry["timezone"]
+        for field in ("habits", "goals"):
+            values = entry.get(field)
+            if isinstance(values, list) and values and all(isinstance(value, str) for value in values):
+                data[field] = values
+        category = entry.get("category")
+        if isinstance(category, dict) and category and all(isinstance(subs, list) for subs in category.values()):
+            data["category"] = category
+        return data or None
+
+    async def _complete(self, guild_id: int, prompt: str, parse: Callable[[str], Any], max_tokens: int = 512) -> Tuple[Any, str]:
+        """
+        Sends a prompt down the guild's model chain and returns the first reply that `parse` accepts.
+
+        One model runs at a time, plus at most one hedge: if the running call outlasts its provider's
+        hedge delay, counted from when the rate limiter let it through, the next model starts alongside
+        it. When every running call has failed, the next model in the chain takes over.
+
+        Returns:
+            Tuple[Any, str]: The parsed reply and the model that produced it.
+
+        Raises:
+            AIRateLimitedError: If every model was out of quota.
+            AIExtractionError: If every model failed, with the last error.
+        """
+        chain = await self._model_chain(guild_id)
+        if not chain:
+            raise AIHandlerError("No valid AI provider configured.")
+
+        loop = asyncio.get_running_loop()
+        running: Dict[asyncio.Task, Tuple[str, str]] = {}  # task -> (model, provider)
+        started: Dict[asyncio.Task, float] = {}  # When each call got its quota and the provider request began
+        request_started = asyncio.Event()
+        errors: List[Exception] = []
+        next_index = 0
+        hedge_task: Optional[asyncio.Task] = None
+
+        def launch() -> asyncio.Task:
+            """Starts the next model in the chain."""
+            nonlocal next_index
+            model, provider = chain[next_index]
+            next_index += 1
+            task: Optional[asyncio.Task] = None
+
+            def on_request_start():
+                started[task] = loop.time()
+                request_started.set()
+
+            task = loop.create_task(self._call_model(guild_id, model, provider, prompt, parse, max_tokens, on_request_start))
+            running[task] = (model, provider)
+            return task
+
+        def hedge_deadline() -> Optional[float]:
+            """When the single running call should be hedged. The clock starts once it is past the rate limiter."""
+            if len(running) != 1 or next_index >= len(chain):
+                return None  # At most two calls run at once
+            task, (_, provider) = next(iter(running.items()))
+            if task not in started:
+                return None  # Waiting for quota is not provider slowness
+            delay = self.router.hedge_delay(provider, self._provider_timeout(provider))
+            return started[task] + delay if delay is not None else None
+
+        launch()
+        try:
+            while running:
+                request_started.clear()
+                hedge_at = hedge_deadline()
+                timeout = max(0.0, hedge_at - loop.time()) if hedge_at is not None else None
+                waiter = loop.create_task(request_started.wait())
+                try:
+                    done, _ = await asyncio.wait([*running, waiter], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                done.discard(waiter)
+                if not done:
+                    if hedge_at is not None and loop.time() >= hedge_at:
+                        self.router.hedges += 1
+                        logger.info(f"Hedging slow {running[next(iter(running))][0]} call with {chain[next_index][0]}.")
+                        hedge_task = launch()
+                    continue
+
+                for task in done:
+                    model, provider = running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    if task is hedge_task and running:
+                        self.router.hedge_wins += 1
+                        # The overtaken call counts against its provider, so a provider that turns slow drops down the chain.
+                        # A call still waiting for quota never reached the provider and is not held against it.
+                        for other, (_, slow_provider) in running.items():
+                            if other in started:
+                                self.router.record(slow_provider, False, loop.time() - started[other])
+                    return result, model
+
+                if not running and next_index < len(chain):
+                    self.router.failovers += 1
+                    logger.warning(f"{model} failed ({errors[-1]}); failing over to {chain[next_index][0]}.")
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        if all(isinstance(e, AIRateLimitedError) for e in errors):
+            raise errors[-1]
+        error = next(e for e in reversed(errors) if not isinstance(e, AIRateLimitedError))
+        if isinstance(error, AIHandlerError):
+            raise error
+        raise AIExtractionError(f"Profile extraction failed: {error}") from error
+
+    async def _call_model(self, guild_id: int, model: str, provider: str, prompt: str, parse: Callable[[str], Any], max_tokens: int,
+                          on_request_start: Optional[Callable[[], None]] = None) -> Any:
+        """
+        Sends a prompt to one model once its quota allows and parses the reply, recording the provider's health.
+        `on_request_start` is called once the quota is granted, right before the provider request.
+        """
+        client = self._get_client(model)
+        try:
+            await self.rate_limiter.acquire(provider, model, guild_id)
+        except QuotaExceededError as e:
+            raise AIRateLimitedError(str(e)) from e
+
+        if on_request_start is not None:
+            on_request_start()
+        started = time.monotonic()
+        try:
+            if provider == "huggingface":
+                raw_response = await self._call_huggingface(client, model, prompt, max_tokens)
+            elif provider in ["poe", "deepseek", "openrouter"]:
+                raw_response = await self._call_openai_compatible(client, model, prompt, max_tokens)
+            elif provider == "google":
+                raw_response = await self._call_google(client, model, prompt, max_tokens)
+            else:
+                raise AIHandlerError("No valid AI provider configured.")
+            result = parse(raw_response)
+        except AIExtractionError:
+            self.router.record(provider, False, time.monotonic() - started)
+            raise
         except Exception as e:
+            self.router.record(provider, False, time.monotonic() - started)
+            is_rate_limited, retry_after = self._rate_limit_retry_after(e)
+            if is_rate_limited:
+                # Hold back every queued call to this model; the retry waits in the limiter too.
+                self.rate_limiter.report_rate_limited(provider, model, retry_after)
+                raise AIExtractionError(f"{model} is rate-limited by {provider}.") from e
             logger.error(f"An unexpected error occurred during profile extraction: {e}")
             raise AIExtractionError(f"Profile extraction failed: {str(e)}") from e
+        self.router.record(provider, True, time.monotonic() - started)
+        return result
+
+    @staticmethod
+    def _rate_limit_retry_after(error: Exception) -> Tuple[bool, Optional[float]]:
+        """
+        Checks whether a provider error is a rate-limit response (HTTP 429 / RESOURCE_EXHAUSTED).
+
+        Returns:
+            Tuple[bool, Optional[float]]: Whether it is, and the Retry-After delay in seconds if the provider sent one.
+        """
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(response, "status_code", None) or getattr(error, "code", None)
+        if status != 429:
+            return False, None
+        try:
+            return True, float((getattr(response, "headers", None) or {}).get("retry-after"))
+        except (TypeError, ValueError):
+            return True, None
+
+    def get_quota_state(self) -> Dict[str, Any]:
+        """Returns the rate limiter's live quota state (see AIRateLimiter.quota_state)."""
+        return self.rate_limiter.quota_state()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Returns the extraction cache's hit rate and saved provider calls (see ExtractionCache.stats)."""
+        return self.extraction_cache.stats()
+
+    def get_local_extraction_stats(self) -> Dict[str, Any]:
+        """Returns how many profiles were extracted locally and how many were escalated to a model."""
+        total = self.local_extractions + self.escalations
+        return {
+            "local": self.local_extractions,
+            "escalated": self.escalations,
+            "local_rate": self.local_extractions / total if total else 0.0,
+        }
+
+    def get_provider_health(self) -> Dict[str, Any]:
+        """Returns per-provider error rates and p95 latency, and hedge/failover counts (see ProviderRouter.state)."""
+        return self.router.state()
 
     def _get_provider_from_model(self, model_name: str) -> str:
         """Helper to determine the provider from the model name."""
@@ -180,36 +593,29 @@ class AIHandler:
         if model_name in OPENROUTER_MODELS: return "openrouter"
         return "unknown"
 
-    async def _call_huggingface(self, client: InferenceClient, model: str, prompt: str) -> str:
-        loop = asyncio.get_event_loop()
-        completion = await loop.run_in_executor(
-            None,
-            lambda: client.chat_completion(
-                messages=[{"role": "user", "content": prompt}],
-                model=model,
-                temperature=0.2,
-                max_tokens=512
-            )
+    async def _call_huggingface(self, client: AsyncInferenceClient, model: str, prompt: str, max_tokens: int = 512) -> str:
+        completion = await client.chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            temperature=0.2,
+            max_tokens=max_tokens
         )
         return completion.choices[0].message.content.strip()
 
-    async def _call_openai_compatible(self, client: openai.OpenAI, model: str, prompt: str) -> str:
-        loop = asyncio.get_event_loop()
-        chat = await loop.run_in_executor(
-            None,
-            lambda: client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-            )
+    async def _call_openai_compatible(self, client: openai.AsyncOpenAI, model: str, prompt: str, max_tokens: int = 512) -> str:
+        chat = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens
         )
         return chat.choices[0].message.content
 
-    async def _call_google(self, client: Any, model_name: str, prompt: str) -> str:
+    async def _call_google(self, client: Any, model_name: str, prompt: str, max_tokens: int = 512) -> str:
         model = client.GenerativeModel(model_name)
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: model.generate_content(prompt)
+        response = await model.generate_content_async(
+            prompt,
+            generation_config={"max_output_tokens": max_tokens},
+            request_options={"timeout": self._provider_timeout("google")}
         )
         return response.text
 
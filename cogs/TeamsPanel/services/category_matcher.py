@@ -18,6 +18,7 @@ class CategoryMatcher:
         """
         self.keyword_map: Dict[str, Set[str]] = defaultdict(set)
         self.specificity_scores: Dict[str, float] = {}
+        self.keyword_patterns: Dict[str, re.Pattern] = {}
         self._process_keywords()
 
     def _process_keywords(self):
@@ -40,6 +41,7 @@ class CategoryMatcher:
         # Score is inversely proportional to how common it is across categories.
         for keyword, count in keyword_category_counts.items():
             self.specificity_scores[keyword] = 1.0 / count
+            self.keyword_patterns[keyword] = re.compile(r'\b' + re.escape(keyword) + r'\b')
 
     def get_scored_categories(self, text: str) -> Dict[str, float]:
         """
@@ -57,11 +59,11 @@ class CategoryMatcher:
         text_lower = text.lower()
         category_scores = defaultdict(float)
 
-        # Find all unique keywords present in the text
+        # Find all unique keywords present in the text. The substring test rules out
+        # almost every keyword cheaply; only the rest pay for the word-boundary regex.
         matched_keywords = set()
-        for keyword in self.keyword_map.keys():
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, text_lower):
+        for keyword, pattern in self.keyword_patterns.items():
+            if keyword in text_lower and pattern.search(text_lower):
                 matched_keywords.add(keyword)
 
         # For each matched keyword, add its specificity score to all its associated categories
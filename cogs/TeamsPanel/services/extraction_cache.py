@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import bson
+
+from config import AI_EXTRACTION_CACHE_COLLECTION, AI_EXTRACTION_CACHE_MAX_ENTRIES, AI_EXTRACTION_CACHE_TTL
+from database import DatabaseUnavailableError, IndexSpec
+
+logger = logging.getLogger(__name__)
+
+class ExtractionCache:
+    """
+    Cache of profile extraction results, owned by AIHandler.
+
+    Entries are addressed by a hash of the normalized profile text, the model and the prompt
+    version, so the same introduction extracted by the same model and prompt is only paid for
+    once, whichever message or guild it comes from. Entries are persisted in the extraction cache
+    collection, which a TTL index empties after `ttl` seconds, behind an in-process LRU of up to
+    `max_entries` entries. Bumping the prompt version retires every earlier entry.
+
+    Documents: {_id: key, model, prompt_version, data, created_at}
+    """
+    INDEXES = {
+        AI_EXTRACTION_CACHE_COLLECTION: [
+            IndexSpec("created_at_ttl", (("created_at", 1),), expire_after_seconds=AI_EXTRACTION_CACHE_TTL),
+        ],
+    }
+
+    def __init__(self, db, prompt_version: int, max_entries: int = AI_EXTRACTION_CACHE_MAX_ENTRIES, ttl: int = AI_EXTRACTION_CACHE_TTL):
+        """
+        Args:
+            db (DatabaseManager): The shared database manager.
+            prompt_version (int): Version of the extraction prompt; part of every key.
+            max_entries (int): Entries kept in memory before the least recently used one is evicted.
+            ttl (int): Seconds an entry is served after it was stored.
+        """
+        self.db = db
+        self.db.register_indexes(self.INDEXES)
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()  # key -> (BSON of the data, stored_at)
+
+        # Counters exposed through stats()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Folds differences that cannot change the extraction: Unicode forms, case and whitespace."""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+    def key(self, model: str, text: str) -> str:
+        payload = f"{self.prompt_version}\0{model}\0{self.normalize(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, model: str, text: str) -> Optional[Dict[str, Any]]:
+        """Returns a copy of the cached extraction of `text` by `model`, or None on a miss."""
+        key = self.key(model, text)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.time() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return bson.decode(entry[0])
+            del self._entries[key]
+
+        try:
+            doc = await self.db.find_one(AI_EXTRACTION_CACHE_COLLECTION, {"_id": key})
+        except DatabaseUnavailableError as e:
+            logger.warning(f"Extraction cache lookup skipped: {e}")
+            doc = None
+        # The TTL monitor only runs once a minute, so expired documents may still be found
+        age = (datetime.utcnow() - doc["created_at"]).total_seconds() if doc is not None else None
+        if age is None or age >= self.ttl:
+            self.misses += 1
+            return None
+
+        self.db_hits += 1
+        self._remember(key, doc["data"], time.time() - age)
+        return doc["data"]
+
+    async def put(self, model: str, text: str, data: Dict[str, Any]):
+        """Stores an extraction. Failing to persist it only costs a future call, so errors are logged."""
+        key = self.key(model, text)
+        now = datetime.utcnow()
+        self._remember(key, data, time.time())
+        self.stores += 1
+        try:
+            await self.db.update_one(
+                AI_EXTRACTION_CACHE_COLLECTION,
+                {"_id": key},
+                {"$set": {"model": model, "prompt_version": self.prompt_version, "data": data, "created_at": now}},
+                upsert=True
+            )
+        except DatabaseUnavailableError as e:
+            logger.warning(f"Could not persist extraction cache entry: {e}")
+
+    def _remember(self, key: str, data: Dict[str, Any], stored_at: float):
+        self._entries[key] = (bson.encode(data), stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the provider calls hits have saved."""
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_calls": hits,
+            "stores": self.stores,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,213 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..services.category_matcher import CategoryMatcher
+from ..utils.timezone_utils import TimezoneProcessor
+
+# Spelled-out timezone names and the abbreviation they map to. Longer names are matched first.
+TIMEZONE_ALIASES = {
+    "eastern standard time": "EST", "eastern daylight time": "EDT", "eastern time": "EST",
+    "central standard time": "CST", "central daylight time": "CDT", "central time": "CST",
+    "mountain standard time": "MST", "mountain daylight time": "MDT", "mountain time": "MST",
+    "pacific standard time": "PST", "pacific daylight time": "PDT", "pacific time": "PST",
+    "alaska time": "AKST", "hawaii time": "HST", "greenwich mean time": "GMT",
+    "central european summer time": "CEST", "central european time": "CET", "central european": "CET",
+    "eastern european summer time": "EEST", "eastern european time": "EET", "eastern european": "EET",
+    "india standard time": "IST", "indian standard time": "IST", "japan standard time": "JST", "japan time": "JST",
+    "australian eastern daylight time": "AEDT", "australian eastern standard time": "AEST", "australian eastern time": "AEST",
+}
+
+@dataclass
+class LocalExtraction:
+    """Result of a local extraction: data in the AI extraction schema and how far it can be trusted (0-1)."""
+    data: Dict[str, Any]
+    confidence: float
+
+class LocalProfileExtractor:
+    """
+    Rule-based profile extraction that needs no AI call.
+
+    The text is split into sentences; goals and habits are the phrases that follow markers such
+    as "I want to" or "every morning", split on "and" and commas. The timezone comes from
+    abbreviations, UTC/GMT offsets or spelled-out names, and categories from CategoryMatcher,
+    as in TeamScoringEngine's fallback.
+
+    The confidence is the product of three factors: the share of the text the rules accounted
+    for (greetings and introductions aside), the share of goals and habits that matched a
+    category, and whether a single timezone was found. Profiles that read like a list of
+    intentions score close to 1; free-form prose scores low and should go to the AI model.
+    """
+    GOAL_MARKERS = re.compile(
+        r"\b(?:i\s+(?:really\s+|also\s+)?(?:want|wanna|would\s+like|'d\s+like|hope|plan|aim|intend|need)\s+to"
+        r"|i(?:'m|\s+am)\s+(?:trying|aiming|planning|hoping|working|going)\s+to|i(?:'d|\s+would)\s+love\s+to"
+        r"|my\s+(?:main\s+|biggest\s+)?goals?\s+(?:is|are|(?:for\s+[\w\s]+?\s+)?(?:is|are))(?:\s+to)?|goals?\s*:)\s*",
+        re.IGNORECASE
+    )
+    HABIT_MARKERS = re.compile(
+        r"\b(?:i\s+(?:also\s+|really\s+)?(?:like|love|enjoy)\s+(?:to\s+)?|i\s+(?:usually|often|always|regularly|currently|also)\s+"
+        r"|my\s+(?:daily\s+)?(?:hobbies|habits|routine)\s+(?:are|is|include|includes)\s+|(?:hobbies|habits|routine)\s*:"
+        r"|in\s+my\s+free\s+time,?\s+i\s+)\s*",
+        re.IGNORECASE
+    )
+    # Frequency phrases mark the whole clause as a habit, e.g. "I run every morning"
+    HABIT_FREQUENCY = re.compile(r"\b(?:every\s+(?:day|morning|evening|night|week|weekend)|daily|weekly|each\s+(?:day|morning|week))\b", re.IGNORECASE)
+    FILLER = re.compile(
+        r"^\W*(?:hi|hello|hey|greetings|yo|good\s+(?:morning|evening))\b,?(?:\s+\w+){0,2}\W*$"
+        r"|^\W*(?:i'?m|i\s+am|my\s+name\s+is|this\s+is|call\s+me)\s+[A-Za-z]+\W*$"
+        r"|nice\s+to\s+meet|thank(?:s|\s+you)|excited\s+to\s+(?:join|be\s+here)|glad\s+to\s+be\s+here|looking\s+forward",
+        re.IGNORECASE
+    )
+    TIMEZONE_LABEL = re.compile(r"\b(?:my\s+)?(?:time\s*zone|tz)\s*(?:is|:|-|=)?|\b(?:i'?m(?:\s+(?:in|on))?|based\s+in)\b", re.IGNORECASE)
+    TIMEZONE_HINT = re.compile(r"\b(?:time\s*zone|tz|utc|gmt)\b|\b\w+\s+time\b(?=\s*(?:zone|\)|,|\.|$))", re.IGNORECASE)
+    SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+|;|•")
+    ITEM_BREAK = re.compile(r",|\band\b|&|\balso\b|\bplus\b", re.IGNORECASE)
+    MAX_ITEM_WORDS = 8  # Longer phrases are left for the AI model to summarize
+
+    def __init__(self, category_matcher: Optional[CategoryMatcher] = None):
+        """
+        Args:
+            category_matcher (CategoryMatcher, optional): Shared matcher; building one parses the keyword taxonomy.
+        """
+        self.category_matcher = category_matcher or CategoryMatcher()
+        self.tz_processor = TimezoneProcessor()
+        abbreviations = sorted(TimezoneProcessor.TIMEZONE_MAP, key=len, reverse=True)
+        self._abbreviation_pattern = re.compile(r"\b(" + "|".join(abbreviations) + r")\b")  # Case-sensitive: "est" is a word in other languages
+        self._offset_pattern = re.compile(r"\b(?:UTC|GMT)\s?[+-]\s?\d{1,2}(?::\d{2})?", re.IGNORECASE)
+        aliases = sorted(TIMEZONE_ALIASES, key=len, reverse=True)
+        self._alias_pattern = re.compile(r"\b(" + "|".join(re.escape(alias) for alias in aliases) + r")\b", re.IGNORECASE)
+        self._labelled_pattern = re.compile(r"\b(?:time\s*zone|tz)\s*(?:is|:|-|=)?\s*([A-Za-z]{2,5})\b", re.IGNORECASE)
+        self._abbreviation_by_offset: Dict[float, str] = {}
+        for abbreviation, offset in TimezoneProcessor.TIMEZONE_MAP.items():
+            self._abbreviation_by_offset.setdefault(offset, abbreviation)
+
+    def extract(self, text: str) -> LocalExtraction:
+        """Extracts timezone, goals, habits and category from a profile text."""
+        timezones: List[str] = []
+        goals: List[str] = []
+        habits: List[str] = []
+        covered_words = total_words = 0
+
+        for sentence in self.SENTENCE_BREAK.split(text):
+            sentence = sentence.strip()
+            found = self._find_timezones(sentence) if sentence else []
+            if not sentence or (not found and self.FILLER.search(sentence)):
+                continue
+            remainder = sentence
+            for timezone, span in found:
+                timezones.append(timezone)
+                remainder = remainder.replace(span, " ")
+            if found:
+                remainder = self.TIMEZONE_LABEL.sub(" ", remainder)
+
+            sentence_goals, sentence_habits, unexplained = self._split_items(remainder)
+            goals += sentence_goals
+            habits += sentence_habits
+            words = len(self._words(sentence))
+            total_words += words
+            covered_words += max(0, words - len(self._words(unexplained)))
+
+        data: Dict[str, Any] = {}
+        unique_timezones = list(dict.fromkeys(timezones))
+        if unique_timezones:
+            data["timezone"] = unique_timezones[0]
+        if habits:
+            data["habits"] = list(dict.fromkeys(habits))
+        if goals:
+            data["goals"] = list(dict.fromkeys(goals))
+
+        items = data.get("habits", []) + data.get("goals", [])
+        category: Dict[str, List[str]] = {}
+        categorized = 0
+        for item in items:
+            matches = self.category_matcher.get_top_categories(item, n=2)
+            categorized += bool(matches)
+            for match, _ in matches:
+                domain, sub_category = match.split(":", 1)
+                if sub_category not in category.setdefault(domain, []):
+                    category[domain].append(sub_category)
+        if category:
+            data["category"] = category
+
+        if not items or not total_words:
+            return LocalExtraction(data, 0.0)
+        coverage = covered_words / total_words
+        category_coverage = categorized / len(items)
+        if len(unique_timezones) == 1:
+            timezone_factor = 1.0
+        elif len(unique_timezones) > 1 or self.TIMEZONE_HINT.search(text):
+            timezone_factor = 0.5  # Conflicting timezones, or one mentioned in a form the rules do not know
+        else:
+            timezone_factor = 0.85  # Most profiles state a timezone; the AI model may find one the rules missed
+        return LocalExtraction(data, round(coverage * category_coverage * timezone_factor, 3))
+
+    # ========== TIMEZONES ==========
+
+    def _find_timezones(self, sentence: str) -> List[Tuple[str, str]]:
+        """Returns (abbreviation, matched text) for each timezone mentioned in a sentence."""
+        found = []
+        for match in self._offset_pattern.finditer(sentence):
+            offset = self.tz_processor.parse_to_utc_offset(re.sub(r"\s", "", match.group(0)))
+            if offset in self._abbreviation_by_offset:
+                found.append((self._abbreviation_by_offset[offset], match.group(0)))
+        searched = self._offset_pattern.sub(" ", sentence)
+        for match in self._alias_pattern.finditer(searched):
+            found.append((TIMEZONE_ALIASES[match.group(1).lower()], match.group(0)))
+        searched = self._alias_pattern.sub(" ", searched)
+        for match in self._labelled_pattern.finditer(searched):
+            abbreviation = match.group(1).upper()
+            if abbreviation in TimezoneProcessor.TIMEZONE_MAP:
+                found.append((abbreviation, match.group(0)))
+        searched = self._labelled_pattern.sub(" ", searched)
+        for match in self._abbreviation_pattern.finditer(searched):
+            found.append((match.group(1), match.group(0)))
+        return found
+
+    # ========== GOALS & HABITS ==========
+
+    def _split_items(self, sentence: str) -> Tuple[List[str], List[str], str]:
+        """
+        Splits a sentence at its goal and habit markers.
+
+        Returns:
+            Tuple[List[str], List[str], str]: The goals, the habits, and the text no rule accounted for.
+        """
+        markers = sorted(
+            [(match.start(), match.end(), "goals") for match in self.GOAL_MARKERS.finditer(sentence)]
+            + [(match.start(), match.end(), "habits") for match in self.HABIT_MARKERS.finditer(sentence)]
+        )
+        goals: List[str] = []
+        habits: List[str] = []
+        lead = sentence[:markers[0][0]] if markers else sentence
+        unexplained = [lead]
+        if self.HABIT_FREQUENCY.search(lead):
+            items, leftover = self._items(lead)
+            habits.extend(items)
+            unexplained = [leftover]
+
+        for index, (_, end, kind) in enumerate(markers):
+            if index + 1 < len(markers) and markers[index + 1][0] < end:
+                continue  # Overlapping markers, e.g. "I also want to"; the later one wins
+            segment_end = markers[index + 1][0] if index + 1 < len(markers) else len(sentence)
+            items, leftover = self._items(sentence[end:segment_end])
+            (goals if kind == "goals" else habits).extend(items)
+            unexplained.append(leftover)
+        return goals, habits, " ".join(unexplained)
+
+    def _items(self, segment: str) -> Tuple[List[str], str]:
+        """Splits a marker's phrase into items; phrases too long to be an item are returned as unexplained."""
+        items, unexplained = [], []
+        for part in self.ITEM_BREAK.split(segment):
+            item = re.sub(r"^\W*(?:i\s+)?(?:to\s+)?|[^\w+#]*$", "", part.strip(), flags=re.IGNORECASE)
+            item = re.sub(r"\s+", " ", item)
+            if not self._words(item):
+                continue
+            if len(self._words(item)) > self.MAX_ITEM_WORDS:
+                unexplained.append(item)
+                continue
+            items.append(item)
+        return items, " ".join(unexplained)
+
+    @staticmethod
+    def _words(text: str) -> List[str]:
+        return re.findall(r"[A-Za-z0-9+#]+", text)
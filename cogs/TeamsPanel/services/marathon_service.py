@@ -8,7 +8,7 @@ logger = logging.getLogger(__name__)
 class MarathonService:
     """
     Handles the lifecycle of a marathon event by provisioning and deprovisioning
-    Discord resources (roles and channels) for teams.
+    Discord resources (roles and channels) for teams, and archiving the teams once it ends.
     """
     def __init__(self, team_manager):
         """
@@ -62,14 +62,19 @@ class MarathonService:
     async def end_marathon(self, guild: discord.Guild) -> Dict:
         """
         Handles the logic for ending a marathon. It removes all marathon-related
-        roles from members and deletes the team channels.
+        roles from members, deletes the team channels and moves the teams to the archive.
+
+        If archiving is interrupted the marathon stays active, so ending it again
+        finishes the archive (deprovisioning skips resources that are already gone).
         """
         # Check if marathon is active
-        is_active = await self.team_manager.team_service.get_marathon_state(guild.id)
-        if not is_active:
+        state = await self.team_manager.team_service.get_marathon_state_document(guild.id)
+        if not state or not state.get("is_active"):
             return {"error": "No active marathon found for this guild"}
+        # Marathons started before ids were assigned are identified by their start time
+        marathon_id = state.get("marathon_id") or self.team_manager.team_service.new_marathon_id(state.get("last_changed"))
 
-        report = {"removed_channels": [], "removed_roles": [], "processed_teams": []}
+        report = {"removed_channels": [], "removed_roles": [], "processed_teams": [], "marathon_id": marathon_id}
         teams = await self.team_manager.get_all_teams(guild.id)
 
         team_leader_role = discord.utils.get(guild.roles, name="Team Leader")
@@ -87,8 +92,15 @@ class MarathonService:
             if removed_channel:
                 report["removed_channels"].append(removed_channel.name)
 
+        archive = await self.team_manager.team_service.archive_teams(guild.id, marathon_id)
+        report["archived_teams"] = archive["archived"]
+        if archive["remaining"]:
+            report["archive_remaining"] = archive["remaining"]
+            report["marathon_state"] = "active (archive incomplete)"
+            return report
+
         # Set marathon state to inactive
-        await self.team_manager.team_service.set_marathon_state(guild.id, False)
+        await self.team_manager.team_service.set_marathon_state(guild.id, False, marathon_id)
         report["marathon_state"] = "deactivated"
 
         return report
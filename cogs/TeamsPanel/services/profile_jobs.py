@@ -0,0 +1,332 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+
+from config import (
+    PROFILE_JOBS_COLLECTION, PROFILE_JOB_WORKERS, PROFILE_JOB_MAX_QUEUED_PER_GUILD, PROFILE_JOB_LEASE,
+    PROFILE_JOB_MAX_ATTEMPTS, PROFILE_JOB_SWEEP_INTERVAL, PROFILE_JOB_BATCH_SIZE, PROFILE_JOB_RETRY_BACKOFF, PROFILE_JOB_RETRY_BACKOFF_MAX
+)
+from database import DatabaseUnavailableError, IndexSpec
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class ProfileJobQueue:
+    """
+    Durable queue of profile-extraction jobs, one per message, processed by a bounded pool of workers.
+
+    Jobs are documents in the profile jobs collection:
+    {message_id, guild_id, channel_id, status ("queued" | "running" | "done" | "failed"),
+    attempts, enqueued_at, started_at, finished_at, lease_until, claim_id, not_before, error}
+
+    Workers take turns between guilds that have queued jobs, so one guild's backlog cannot hold
+    up the others. Jobs are claimed atomically and leased for `lease` seconds; a job whose lease
+    runs out (e.g. the bot restarted mid-extraction) is queued again, up to `max_attempts` runs.
+    Only the worker holding a job's current claim can record its outcome, so a worker that outlived
+    its lease cannot overwrite the run that replaced it.
+    Queued jobs survive restarts and are picked up by `start()`.
+
+    With a `batch_handler`, a worker claims up to `batch_size` queued jobs of the guild at once
+    and runs them together, e.g. to extract several profiles in one AI request. Jobs the batch
+    could not finish are queued again until they run out of attempts, each retry waiting
+    `retry_backoff` seconds doubled per attempt (at most `retry_backoff_max`), so a provider that
+    is out of quota is not hammered until every job has failed.
+    """
+    INDEXES = {
+        PROFILE_JOBS_COLLECTION: [
+            IndexSpec("message_id_unique", (("message_id", 1),), unique=True),
+            IndexSpec("status_guild_enqueued_at", (("status", 1), ("guild_id", 1), ("enqueued_at", 1))),
+            IndexSpec("status_lease_until", (("status", 1), ("lease_until", 1))),
+        ],
+    }
+
+    def __init__(
+        self,
+        db,
+        handler: Callable[[Dict[str, Any]], Awaitable[bool]],
+        on_status: Optional[Callable[[Dict[str, Any], str], Awaitable[None]]] = None,
+        workers: int = PROFILE_JOB_WORKERS,
+        max_queued_per_guild: int = PROFILE_JOB_MAX_QUEUED_PER_GUILD,
+        lease: float = PROFILE_JOB_LEASE,
+        max_attempts: int = PROFILE_JOB_MAX_ATTEMPTS,
+        sweep_interval: float = PROFILE_JOB_SWEEP_INTERVAL,
+        batch_handler: Optional[Callable[[List[Dict[str, Any]]], Awaitable[Dict[int, Optional[bool]]]]] = None,
+        batch_size: int = PROFILE_JOB_BATCH_SIZE,
+        retry_backoff: float = PROFILE_JOB_RETRY_BACKOFF,
+        retry_backoff_max: float = PROFILE_JOB_RETRY_BACKOFF_MAX
+    ):
+        """
+        Args:
+            db (DatabaseManager): The shared database manager.
+            handler (callable): Runs a job; returns True if the profile was extracted and saved.
+            on_status (callable, optional): Called as on_status(job, status) after each status change, e.g. to update reactions.
+            workers (int): Jobs processed at once.
+            max_queued_per_guild (int): Queued jobs a guild may have before `enqueue` refuses new ones.
+            lease (float): Seconds a job may run before it is presumed abandoned. Also the handler's time limit.
+            max_attempts (int): Runs of a job before an abandoned job is marked failed.
+            sweep_interval (float): Seconds between checks for abandoned jobs and jobs queued by other instances.
+            batch_handler (callable, optional): Runs several jobs of one guild; returns message_id -> True (saved),
+                False (failed for good) or None (retry later). Missing message IDs count as None.
+            batch_size (int): Jobs claimed at once when a batch handler is set.
+            retry_backoff (float): Seconds before a job the batch could not finish is retried, doubled per attempt.
+            retry_backoff_max (float): Longest wait before a retry.
+        """
+        self.db = db
+        self.db.register_indexes(self.INDEXES)
+        self.handler = handler
+        self.on_status = on_status
+        self.workers = workers
+        self.max_queued_per_guild = max_queued_per_guild
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self.batch_handler = batch_handler
+        self.batch_size = batch_size if batch_handler else 1
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._ready_guilds: "OrderedDict[int, None]" = OrderedDict()  # Guilds that may have queued jobs, in serving order
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    # ========== PRODUCERS ==========
+
+    async def enqueue(self, guild_id: int, channel_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Queues the extraction of one message. A message already queued or running is not queued
+        again; a finished one is queued for a fresh run.
+
+        Returns:
+            Optional[dict]: The queued job, or None if it was a duplicate or the guild's queue is full.
+        """
+        if await self.db.count_documents(PROFILE_JOBS_COLLECTION, {"status": QUEUED, "guild_id": guild_id}) >= self.max_queued_per_guild:
+            logger.warning(f"Profile job queue for guild {guild_id} is full; refusing message {message_id}.")
+            return None
+
+        now = datetime.utcnow()
+        job_id = ObjectId()
+        fresh = {"status": QUEUED, "attempts": 0, "enqueued_at": now, "started_at": None, "finished_at": None, "not_before": None, "error": None}
+        job = await self.db.find_one_and_update(
+            PROFILE_JOBS_COLLECTION,
+            {"message_id": message_id},
+            {"$setOnInsert": {"_id": job_id, "guild_id": guild_id, "channel_id": channel_id, **fresh}},
+            upsert=True
+        )
+        if job is None:
+            return None
+        if job["_id"] != job_id:
+            if job["status"] in (QUEUED, RUNNING):
+                return None
+            # A finished job: run it again, unless another request re-queued it first
+            job = await self.db.find_one_and_update(
+                PROFILE_JOBS_COLLECTION, {"_id": job["_id"], "status": job["status"]}, {"$set": fresh}
+            )
+            if job is None:
+                return None
+
+        await self._notify(job, QUEUED)
+        self._mark_ready(guild_id)
+        return job
+
+    async def get_counts(self, guild_id: Optional[int] = None) -> Dict[str, int]:
+        """Counts jobs per status, for one guild or all of them."""
+        match = {"guild_id": guild_id} if guild_id is not None else {}
+        rows = await self.db.aggregate(PROFILE_JOBS_COLLECTION, [{"$match": match}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+        return {row["_id"]: row["count"] for row in rows}
+
+    # ========== LIFECYCLE ==========
+
+    def start(self):
+        """Starts the workers and the sweeper. Unfinished jobs from earlier runs are resumed. Safe to call more than once."""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._sweep_loop())]
+        self._tasks += [loop.create_task(self._worker(index)) for index in range(self.workers)]
+
+    async def stop(self):
+        """Stops the workers. Running jobs are left to be re-queued once their lease runs out."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ========== WORKERS ==========
+
+    def _mark_ready(self, guild_id: int):
+        if guild_id not in self._ready_guilds:
+            self._ready_guilds[guild_id] = None
+        self._wakeup.set()
+
+    async def _claim_next(self) -> List[Dict[str, Any]]:
+        """Claims the oldest queued jobs (up to `batch_size`) of the next guild in turn; empty if no guild has any."""
+        while self._ready_guilds:
+            guild_id = next(iter(self._ready_guilds))
+            # Rotate before claiming, so concurrent workers start on different guilds
+            self._ready_guilds.move_to_end(guild_id)
+            jobs = await self._claim(guild_id)
+            if not jobs:
+                self._ready_guilds.pop(guild_id, None)
+                continue
+            return jobs
+        return []
+
+    async def _claim(self, guild_id: int) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        # Tag the claim so only this worker can record the outcome, and in batches so only the jobs it won are returned
+        claim_id = ObjectId()
+        claim = {"status": RUNNING, "started_at": now, "lease_until": now + timedelta(seconds=self.lease), "claim_id": claim_id}
+        due = {"status": QUEUED, "guild_id": guild_id, "not_before": {"$not": {"$gt": now}}}  # Jobs backing off are skipped
+        if self.batch_size <= 1:
+            job = await self.db.find_one_and_update(
+                PROFILE_JOBS_COLLECTION,
+                due,
+                {"$set": claim, "$inc": {"attempts": 1}},
+                sort=[("enqueued_at", 1)]
+            )
+            return [job] if job else []
+
+        candidates = await self.db.find_with_projection(
+            PROFILE_JOBS_COLLECTION, due, {"_id": 1}, sort=[("enqueued_at", 1)], limit=self.batch_size
+        )
+        if not candidates:
+            return []
+        # Another worker may take some candidates first
+        await self.db.update_many(
+            PROFILE_JOBS_COLLECTION,
+            {"_id": {"$in": [job["_id"] for job in candidates]}, "status": QUEUED},
+            {"$set": claim, "$inc": {"attempts": 1}}
+        )
+        jobs = await self.db.find_many(PROFILE_JOBS_COLLECTION, {"claim_id": claim_id, "status": RUNNING})
+        return sorted(jobs, key=lambda job: job["enqueued_at"])
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                jobs = await self._claim_next()
+            except DatabaseUnavailableError as e:
+                logger.warning(f"Profile job worker {index} paused: {e}")
+                await asyncio.sleep(self.sweep_interval)
+                continue
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.sweep_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if self.batch_handler:
+                await self._run_batch(jobs)
+            else:
+                await self._run(jobs[0])
+
+    async def _run(self, job: Dict[str, Any]):
+        await self._notify(job, RUNNING)
+        error = None
+        try:
+            succeeded = await asyncio.wait_for(self.handler(job), self._lease_remaining([job]))
+            if not succeeded:
+                error = "extraction failed"
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.lease:.0f}s"
+        except Exception as e:
+            logger.error(f"Profile job for message {job['message_id']} failed: {e}", exc_info=True)
+            error = str(e) or type(e).__name__
+        await self._finish(job, FAILED if error else DONE, error)
+
+    async def _run_batch(self, jobs: List[Dict[str, Any]]):
+        for job in jobs:
+            await self._notify(job, RUNNING)
+        outcomes: Dict[int, Optional[bool]] = {}
+        error = "extraction failed"
+        try:
+            outcomes = await asyncio.wait_for(self.batch_handler(jobs), self._lease_remaining(jobs))
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.lease:.0f}s"
+        except Exception as e:
+            logger.error(f"Profile job batch of {len(jobs)} message(s) failed: {e}", exc_info=True)
+            error = str(e) or type(e).__name__
+
+        for job in jobs:
+            outcome = outcomes.get(job["message_id"])
+            if outcome is True:
+                await self._finish(job, DONE, None)
+            elif outcome is False or job["attempts"] >= self.max_attempts:
+                await self._finish(job, FAILED, error)
+            else:
+                await self._finish(job, QUEUED, error)
+
+    @staticmethod
+    def _lease_remaining(jobs: List[Dict[str, Any]]) -> float:
+        """Seconds left on the earliest lease among `jobs`; it started at the claim, before the status notifications."""
+        return max(0.0, min((job["lease_until"] - datetime.utcnow()).total_seconds() for job in jobs))
+
+    async def _finish(self, job: Dict[str, Any], status: str, error: Optional[str]):
+        """Records the outcome of a run; QUEUED puts the job back for another attempt after its backoff."""
+        now = datetime.utcnow()
+        delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** max(0, job["attempts"] - 1))
+        if status == QUEUED:
+            update = {"$set": {"status": QUEUED, "not_before": now + timedelta(seconds=delay), "error": error}, "$unset": {"lease_until": "", "claim_id": ""}}
+        else:
+            update = {"$set": {"status": status, "finished_at": now, "error": error}, "$unset": {"lease_until": "", "claim_id": ""}}
+        try:
+            recorded = await self.db.update_one(PROFILE_JOBS_COLLECTION, {"_id": job["_id"], "status": RUNNING, "claim_id": job.get("claim_id")}, update)
+        except DatabaseUnavailableError as e:
+            # The lease runs out and the job is retried, which is harmless: extraction overwrites the same profile.
+            logger.warning(f"Could not record the result of profile job {job['message_id']}: {e}")
+            recorded = True
+        if not recorded:
+            logger.info(f"Profile job {job['message_id']} was re-queued or claimed again after its lease ran out; dropping this run's result.")
+            return
+        if status == QUEUED:
+            asyncio.get_running_loop().call_later(delay, self._mark_ready, job["guild_id"])
+        await self._notify(job, status)
+
+    async def _notify(self, job: Dict[str, Any], status: str):
+        if self.on_status is None:
+            return
+        try:
+            await self.on_status(job, status)
+        except Exception as e:
+            logger.warning(f"Failed to report status '{status}' of profile job {job['message_id']}: {e}")
+
+    # ========== RECOVERY ==========
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except DatabaseUnavailableError as e:
+                logger.warning(f"Profile job sweep skipped: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def sweep(self) -> int:
+        """
+        Re-queues jobs whose lease ran out (failing those out of attempts) and schedules every
+        guild with queued jobs, including jobs left from before a restart.
+
+        Returns:
+            int: The number of abandoned jobs that were re-queued.
+        """
+        now = datetime.utcnow()
+        expired = {"status": RUNNING, "lease_until": {"$lt": now}}
+        failed = await self.db.update_many(
+            PROFILE_JOBS_COLLECTION,
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": FAILED, "finished_at": now, "error": "abandoned"}, "$unset": {"lease_until": "", "claim_id": ""}}
+        )
+        if failed:
+            logger.warning(f"Gave up on {failed} abandoned profile job(s) after {self.max_attempts} attempts.")
+        requeued = await self.db.update_many(
+            PROFILE_JOBS_COLLECTION, expired, {"$set": {"status": QUEUED}, "$unset": {"lease_until": "", "claim_id": ""}}
+        )
+        if requeued:
+            logger.info(f"Re-queued {requeued} abandoned profile job(s).")
+
+        for guild_id in await self.db.distinct(PROFILE_JOBS_COLLECTION, "guild_id", {"status": QUEUED}):
+            self._mark_ready(guild_id)
+        return requeued
@@ -0,0 +1,124 @@
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import (
+    AI_HEDGE_ENABLED, AI_HEDGE_MIN_DELAY, AI_HEDGE_DEFAULT_DELAY, AI_HEALTH_WINDOW, AI_HEALTH_MIN_SAMPLES, AI_HEALTH_MAX_ERROR_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+class ProviderHealth:
+    """Rolling record of one provider's recent calls: (finished_at, succeeded, latency) within `window` seconds."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.samples: Deque[Tuple[float, bool, float]] = deque()
+
+    def record(self, succeeded: bool, latency: float, now: float):
+        self.samples.append((now, succeeded, latency))
+        self._prune(now)
+
+    def _prune(self, now: float):
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def error_rate(self, now: float) -> float:
+        self._prune(now)
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, succeeded, _ in self.samples if not succeeded) / len(self.samples)
+
+    def p95(self, now: float) -> Optional[float]:
+        """95th percentile latency of successful calls, or None without any."""
+        self._prune(now)
+        latencies = sorted(latency for _, succeeded, latency in self.samples if succeeded)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+
+class ProviderRouter:
+    """
+    Orders the models an AI call may use and decides when to hedge it, from each provider's
+    recent health.
+
+    The chain is the guild's active model followed by its fallback models. Providers whose
+    error rate over the last `window` seconds exceeds `max_error_rate` are moved to the end of
+    the chain instead of being dropped, so a call still reaches them if everything else fails,
+    and they return to their place once their errors age out of the window.
+
+    A call is hedged once its provider request has run for the provider's observed p95 latency
+    (at least `min_delay`); time spent waiting for quota does not count. The next model in the
+    chain is started and whichever valid reply arrives first is used.
+    """
+
+    def __init__(self, hedge_enabled: bool = AI_HEDGE_ENABLED, min_delay: float = AI_HEDGE_MIN_DELAY, default_delay: float = AI_HEDGE_DEFAULT_DELAY,
+                 window: float = AI_HEALTH_WINDOW, min_samples: int = AI_HEALTH_MIN_SAMPLES, max_error_rate: float = AI_HEALTH_MAX_ERROR_RATE):
+        """
+        Args:
+            hedge_enabled (bool): Whether slow calls are hedged. Failover after errors happens either way.
+            min_delay (float): Seconds a call runs before it may be hedged.
+            default_delay (float): Hedge delay for providers with fewer than `min_samples` successful calls.
+            window (float): Seconds of calls that health is computed from.
+            min_samples (int): Calls in the window before a provider's error rate or p95 is trusted.
+            max_error_rate (float): Error rate above which a provider is tried last.
+        """
+        self.hedge_enabled = hedge_enabled
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self._health: Dict[str, ProviderHealth] = {}
+
+        # Counters exposed through state()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def _health_for(self, provider: str) -> ProviderHealth:
+        if provider not in self._health:
+            self._health[provider] = ProviderHealth(self.window)
+        return self._health[provider]
+
+    def record(self, provider: str, succeeded: bool, latency: float):
+        """Records the outcome of one provider call."""
+        self._health_for(provider).record(succeeded, latency, time.monotonic())
+
+    def is_healthy(self, provider: str) -> bool:
+        health = self._health_for(provider)
+        now = time.monotonic()
+        return len(health.samples) < self.min_samples or health.error_rate(now) <= self.max_error_rate
+
+    def order(self, models: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Orders (model, provider) pairs for a call: healthy providers first, each group in its configured order."""
+        healthy = [entry for entry in models if self.is_healthy(entry[1])]
+        return healthy + [entry for entry in models if entry not in healthy]
+
+    def hedge_delay(self, provider: str, timeout: float) -> Optional[float]:
+        """Seconds after which a call to `provider` is hedged, or None if it should not be."""
+        if not self.hedge_enabled:
+            return None
+        health = self._health_for(provider)
+        p95 = health.p95(time.monotonic())
+        successes = sum(1 for _, succeeded, _ in health.samples if succeeded)
+        delay = p95 if p95 is not None and successes >= self.min_samples else self.default_delay
+        delay = max(self.min_delay, delay)
+        # A hedge after the timeout would only duplicate the failover
+        return delay if delay < timeout else None
+
+    def state(self) -> Dict[str, Any]:
+        """Returns per-provider call counts, error rate, p95 latency and health, and the hedge/failover counters."""
+        now = time.monotonic()
+        providers = {}
+        for provider, health in self._health.items():
+            p95 = health.p95(now)
+            providers[provider] = {
+                "calls": len(health.samples),
+                "error_rate": health.error_rate(now),
+                "p95_s": p95,
+                "healthy": self.is_healthy(provider),
+            }
+        return {"providers": providers, "hedges": self.hedges, "hedge_wins": self.hedge_wins, "failovers": self.failovers}
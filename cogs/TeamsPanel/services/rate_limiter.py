@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import AI_MODEL_QUOTAS, AI_PROVIDER_QUOTAS, AI_MODEL_COSTS, AI_RATE_LIMIT_MAX_WAIT, AI_RATE_LIMIT_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+# Quota keys and the period (seconds) their token bucket refills over
+QUOTA_PERIODS = {"rpm": 60.0, "rpd": 86400.0, "points_per_day": 86400.0}
+
+class QuotaExceededError(Exception):
+    """Raised when a call cannot get quota within the limiter's maximum wait."""
+    pass
+
+class TokenBucket:
+    """Holds up to `capacity` tokens, refilled continuously at `capacity` per `period` seconds."""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now, inf if they never will be)."""
+        self._refill(now)
+        if cost <= self.tokens:
+            return 0.0
+        if cost > self.capacity:
+            return float("inf")
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float, now: float):
+        self._refill(now)
+        self.tokens -= cost
+
+@dataclass
+class _Waiter:
+    model: str
+    cost: float
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.monotonic)
+
+class AIRateLimiter:
+    """
+    Queues AI provider calls so they stay within the quotas declared in config.py.
+
+    Every call spends one token from each of its model's buckets (AI_MODEL_QUOTAS) and
+    `cost` tokens from each of its provider's shared buckets (AI_PROVIDER_QUOTAS). Each
+    provider has one queue, served round-robin across guilds so a single busy guild
+    cannot starve the others; calls of one guild keep their order. A waiting call is granted
+    as soon as its buckets allow, even if calls queued for other models are still blocked.
+
+    The limiter is shared by every guild, since quotas belong to the bot's API keys.
+    """
+
+    def __init__(self, model_quotas: Dict[str, Dict[str, float]] = AI_MODEL_QUOTAS, provider_quotas: Dict[str, Dict[str, float]] = AI_PROVIDER_QUOTAS,
+                 model_costs: Dict[str, float] = AI_MODEL_COSTS, max_wait: float = AI_RATE_LIMIT_MAX_WAIT, backoff: float = AI_RATE_LIMIT_BACKOFF):
+        """
+        Args:
+            model_quotas (dict): Model name -> quota (see QUOTA_PERIODS for keys).
+            provider_quotas (dict): Provider name -> quota shared by its models.
+            model_costs (dict): Model name -> tokens spent from "points_per_day" buckets per call (default 1).
+            max_wait (float): Seconds a call may wait for quota before QuotaExceededError is raised.
+            backoff (float): Seconds a model is paused after a rate-limit response without Retry-After.
+        """
+        self.model_quotas = model_quotas
+        self.provider_quotas = provider_quotas
+        self.model_costs = model_costs
+        self.max_wait = max_wait
+        self.backoff = backoff
+        self._buckets: Dict[Tuple[str, Optional[str]], Dict[str, TokenBucket]] = {}
+        self._paused_until: Dict[Tuple[str, Optional[str]], float] = {}
+        self._queues: Dict[str, "OrderedDict[Any, Deque[_Waiter]]"] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._pumps: Dict[str, asyncio.Task] = {}
+
+        # Counters exposed through quota_state()
+        self.granted: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.rate_limited: Dict[str, int] = {}
+        self.total_wait: Dict[str, float] = {}
+
+    # ========== ACQUIRING ==========
+
+    async def acquire(self, provider: str, model: str, guild_id: Any):
+        """
+        Waits until a call to `model` fits within its quotas and spends them.
+
+        Raises:
+            QuotaExceededError: If quota will not be available within `max_wait` seconds.
+        """
+        cost = self.model_costs.get(model, 1)
+        if not self._buckets_for(provider, model) and (provider, model) not in self._paused_until:
+            return
+
+        estimate = self._wait_time(provider, model, cost, time.monotonic())
+        if estimate > self.max_wait:
+            self._reject(provider, model, estimate)
+
+        waiter = _Waiter(model, cost, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(provider, OrderedDict()).setdefault(guild_id, deque()).append(waiter)
+        self._wake(provider)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._discard(provider, guild_id, waiter)
+                self._reject(provider, model, self._wait_time(provider, model, cost, time.monotonic()))
+        except asyncio.CancelledError:
+            self._discard(provider, guild_id, waiter)
+            raise
+
+    def report_rate_limited(self, provider: str, model: str, retry_after: Optional[float] = None):
+        """Pauses `model` after the provider answered with a rate-limit error, e.g. HTTP 429."""
+        pause = retry_after if retry_after is not None else self.backoff
+        key = (provider, model)
+        self._paused_until[key] = max(self._paused_until.get(key, 0.0), time.monotonic() + pause)
+        self.rate_limited[provider] = self.rate_limited.get(provider, 0) + 1
+        logger.warning(f"{provider} rate-limited {model}; pausing its calls for {pause:g}s.")
+
+    def _reject(self, provider: str, model: str, wait: float):
+        self.rejected[provider] = self.rejected.get(provider, 0) + 1
+        when = "not within the daily quota" if wait == float("inf") else f"in about {wait:.0f}s"
+        raise QuotaExceededError(f"The {model} quota is used up; the next call is possible {when}.")
+
+    def _discard(self, provider: str, guild_id: Any, waiter: _Waiter) -> bool:
+        """Removes a waiter that gave up. Returns False if it had already been granted."""
+        if waiter.future.done():
+            return False
+        waiter.future.cancel()
+        queue = self._queues.get(provider, {}).get(guild_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[provider][guild_id]
+        return True
+
+    # ========== DISPATCH ==========
+
+    def _wake(self, provider: str):
+        self._wakeups.setdefault(provider, asyncio.Event()).set()
+        pump = self._pumps.get(provider)
+        if pump is None or pump.done():
+            self._pumps[provider] = asyncio.get_running_loop().create_task(self._pump(provider))
+
+    async def _pump(self, provider: str):
+        """Grants queued calls of one provider in round-robin guild order as their quotas allow."""
+        queues = self._queues[provider]
+        wakeup = self._wakeups[provider]
+        while queues:
+            wakeup.clear()
+            now = time.monotonic()
+            next_wait = float("inf")
+            for guild_id in list(queues):
+                waiter = queues[guild_id][0]
+                wait = self._wait_time(provider, waiter.model, waiter.cost, now)
+                if wait > 0:
+                    next_wait = min(next_wait, wait)
+                    continue
+                self._grant(provider, guild_id, waiter, now)
+                break
+            else:
+                # Nothing can run yet: sleep until the earliest refill, or until a new call arrives
+                try:
+                    await asyncio.wait_for(wakeup.wait(), None if next_wait == float("inf") else next_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _grant(self, provider: str, guild_id: Any, waiter: _Waiter, now: float):
+        queues = self._queues[provider]
+        queues[guild_id].popleft()
+        if queues[guild_id]:
+            queues.move_to_end(guild_id)  # Its next call goes behind the other guilds
+        else:
+            del queues[guild_id]
+        for name, bucket in self._buckets_for(provider, waiter.model):
+            bucket.take(waiter.cost if name == "points_per_day" else 1, now)
+        self.granted[provider] = self.granted.get(provider, 0) + 1
+        self.total_wait[provider] = self.total_wait.get(provider, 0.0) + now - waiter.queued_at
+        waiter.future.set_result(None)
+
+    # ========== BUCKETS ==========
+
+    def _buckets_for(self, provider: str, model: str) -> List[Tuple[str, TokenBucket]]:
+        buckets = []
+        for key, quota in (((provider, model), self.model_quotas.get(model)), ((provider, None), self.provider_quotas.get(provider))):
+            if not quota:
+                continue
+            if key not in self._buckets:
+                self._buckets[key] = {name: TokenBucket(limit, QUOTA_PERIODS[name]) for name, limit in quota.items()}
+            buckets.extend(self._buckets[key].items())
+        return buckets
+
+    def _wait_time(self, provider: str, model: str, cost: float, now: float) -> float:
+        wait = max(0.0, self._paused_until.get((provider, model), 0.0) - now)
+        for name, bucket in self._buckets_for(provider, model):
+            wait = max(wait, bucket.wait_time(cost if name == "points_per_day" else 1, now))
+        return wait
+
+    # ========== STATE ==========
+
+    def quota_state(self) -> Dict[str, Any]:
+        """
+        Returns the live quota state: remaining tokens per bucket, paused models, and per
+        provider the queued calls and granted/rejected/rate-limited counts.
+        """
+        now = time.monotonic()
+        buckets = {}
+        for (provider, model), named in self._buckets.items():
+            label = f"{provider}:{model}" if model else provider
+            for name, bucket in named.items():
+                bucket._refill(now)
+                buckets[f"{label}:{name}"] = {"remaining": int(bucket.tokens), "capacity": int(bucket.capacity)}
+        providers = {}
+        for provider in set(self._queues) | set(self.granted) | set(self.rejected) | set(self.rate_limited):
+            granted = self.granted.get(provider, 0)
+            providers[provider] = {
+                "queued": sum(len(queue) for queue in self._queues.get(provider, {}).values()),
+                "granted": granted,
+                "rejected": self.rejected.get(provider, 0),
+                "rate_limited": self.rate_limited.get(provider, 0),
+                "avg_wait_s": self.total_wait.get(provider, 0.0) / granted if granted else 0.0,
+            }
+        paused = {f"{provider}:{model}": until - now for (provider, model), until in self._paused_until.items() if until > now}
+        return {"buckets": buckets, "providers": providers, "paused": paused}
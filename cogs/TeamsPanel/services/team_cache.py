@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+
+from config import TEAMS_COLLECTION, TEAM_CACHE_MAX_GUILDS, TEAM_CACHE_MAX_TEAMS_PER_GUILD, TEAM_CACHE_TTL, TEAM_CACHE_WATCH_RETRY
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _GuildTeams:
+    """Cached team documents of one guild. `complete` means every team of the guild is present."""
+    teams: Dict[str, Tuple[bytes, Any, float]] = field(default_factory=dict)  # team_role -> (BSON, _id, stored_at)
+    complete: bool = False
+    listed_at: float = 0.0
+
+class TeamCache:
+    """
+    In-process cache of team documents, owned by TeamManager.
+
+    Guilds are evicted least-recently-used once more than `max_guilds` are cached. Within a guild,
+    a full team listing is only kept when it fits in `max_teams_per_guild`. Entries are invalidated
+    by TeamDatabaseService after each of its team writes (see `add_change_listener`) and by a change
+    stream on the teams collection for edits made elsewhere. If change streams are unavailable,
+    entries fall back to a time-to-live instead, as in GuildSettingsCache.
+
+    Documents are kept BSON-encoded and decoded on every hit, which gives each caller its own
+    copy to mutate at a fraction of the cost of copy.deepcopy.
+    """
+
+    def __init__(self, team_service, max_guilds: int = TEAM_CACHE_MAX_GUILDS, max_teams_per_guild: int = TEAM_CACHE_MAX_TEAMS_PER_GUILD,
+                 ttl: float = TEAM_CACHE_TTL, watch_retry: float = TEAM_CACHE_WATCH_RETRY):
+        """
+        Args:
+            team_service (TeamDatabaseService): Source of team documents.
+            max_guilds (int): Guilds kept before the least recently used one is evicted.
+            max_teams_per_guild (int): Teams kept per guild; larger guilds are only cached team by team.
+            ttl (float): Seconds an entry stays valid while no change stream is active.
+            watch_retry (float): Seconds to wait before re-opening a closed change stream.
+        """
+        self.team_service = team_service
+        self.max_guilds = max_guilds
+        self.max_teams_per_guild = max_teams_per_guild
+        self.ttl = ttl
+        self.watch_retry = watch_retry
+        self._guilds: "OrderedDict[int, _GuildTeams]" = OrderedDict()
+        self._key_by_doc_id: Dict[Any, Tuple[int, str]] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+        self._stream_active = False
+        self._generation = 0
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+        team_service.add_change_listener(self.invalidate)
+
+    # ========== READS ==========
+
+    async def get_team(self, guild_id: int, team_role: str) -> Optional[Dict[str, Any]]:
+        """Returns a copy of a team document, loading it on a miss. None if the team does not exist."""
+        guild = self._guilds.get(guild_id)
+        if guild is not None:
+            self._guilds.move_to_end(guild_id)
+            entry = guild.teams.get(team_role)
+            if entry is not None and self._is_fresh(entry[2]):
+                self.hits += 1
+                return bson.decode(entry[0])
+            if entry is None and guild.complete and self._is_fresh(guild.listed_at):
+                self.hits += 1
+                return None
+
+        self.misses += 1
+        generation = self._generation
+        doc = await self.team_service.get_team_by_name(guild_id, team_role)
+        if doc is not None and generation == self._generation:
+            self._store(guild_id, doc)
+        return doc
+
+    async def get_teams(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Returns copies of every team document of a guild, in team number order."""
+        cached = self.cached_teams(guild_id)
+        if cached is not None:
+            return cached
+
+        self.misses += 1
+        generation = self._generation
+        docs = [doc async for doc in self.team_service.iter_teams(guild_id)]
+        if generation == self._generation and len(docs) <= self.max_teams_per_guild:
+            guild = self._guild(guild_id, reset=True)
+            for doc in docs:
+                self._store(guild_id, doc)
+            guild.complete = True
+            guild.listed_at = time.monotonic()
+        return docs
+
+    def cached_teams(self, guild_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Returns copies of a guild's teams if its full listing is cached and fresh, else None. Never loads."""
+        guild = self._guilds.get(guild_id)
+        if guild is None or not guild.complete or not self._is_fresh(guild.listed_at):
+            return None
+        self._guilds.move_to_end(guild_id)
+        self.hits += 1
+        return self._ordered(guild)
+
+    # ========== INVALIDATION ==========
+
+    def invalidate(self, guild_id: Optional[int], team_role: Optional[str] = None):
+        """
+        Drops cached teams after a write. Registered as a TeamDatabaseService change listener.
+
+        Args:
+            guild_id (int, optional): Guild whose teams changed. None drops every guild.
+            team_role (str, optional): The team that changed. None drops the whole guild.
+        """
+        self._generation += 1
+        if guild_id is None:
+            self.clear()
+            return
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            return
+        if team_role is None:
+            self._drop_guild(guild_id)
+            self.invalidations += 1
+            return
+        # The listing no longer reflects this team (it may have been inserted, renamed or deleted).
+        guild.complete = False
+        entry = guild.teams.pop(team_role, None)
+        if entry is not None:
+            self._key_by_doc_id.pop(entry[1], None)
+            self.invalidations += 1
+
+    def clear(self):
+        """Drops every cached team."""
+        self._generation += 1
+        self.invalidations += len(self._guilds)
+        self._guilds.clear()
+        self._key_by_doc_id.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters, sizes and the current freshness mode."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "guilds": len(self._guilds),
+            "teams": sum(len(guild.teams) for guild in self._guilds.values()),
+            "mode": "change_stream" if self._stream_active else "ttl",
+        }
+
+    # ========== CHANGE STREAM ==========
+
+    def start(self):
+        """Starts the background change stream listener. Safe to call more than once."""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch_teams())
+
+    async def stop(self):
+        """Stops the change stream listener and reverts to TTL freshness."""
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+        self._watch_task = None
+        self._stream_active = False
+
+    async def _watch_teams(self):
+        """Keeps a change stream open, re-opening it after `watch_retry` seconds if it closes."""
+        while True:
+            async for change in self.team_service.db.watch(TEAMS_COLLECTION, on_open=self._activate_stream):
+                self._handle_change(change)
+
+            # DatabaseManager.watch only returns when the stream could not be opened or broke.
+            if self._stream_active:
+                logger.warning("Teams change stream closed. Falling back to TTL-based team cache.")
+            self._stream_active = False
+            await asyncio.sleep(self.watch_retry)
+
+    def _activate_stream(self):
+        """Switches to change-stream freshness, discarding entries that may have missed events."""
+        self.clear()
+        self._stream_active = True
+        logger.info("Teams change stream active. Team cache entries no longer expire.")
+
+    def _handle_change(self, change: Dict[str, Any]):
+        """Invalidates the team affected by a change stream event."""
+        operation = change.get("operationType")
+        if operation in ("invalidate", "drop", "dropDatabase", "rename"):
+            self.clear()
+            return
+
+        doc_id = (change.get("documentKey") or {}).get("_id")
+        known = self._key_by_doc_id.get(doc_id)
+        if known is not None:
+            self.invalidate(*known)
+        full_document = change.get("fullDocument") or {}
+        if "guild_id" in full_document and "team_role" in full_document:
+            # Covers inserts, and updates that renamed a cached team
+            self.invalidate(full_document["guild_id"], full_document["team_role"])
+
+    # ========== INTERNALS ==========
+
+    def _guild(self, guild_id: int, reset: bool = False) -> _GuildTeams:
+        guild = self._guilds.get(guild_id)
+        if guild is None or reset:
+            if guild is not None:
+                self._drop_guild(guild_id)
+            guild = self._guilds[guild_id] = _GuildTeams()
+            while len(self._guilds) > self.max_guilds:
+                evicted_id = next(iter(self._guilds))
+                self._drop_guild(evicted_id)
+                self.evictions += 1
+        self._guilds.move_to_end(guild_id)
+        return guild
+
+    def _drop_guild(self, guild_id: int):
+        guild = self._guilds.pop(guild_id, None)
+        if guild is not None:
+            for _, doc_id, _ in guild.teams.values():
+                self._key_by_doc_id.pop(doc_id, None)
+
+    def _store(self, guild_id: int, doc: Dict[str, Any]):
+        guild = self._guild(guild_id)
+        if doc["team_role"] not in guild.teams and len(guild.teams) >= self.max_teams_per_guild:
+            return
+        guild.teams[doc["team_role"]] = (bson.encode(doc), doc.get("_id"), time.monotonic())
+        if "_id" in doc:
+            self._key_by_doc_id[doc["_id"]] = (guild_id, doc["team_role"])
+
+    def _ordered(self, guild: _GuildTeams) -> List[Dict[str, Any]]:
+        docs = [bson.decode(raw) for raw, _, _ in guild.teams.values()]
+        return sorted(docs, key=lambda doc: doc.get("team_number") or 0)
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        if self._stream_active:
+            return True
+        return time.monotonic() - stored_at < self.ttl
@@ -223,16 +223,15 @@ class TeamFormationService:
             return False, f"Team '{team_name}' could not be found."
 
         # 2. Fetch the unregistered member's profile data
-        unregistered_doc = await self.db.get_unregistered_document(guild.id)
-        member_profile = (unregistered_doc.get("leaders", {}).get(user_id) or
-                          unregistered_doc.get("members", {}).get(user_id))
+        member_profile = await self.db.get_unregistered_member(guild.id, user_id)
 
         if not member_profile:
             return False, "Could not find the profile for the unassigned member."
 
-        # 3. Add member and update database
-        team.members[user_id] = TeamMember(user_id=user_id, **member_profile)
-        await self.db.update_team_members(guild.id, team.team_role, {uid: vars(mem) for uid, mem in team.members.items()})
+        # 3. Add member and update database (a single-field write, so concurrent edits to other members are kept)
+        team.members[user_id] = TeamMember(**member_profile)
+        if not await self.db.add_team_members(guild.id, team.team_role, {user_id: vars(team.members[user_id])}):
+            return False, f"Could not add the member to `{team.team_role}`."
         await self.db.remove_unregistered_member(guild.id, user_id)
 
         # 4. Assign Discord role
@@ -250,33 +249,68 @@ class TeamFormationService:
             return True, f"✅ Member assigned to `{team.team_role}` in database only (marathon inactive)."
 
     async def batch_create_teams(self, guild: Guild, proposed_teams: List[Team]) -> Dict:
-        """Creates multiple teams in the database from a proposed formation."""
-        created_count, failed_teams = 0, []
-        for i, team_obj in enumerate(proposed_teams, 1):
-            try:
-                new_team_number = await self.db.get_max_team_number(guild.id) + 1
-                team_role_name = f"Team {new_team_number}"
-
-                # Use the refactored insert_team method that takes a single dict
-                await self.db.insert_team({
-                    "guild_id": guild.id,
-                    "team_number": new_team_number,
-                    "team_role": team_role_name,
-                    "channel_name": f"team-{new_team_number}",
-                    "members": {uid: vars(member) for uid, member in team_obj.members.items()}
-                })
-
-                marathon_active = await self.team_manager.team_service.is_marathon_active(guild.id)
-                if marathon_active:
-                    raw_team_data = await self.db.get_team_by_name(guild.id, team_role_name)
-                    team = build_team_from_data(guild.id, raw_team_data)
-                    await provision_team_resources(guild, team)
-
-                for user_id in team_obj.members.keys():
-                    await self.db.remove_unregistered_member(guild.id, user_id)
-                created_count += 1
-            except Exception as e:
-                logger.error(f"Failed to create proposed team {i}: {e}", exc_info=True)
-                failed_teams.append(f"Proposed Team {i}")
-
-        return {"created": created_count, "failed": failed_teams}
+        """
+        Commits a proposed formation in a constant number of database round trips:
+        one atomic reservation of team numbers, one bulk insert of all teams, and one
+        delete_many removing every committed member from the unregistered list.
+
+        Returns:
+            Dict: "created" (count), "failed" (labels of failed proposals) and "teams", a
+                  per-proposal report with team_role, member_count, status and error.
+        """
+        if not proposed_teams:
+            return {"created": 0, "failed": [], "teams": []}
+
+        first_number = await self.db.reserve_team_numbers(guild.id, len(proposed_teams))
+        if first_number is None:
+            logger.error(f"Could not reserve team numbers for guild {guild.id}.")
+            failed = [f"Proposed Team {i}" for i in range(1, len(proposed_teams) + 1)]
+            return {
+                "created": 0,
+                "failed": failed,
+                "teams": [{"proposal": label, "team_role": None, "member_count": len(team.members), "status": "failed", "error": "could not reserve team numbers"}
+                          for label, team in zip(failed, proposed_teams)]
+            }
+        marathon_active = await self.team_manager.team_service.is_marathon_active(guild.id)
+
+        batch = self.db.batch()
+        queued_inserts = []
+        for i, team_obj in enumerate(proposed_teams):
+            team_number = first_number + i
+            team_data = {
+                "guild_id": guild.id,
+                "team_number": team_number,
+                "team_role": f"Team {team_number}",
+                "channel_name": f"team-{team_number}",
+                "members": {uid: vars(member) for uid, member in team_obj.members.items()}
+            }
+            op_index = await self.db.insert_team(team_data, batch=batch)
+            queued_inserts.append((f"Proposed Team {i + 1}", team_data, op_index))
+        insert_report = await batch.flush()
+
+        team_reports, failed_teams, created_teams, committed_ids = [], [], [], []
+        for label, team_data, op_index in queued_inserts:
+            report = {"proposal": label, "team_role": team_data["team_role"], "member_count": len(team_data["members"]), "status": "created", "error": None}
+            if insert_report.succeeded(op_index):
+                created_teams.append(team_data)
+                committed_ids.extend(team_data["members"])
+            else:
+                logger.error(f"Failed to create {label} as {team_data['team_role']}: {insert_report.errors[op_index]}")
+                report.update(status="failed", error=insert_report.errors[op_index])
+                failed_teams.append(label)
+            team_reports.append(report)
+
+        if committed_ids:
+            removed = await self.db.remove_unregistered_members(guild.id, committed_ids)
+            if removed != len(committed_ids):
+                logger.warning(f"Removed {removed} of {len(committed_ids)} newly assigned members from the unregistered list of guild {guild.id}.")
+
+        if marathon_active:
+            for team_data, report in zip(created_teams, [r for r in team_reports if r["status"] == "created"]):
+                try:
+                    await provision_team_resources(guild, build_team_from_data(guild.id, team_data))
+                except Exception as e:
+                    logger.error(f"Failed to provision resources for {team_data['team_role']}: {e}", exc_info=True)
+                    report["error"] = f"created, but provisioning failed: {e}"
+
+        return {"created": len(created_teams), "failed": failed_teams, "teams": team_reports}
@@ -1,8 +1,9 @@
 import logging
 import re
 import discord
-from typing import Dict, List, Tuple, Optional
-from ..models.team import Team, TeamError, TeamNotFoundError, InvalidTeamError, TeamMember, TeamConfig
+from typing import AsyncIterator, Dict, List, Tuple, Optional
+from ..models.team import Team, TeamSummary, TeamError, TeamNotFoundError, InvalidTeamError, TeamMember, TeamConfig
+from ..services.team_cache import TeamCache
 from ..services.team_member_service import TeamMemberService
 from ..services.team_validation import TeamValidator
 from ..services.team_formation_service import TeamFormationService
@@ -22,6 +23,7 @@ class TeamManager:
     def __init__(self, team_service):
         self.config = TeamConfig()
         self.team_service = team_service
+        self.team_cache = TeamCache(self.team_service)
         self.ai_handler = AIHandler(self.team_service)
         self.scorer = TeamScoringEngine(self.ai_handler)
 
@@ -90,6 +92,7 @@ class TeamManager:
         team = Team(guild_id=guild.id, team_role=team_role, channel_name=formatted_channel, members=members, _team_number=team_number)
 
         await self.team_service.insert_team(team.to_dict())
+        await self.team_service.bump_team_counter(guild.id, team_number)
 
         if is_marathon:
             await team_utils.provision_team_resources(guild, team)
@@ -100,18 +103,36 @@ class TeamManager:
         return team, invalid_ids
 
     async def get_team(self, guild_id: int, team_name: str) -> Team:
-        """Retrieves a specific team by name."""
-        team_data = await self.team_service.get_team_by_name(guild_id, team_name)
+        """Retrieves a specific team by name, from the team cache when possible."""
+        team_data = await self.team_cache.get_team(guild_id, team_name)
         if not team_data:
             raise TeamNotFoundError(f"Team '{team_name}' not found.")
         return team_utils.build_team_from_data(guild_id, team_data)
 
+    async def iter_teams(self, guild_id: int) -> AsyncIterator[Team]:
+        """
+        Streams all teams for a guild, ordered by stored team number. Served from the team cache
+        if it holds the guild's full listing; otherwise streamed without loading every team at once.
+        """
+        cached = self.team_cache.cached_teams(guild_id)
+        if cached is not None:
+            for data in cached:
+                yield team_utils.build_team_from_data(guild_id, data)
+            return
+        async for data in self.team_service.iter_teams(guild_id):
+            yield team_utils.build_team_from_data(guild_id, data)
+
     async def get_all_teams(self, guild_id: int) -> List[Team]:
-        """Retrieves all teams for a guild."""
-        teams_data = await self.team_service.get_teams(guild_id)
-        teams = [team_utils.build_team_from_data(guild_id, data) for data in teams_data]
+        """Retrieves all teams for a guild, from the team cache when possible."""
+        teams = [team_utils.build_team_from_data(guild_id, data) for data in await self.team_cache.get_teams(guild_id)]
         return sorted(teams, key=lambda t: t.team_number)
 
+    async def get_team_summaries(self, guild_id: int) -> List[TeamSummary]:
+        """Retrieves lightweight summaries of all teams for a guild, for panels and dropdowns."""
+        summaries_data = await self.team_service.get_team_summaries(guild_id)
+        summaries = [team_utils.build_team_summary_from_data(data) for data in summaries_data]
+        return sorted(summaries, key=lambda t: t.team_number)
+
     async def delete_team_and_resources(self, guild: discord.Guild, team_name: str):
         """Deletes a team from the DB and removes its Discord role and channel."""
         team = await self.get_team(guild.id, team_name)
@@ -138,7 +159,9 @@ class TeamManager:
         skipped_count = 0
         skipped_details = []
 
-        existing_teams = {t.team_role for t in await self.get_all_teams(guild.id)}
+        existing_teams = {doc["team_role"] async for doc in self.team_service.iter_teams(guild.id, {"team_role": 1})}
+        batch = self.team_service.batch()
+        queued_roles = []
 
         potential_team_roles = [
             r for r in guild.roles
@@ -194,26 +217,38 @@ class TeamManager:
                 "members": {uid: tm.to_dict() for uid, tm in members_dict.items()}
             }
 
-            try:
-                await self.team_service.insert_team(team_data)
+            op_index = await self.team_service.insert_team(team_data, batch=batch)
+            queued_roles.append((role.name, op_index))
+
+        # All discovered teams are registered with a single bulk insert
+        report = await batch.flush()
+        for role_name, op_index in queued_roles:
+            if report.succeeded(op_index):
                 registered_count += 1
-            except Exception as e:
-                skipped_details.append(f"`{role.name}` (database error: {e})")
+            else:
+                skipped_details.append(f"`{role_name}` (database error: {report.errors[op_index]})")
 
         return {"registered": registered_count, "skipped": skipped_count, "details": skipped_details}
 
     # ========== MEMBER OPERATIONS (delegated to services) ==========
 
     async def add_members_to_team(self, guild, team_name, member_mentions):
-        """Orchestrates adding members by fetching team and marathon state first."""
-        team = await self.get_team(guild.id, team_name)
+        """Orchestrates adding members by fetching team and marathon state first, retrying on concurrent edits."""
         is_marathon = await self.is_marathon_active(guild.id)
-        return await self.member_service.add_members_to_team(guild, team, member_mentions, is_marathon)
+
+        async def attempt():
+            team = await self.get_team(guild.id, team_name)
+            return await self.member_service.add_members_to_team(guild, team, member_mentions, is_marathon)
+
+        return await team_utils.retry_on_conflict(attempt)
 
     async def remove_members_from_team(self, guild, team_name, member_ids):
-        """Orchestrates removing members by fetching the team first."""
-        team = await self.get_team(guild.id, team_name)
-        return await self.member_service.remove_members_from_team(guild.id, team, member_ids)
+        """Orchestrates removing members by fetching the team first, retrying on concurrent edits."""
+        async def attempt():
+            team = await self.get_team(guild.id, team_name)
+            return await self.member_service.remove_members_from_team(guild.id, team, member_ids)
+
+        return await team_utils.retry_on_conflict(attempt)
 
     # ========== ORCHESTRATION METHODS ==========
 
@@ -222,10 +257,12 @@ class TeamManager:
         Analyzes and reports on the consistency of team data by orchestrating
         calls to the team and member services.
         """
-        teams = await self.get_all_teams(guild.id)
         empty_teams, no_leader_teams = [], []
+        # Get all members currently in a team to pass to the sync function
+        all_team_member_ids = set()
 
-        for team in teams:
+        async for team in self.iter_teams(guild.id):
+            all_team_member_ids.update(team.members.keys())
             if not team.members:
                 empty_teams.append(team.team_role)
                 continue
@@ -235,9 +272,6 @@ class TeamManager:
             if not has_leader:
                 no_leader_teams.append(team.team_role)
 
-        # Get all members currently in a team to pass to the sync function
-        all_team_member_ids = {uid for team in teams for uid in team.members.keys()}
-
         # Perform synchronization of unassigned members and get the report
         sync_report = await self.member_service.sync_unregistered_members(guild, all_team_member_ids)
 
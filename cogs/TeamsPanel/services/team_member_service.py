@@ -1,7 +1,7 @@
 import discord
 from typing import Dict, List, Set, Tuple, Optional
-from ..models.team import Team, TeamMember
-from ..utils.team_utils import fetch_member_safely, get_member_role_title
+from ..models.team import Team, TeamMember, TeamConflictError
+from ..utils.team_utils import fetch_member_safely, fetch_members_batch, get_member_role_title
 from .team_validation import TeamValidator
 
 class TeamMemberService:
@@ -14,8 +14,9 @@ class TeamMemberService:
     async def create_member_objects(self, guild: discord.Guild, member_ids: Set[str], allow_unregistered: bool) -> Dict[str, TeamMember]:
         """Creates a dictionary of TeamMember objects from a set of user IDs."""
         members = {}
+        resolved = await fetch_members_batch(guild, member_ids)
         for uid in member_ids:
-            member = await fetch_member_safely(guild, uid)
+            member = resolved.get(uid)
             if not member or member.bot:
                 continue
 
@@ -41,8 +42,12 @@ class TeamMemberService:
         new_members = []
         if valid_ids:
             new_member_objects = await self.create_member_objects(guild, valid_ids, not is_marathon_active)
-            team.members.update(new_member_objects)
-            await self.db.update_team_members(guild.id, team.team_role, {uid: vars(m) for uid, m in team.members.items()})
+            if new_member_objects:
+                new_members_data = {uid: vars(m) for uid, m in new_member_objects.items()}
+                if not await self.db.add_team_members(guild.id, team.team_role, new_members_data, expected_version=team.version):
+                    raise TeamConflictError(f"Team '{team.team_role}' was modified while adding members.")
+                team.members.update(new_member_objects)
+                team.version += 1
             new_members = list(new_member_objects.values())
 
         existing_members = conflict_dict.get("existing", [])
@@ -73,36 +78,26 @@ class TeamMemberService:
 
     async def remove_members_from_team(self, guild_id: int, team: Team, member_ids: Set[str]) -> Tuple[List[TeamMember], List[str]]:
         """Removes members from a team, updates the database, and reports invalid IDs."""
-        removed_members = []
-        invalid_members = []
+        removed_ids = [uid for uid in member_ids if uid in team.members]
+        invalid_members = [uid for uid in member_ids if uid not in team.members]
 
-        for uid in member_ids:
-            if uid in team.members:
-                removed_members.append(team.members.pop(uid))
-            else:
-                invalid_members.append(uid)
-
-        if removed_members:
-            await self.db.update_team_members(guild_id, team.team_role, {uid: vars(m) for uid, m in team.members.items()})
+        if removed_ids:
+            if not await self.db.remove_team_members(guild_id, team.team_role, removed_ids, expected_version=team.version):
+                raise TeamConflictError(f"Team '{team.team_role}' was modified while removing members.")
+            team.version += 1
+        removed_members = [team.members.pop(uid) for uid in removed_ids]
 
         return removed_members, invalid_members
 
     async def sync_unregistered_members(self, guild: discord.Guild, all_team_member_ids: set) -> dict:
         """Synchronizes the unregistered members list with Discord roles and returns a report."""
         # 1. Get all tracked unregistered member IDs from the DB
-        unregistered_doc = await self.db.get_unregistered_document(guild.id) or {} #
-        unregistered_leaders = unregistered_doc.get("leaders", {})
-        unregistered_members = unregistered_doc.get("members", {})
-        all_unregistered_ids = set(unregistered_leaders.keys()) | set(unregistered_members.keys()) #
+        all_unregistered_ids = await self.db.get_unregistered_ids(guild.id) #
 
-        # 2. Sync existing DB entries
-        for user_id in all_unregistered_ids:
-            member = await fetch_member_safely(guild, user_id)
-            # Remove if member left or no longer has a team role
-            if not member or get_member_role_title(member) == "Unregistered": #
-                await self.db.remove_unregistered_member(guild.id, user_id) #
+        # All changes are queued and applied in a single bulk write
+        batch = self.db.batch()
 
-        # 3. Find and add new members with team roles but no team
+        # 2. Find and add new members with team roles but no team
         team_leader_role = discord.utils.get(guild.roles, name="Team Leader")
         team_member_role = discord.utils.get(guild.roles, name="Team Member")
 
@@ -112,23 +107,34 @@ class TeamMemberService:
             member_id = str(member.id)
             has_team_role = (team_leader_role in member.roles) or (team_member_role in member.roles) #
 
-            if has_team_role and member_id not in all_team_member_ids and member_id not in all_team_member_ids:
+            # Already tracked members keep their stored profile data
+            if has_team_role and member_id not in all_team_member_ids and member_id not in all_unregistered_ids:
                 role_title = get_member_role_title(member)
                 role_type = "leaders" if role_title == "Team Leader" else "members"
                 member_data = {"username": member.name, "display_name": member.display_name, "role_title": role_title, "profile_data": {}}
-                await self.db.save_unregistered_member(guild.id, member_id, member_data, role_type) #
+                await self.db.save_unregistered_member(guild.id, member_id, member_data, role_type, batch=batch) #
+
+        # 3. Sync existing DB entries
+        resolved = await fetch_members_batch(guild, all_unregistered_ids)
+        for user_id in all_unregistered_ids:
+            member = resolved.get(user_id)
+            # Remove if member left or no longer has a team role
+            if not member or get_member_role_title(member) == "Unregistered": #
+                await self.db.remove_unregistered_member(guild.id, user_id, batch=batch) #
+
+        if len(batch):
+            await batch.flush()
 
         # 4. Generate the final report from the now-synced database
-        final_doc = await self.db.get_unregistered_document(guild.id) or {} #
-        final_leaders = final_doc.get("leaders", {})
-        final_members = final_doc.get("members", {})
+        final_members = await self.db.get_unregistered_members(guild.id, projection={"_id": 0, "display_name": 1, "role_title": 1, "role_type": 1}) #
+        leader_count = sum(1 for data in final_members if data["role_type"] == "leaders")
 
         unassigned_list = [
             f"{i+1:<2} • {data['display_name']:<15} • {data['role_title']}"
-            for i, data in enumerate(list(final_leaders.values()) + list(final_members.values()))
+            for i, data in enumerate(final_members)
         ]
 
-        return {"unassigned_list": unassigned_list, "leader_count": len(final_leaders), "member_count": len(final_members)}
+        return {"unassigned_list": unassigned_list, "leader_count": leader_count, "member_count": len(final_members) - leader_count}
 
     async def get_unassigned_member_profile(self, guild_id: int, user_id: str) -> Optional[Dict]:
         """
@@ -141,17 +147,4 @@ class TeamMemberService:
         Returns:
             Optional[Dict]: The member's profile data, or None if not found
         """
-        unregistered_doc = await self.db.get_unregistered_document(guild_id)
-        if not unregistered_doc:
-            return None
-
-        # Check both leaders and members collections
-        leaders = unregistered_doc.get("leaders", {})
-        members = unregistered_doc.get("members", {})
-
-        if user_id in leaders:
-            return leaders[user_id]
-        elif user_id in members:
-            return members[user_id]
-
-        return None
+        return await self.db.get_unregistered_member(guild_id, user_id)
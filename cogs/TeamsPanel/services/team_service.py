@@ -1,7 +1,12 @@
 import logging
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Any, Optional, Union
 from datetime import datetime
-from config import TEAMS_COLLECTION, UNREGISTERED_MEMBERS_COLLECTION, SETTINGS_COLLECTION
+from pymongo import ReplaceOne
+from config import (
+    TEAMS_COLLECTION, UNREGISTERED_MEMBERS_COLLECTION, SETTINGS_COLLECTION, COUNTERS_COLLECTION, TEAM_ARCHIVE_COLLECTION,
+    TEAM_ARCHIVE_BATCH_SIZE, DEFAULT_AI_MODEL, AI_FALLBACK_MODELS
+)
+from database import IndexSpec, WriteBatch
 
 logger = logging.getLogger(__name__)
 
@@ -10,8 +15,65 @@ class TeamDatabaseService:
     Database service layer that provides team-specific operations
     using the generic DatabaseManager CRUD methods.
     """
-    def __init__(self, db):
+    INDEXES = {
+        TEAMS_COLLECTION: [
+            IndexSpec("guild_team_role_unique", (("guild_id", 1), ("team_role", 1)), unique=True),
+            IndexSpec("guild_team_number", (("guild_id", 1), ("team_number", -1))),
+            IndexSpec("guild_member_ids", (("guild_id", 1), ("member_ids", 1))),
+        ],
+        UNREGISTERED_MEMBERS_COLLECTION: [
+            IndexSpec("guild_user_unique", (("guild_id", 1), ("user_id", 1)), unique=True),
+            IndexSpec("guild_role_type", (("guild_id", 1), ("role_type", 1), ("user_id", 1))),
+        ],
+        COUNTERS_COLLECTION: [
+            IndexSpec("guild_name_unique", (("guild_id", 1), ("name", 1)), unique=True),
+        ],
+        TEAM_ARCHIVE_COLLECTION: [
+            IndexSpec("guild_marathon_team_role_unique", (("guild_id", 1), ("marathon_id", 1), ("team_role", 1)), unique=True),
+            IndexSpec("guild_member_ids_archived_at", (("guild_id", 1), ("member_ids", 1), ("archived_at", -1))),
+        ],
+    }
+    # Indexes made obsolete by schema changes, dropped by DatabaseManager.ensure_indexes
+    RETIRED_INDEXES = {
+        UNREGISTERED_MEMBERS_COLLECTION: ["guild_id_unique"],  # One document per guild before per-member records
+    }
+    TEAM_NUMBER_COUNTER = "team_number"
+    UNREGISTERED_PROFILE_PROJECTION = {"_id": 0, "user_id": 1, "username": 1, "display_name": 1, "role_title": 1, "profile_data": 1}
+
+    def __init__(self, db, settings_cache):
         self.db = db
+        self.settings_cache = settings_cache
+        self._change_listeners: List[Callable[[Optional[int], Optional[str]], None]] = []
+        self.db.register_indexes(self.INDEXES)
+        self.db.retire_indexes(self.RETIRED_INDEXES)
+        self.db.register_migration("teams_member_ids_backfill", self.backfill_member_ids)
+        self.db.register_migration("teams_team_number_field", self.backfill_team_number_field)
+        self.db.register_migration("teams_version_field", self.backfill_team_version)
+        self.db.register_migration("unregistered_members_per_member", self.split_legacy_unregistered_documents)
+
+    def batch(self) -> WriteBatch:
+        """
+        Starts a unit of work for a multi-write operation. Write methods that accept a `batch`
+        queue into it instead of writing immediately and return the queued operation's index;
+        results are reported by `batch.flush()`.
+        """
+        return self.db.batch()
+
+    def add_change_listener(self, listener: Callable[[Optional[int], Optional[str]], None]):
+        """
+        Registers a callback run as listener(guild_id, team_role) after every team write made
+        through this service, such as TeamCache.invalidate. team_role is None when several teams
+        of the guild may have changed, and guild_id is None when any guild may have changed.
+        Batched writes notify once the batch has been flushed.
+        """
+        self._change_listeners.append(listener)
+
+    def _teams_changed(self, guild_id: Optional[int], team_role: Optional[str] = None, batch: Optional[WriteBatch] = None):
+        if batch is not None:
+            batch.after_flush(lambda: self._teams_changed(guild_id, team_role))
+            return
+        for listener in self._change_listeners:
+            listener(guild_id, team_role)
 
     # ========== TEAM MANAGEMENT ==========
 
@@ -19,45 +81,154 @@ class TeamDatabaseService:
         """Retrieves all teams for a given guild."""
         return await self.db.find_many(TEAMS_COLLECTION, {"guild_id": guild_id})
 
+    async def iter_teams(self, guild_id: int, projection: Optional[Dict[str, int]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streams a guild's teams in team number order without loading them all at once."""
+        async for doc in self.db.find_iter(TEAMS_COLLECTION, {"guild_id": guild_id}, projection, sort=[("team_number", 1)]):
+            yield doc
+
+    async def get_team_summaries(self, guild_id: int) -> List[Dict[str, Any]]:
+        """
+        Retrieves the name, number, channel and member count of every team in a guild.
+        Member documents (and their profiles) never leave the server.
+        """
+        pipeline = [
+            {"$match": {"guild_id": guild_id}},
+            {"$project": {
+                "_id": 0,
+                "team_role": 1,
+                "team_number": 1,
+                "channel_name": 1,
+                "member_count": {"$size": {"$objectToArray": {"$ifNull": ["$members", {}]}}}
+            }},
+            {"$sort": {"team_number": 1}},
+        ]
+        return await self.db.aggregate(TEAMS_COLLECTION, pipeline)
+
     async def get_team_by_name(self, guild_id: int, team_name: str) -> Optional[Dict[str, Any]]:
         """Retrieves a specific team by its role name."""
         return await self.db.find_one(TEAMS_COLLECTION, {"guild_id": guild_id, "team_role": team_name})
 
-    async def insert_team(self, team_data: Dict[str, Any]) -> Optional[str]:
+    async def insert_team(self, team_data: Dict[str, Any], batch: Optional[WriteBatch] = None) -> Union[Optional[str], int]:
         """Creates a new team document."""
         team_data.update({
+            "member_ids": list(team_data.get("members", {}).keys()),
+            "version": team_data.get("version") or 0,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         })
-        return await self.db.insert_one(TEAMS_COLLECTION, team_data)
+        if batch is not None:
+            self._teams_changed(team_data["guild_id"], team_data["team_role"], batch)
+            return batch.insert_one(TEAMS_COLLECTION, team_data)
+        try:
+            return await self.db.insert_one(TEAMS_COLLECTION, team_data)
+        finally:
+            self._teams_changed(team_data["guild_id"], team_data["team_role"])
 
     async def delete_team(self, guild_id: int, team_role: str) -> bool:
         """Deletes a team document."""
-        return await self.db.delete_one(TEAMS_COLLECTION, {"guild_id": guild_id, "team_role": team_role})
+        try:
+            return await self.db.delete_one(TEAMS_COLLECTION, {"guild_id": guild_id, "team_role": team_role})
+        finally:
+            self._teams_changed(guild_id, team_role)
+
+    async def update_team_field(self, guild_id: int, team_role: str, field: str, value: Any, batch: Optional[WriteBatch] = None) -> Union[bool, int]:
+        """Updates a specific field of a team document. Batched field updates of a team coalesce into one write."""
+        query = {"guild_id": guild_id, "team_role": team_role}
+        update_data = {"$set": {field: value, "updated_at": datetime.utcnow()}}
+        if batch is not None:
+            self._teams_changed(guild_id, team_role, batch)
+            return batch.update_one(TEAMS_COLLECTION, query, update_data)
+        try:
+            return await self.db.update_one(TEAMS_COLLECTION, query, update_data)
+        finally:
+            self._teams_changed(guild_id, team_role)
+
+    async def update_team_members(self, guild_id: int, team_role: str, members_dict: Dict[str, Any], batch: Optional[WriteBatch] = None) -> Union[bool, int]:
+        """Convenience method to update all members of a team, keeping the member_ids index in sync."""
+        query = {"guild_id": guild_id, "team_role": team_role}
+        update_data = {
+            "$set": {"members": members_dict, "member_ids": list(members_dict.keys()), "updated_at": datetime.utcnow()},
+            "$inc": {"version": 1}
+        }
+        if batch is not None:
+            self._teams_changed(guild_id, team_role, batch)
+            return batch.update_one(TEAMS_COLLECTION, query, update_data)
+        try:
+            return await self.db.update_one(TEAMS_COLLECTION, query, update_data)
+        finally:
+            self._teams_changed(guild_id, team_role)
 
-    async def update_team_field(self, guild_id: int, team_role: str, field: str, value: Any) -> bool:
-        """Updates a specific field of a team document."""
-        update_data = {field: value, "updated_at": datetime.utcnow()}
-        return await self.db.update_one(
-            TEAMS_COLLECTION,
-            {"guild_id": guild_id, "team_role": team_role},
-            {"$set": update_data}
-        )
+    async def add_team_members(self, guild_id: int, team_role: str, members_dict: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """
+        Adds or replaces individual members of a team without rewriting the rest of the members map.
+
+        Args:
+            members_dict (dict): user_id -> member data for the members being added.
+            expected_version (int, optional): Only write if the team is still at this version.
 
-    async def update_team_members(self, guild_id: int, team_role: str, members_dict: Dict[str, Any]) -> bool:
-        """Convenience method to update all members of a team."""
-        return await self.update_team_field(guild_id, team_role, "members", members_dict)
+        Returns:
+            bool: True if the team was updated, False if it was not found or its version changed.
+        """
+        query = {"guild_id": guild_id, "team_role": team_role}
+        if expected_version is not None:
+            query["version"] = expected_version
+        update_data = {f"members.{uid}": data for uid, data in members_dict.items()}
+        update_data["updated_at"] = datetime.utcnow()
+        try:
+            return await self.db.update_one(TEAMS_COLLECTION, query, {
+                "$set": update_data,
+                "$addToSet": {"member_ids": {"$each": list(members_dict.keys())}},
+                "$inc": {"version": 1}
+            })
+        finally:
+            # Also after a version mismatch, so the conflict retry re-reads the team
+            self._teams_changed(guild_id, team_role)
+
+    async def remove_team_members(self, guild_id: int, team_role: str, user_ids: List[str], expected_version: Optional[int] = None) -> bool:
+        """
+        Removes individual members from a team without rewriting the rest of the members map.
+
+        Args:
+            user_ids (list): IDs of the members to remove.
+            expected_version (int, optional): Only write if the team is still at this version.
+
+        Returns:
+            bool: True if the team was updated, False if it was not found or its version changed.
+        """
+        query = {"guild_id": guild_id, "team_role": team_role}
+        if expected_version is not None:
+            query["version"] = expected_version
+        try:
+            return await self.db.update_one(TEAMS_COLLECTION, query, {
+                "$unset": {f"members.{uid}": "" for uid in user_ids},
+                "$pull": {"member_ids": {"$in": list(user_ids)}},
+                "$set": {"updated_at": datetime.utcnow()},
+                "$inc": {"version": 1}
+            })
+        finally:
+            self._teams_changed(guild_id, team_role)
 
     async def update_member_in_teams(self, guild_id: int, user_id: str, updates: Dict[str, Any]) -> int:
         """Updates specific fields for a member across all teams they might be in."""
-        filter_query = {"guild_id": guild_id, f"members.{user_id}": {"$exists": True}}
+        filter_query = {"guild_id": guild_id, "member_ids": user_id}
         update_data = {f"members.{user_id}.{k}": v for k, v in updates.items()}
         update_data["updated_at"] = datetime.utcnow()
-        return await self.db.update_many(TEAMS_COLLECTION, filter_query, {"$set": update_data})
+        try:
+            return await self.db.update_many(TEAMS_COLLECTION, filter_query, {"$set": update_data, "$inc": {"version": 1}})
+        finally:
+            self._teams_changed(guild_id)
 
     async def find_team_by_member(self, guild_id: int, user_id: str) -> Optional[Dict[str, Any]]:
         """Finds the team document that contains a specific member ID."""
-        return await self.db.find_one(TEAMS_COLLECTION, {"guild_id": guild_id, f"members.{user_id}": {"$exists": True}})
+        return await self.db.find_one(TEAMS_COLLECTION, {"guild_id": guild_id, "member_ids": user_id})
+
+    async def find_teams_by_members(self, guild_id: int, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """Finds every team containing any of the given member IDs, with a single indexed query."""
+        return await self.db.find_with_projection(
+            TEAMS_COLLECTION,
+            {"guild_id": guild_id, "member_ids": {"$in": list(user_ids)}},
+            {"team_role": 1, "member_ids": 1}
+        )
 
     async def get_max_team_number(self, guild_id: int) -> int:
         """Finds the highest team_number for a guild for efficient numbering."""
@@ -65,62 +236,246 @@ class TeamDatabaseService:
             TEAMS_COLLECTION,
             {"guild_id": guild_id},
             {"team_number": 1},
-            sort=[("team_number", -1)]
+            sort=[("team_number", -1)],
+            limit=1
+        )
+        return (teams[0].get("team_number") or 0) if teams else 0
+
+    async def reserve_team_numbers(self, guild_id: int, count: int) -> Optional[int]:
+        """
+        Atomically reserves `count` consecutive team numbers from the guild's counter.
+
+        Returns:
+            Optional[int]: The first reserved number, or None if the counter could not be updated.
+        """
+        counter_query = {"guild_id": guild_id, "name": self.TEAM_NUMBER_COUNTER}
+        counter = await self.db.find_one_and_update(COUNTERS_COLLECTION, counter_query, {"$inc": {"value": count}})
+        if counter is None:
+            # First reservation for this guild: seed the counter from the existing teams.
+            await self.db.update_one(
+                COUNTERS_COLLECTION, counter_query, {"$max": {"value": await self.get_max_team_number(guild_id)}}, upsert=True
+            )
+            counter = await self.db.find_one_and_update(COUNTERS_COLLECTION, counter_query, {"$inc": {"value": count}})
+        return counter["value"] - count + 1 if counter else None
+
+    async def bump_team_counter(self, guild_id: int, team_number: int) -> bool:
+        """
+        Raises the guild's team number counter to at least `team_number`, so numbers picked
+        manually (e.g. by /create_team) are never handed out by reserve_team_numbers.
+        A counter that has not been seeded yet is left alone; seeding accounts for existing teams.
+        """
+        return await self.db.update_one(
+            COUNTERS_COLLECTION,
+            {"guild_id": guild_id, "name": self.TEAM_NUMBER_COUNTER},
+            {"$max": {"value": team_number}}
         )
-        return teams[0].get("team_number", 0) if teams else 0
 
     async def update_team_channel_name(self, guild_id: int, team_name: str, new_channel_name: str) -> bool:
         """Updates the channel name for a specific team."""
         return await self.update_team_field(guild_id, team_name, "channel_name", new_channel_name)
 
-    # ========== UNREGISTERED MEMBER MANAGEMENT ==========
+    async def backfill_member_ids(self) -> int:
+        """
+        One-shot migration that derives `member_ids` from the `members` map for team
+        documents written before the field existed. Runs server-side in a single update.
+        """
+        return await self.db.update_many(
+            TEAMS_COLLECTION,
+            {"member_ids": {"$exists": False}},
+            [{"$set": {"member_ids": {"$map": {
+                "input": {"$objectToArray": {"$ifNull": ["$members", {}]}},
+                "as": "member",
+                "in": "$$member.k"
+            }}}}]
+        )
 
-    async def get_unregistered_document(self, guild_id: int) -> Optional[Dict[str, Any]]:
-        """Retrieves the single document containing all unregistered members for a guild."""
-        return await self.db.find_one(UNREGISTERED_MEMBERS_COLLECTION, {"guild_id": guild_id})
+    async def backfill_team_number_field(self) -> int:
+        """One-shot migration that renames `_team_number` (written by older /create_team calls) to `team_number`."""
+        return await self.db.update_many(
+            TEAMS_COLLECTION,
+            {"team_number": {"$exists": False}, "_team_number": {"$exists": True}},
+            [{"$set": {"team_number": "$_team_number"}}, {"$unset": "_team_number"}]
+        )
 
-    async def save_unregistered_member(self, guild_id: int, user_id: str, member_data: Dict, role_type: str) -> bool:
-        """Saves or updates an unregistered member's data in the correct category (leaders/members)."""
-        if role_type not in ["leaders", "members"]:
-            raise ValueError("role_type must be 'leaders' or 'members'")
+    async def backfill_team_version(self) -> int:
+        """One-shot migration that initializes the optimistic concurrency `version` on existing teams."""
+        return await self.db.update_many(TEAMS_COLLECTION, {"version": {"$exists": False}}, {"$set": {"version": 0}})
 
-        update_data = {f"{role_type}.{user_id}": member_data, "updated_at": datetime.utcnow()}
-        return await self.db.update_one(
+    # ========== MARATHON ARCHIVE ==========
+    # Teams of an ended marathon live in the archive collection as copies of their team documents
+    # (same _id, members and profile data as of the marathon end) plus `marathon_id` and `archived_at`.
+
+    async def archive_teams(self, guild_id: int, marathon_id: str, batch_size: int = TEAM_ARCHIVE_BATCH_SIZE) -> Dict[str, int]:
+        """
+        Moves a guild's teams into the archive collection under `marathon_id`.
+
+        The teams are first tagged with the marathon id in a single update, which fixes the set
+        being archived. Tagged teams are then copied in chunks of `batch_size` with upserts keyed
+        by _id, and each chunk is deleted from the teams collection once its copies are confirmed.
+        Every step is idempotent, so calling this again after an interruption finishes the job.
+        Once no tagged team is left, the team number counter is reset for the next marathon.
+
+        Returns:
+            Dict[str, int]: "archived" (teams moved by this call) and "remaining" (teams still to move).
+        """
+        tagged_query = {"guild_id": guild_id, "marathon_id": marathon_id}
+        archived = 0
+        try:
+            await self.db.update_many(TEAMS_COLLECTION, {"guild_id": guild_id, "marathon_id": {"$exists": False}}, {"$set": {"marathon_id": marathon_id}})
+
+            chunk: List[Dict[str, Any]] = []
+            async for doc in self.db.find_iter(TEAMS_COLLECTION, tagged_query, batch_size=batch_size):
+                chunk.append(doc)
+                if len(chunk) >= batch_size:
+                    archived += await self._archive_chunk(guild_id, chunk)
+                    chunk = []
+            if chunk:
+                archived += await self._archive_chunk(guild_id, chunk)
+        finally:
+            self._teams_changed(guild_id)
+
+        remaining = await self.db.count_documents(TEAMS_COLLECTION, tagged_query)
+        if remaining == 0:
+            await self.db.delete_one(COUNTERS_COLLECTION, {"guild_id": guild_id, "name": self.TEAM_NUMBER_COUNTER})
+        else:
+            logger.warning(f"Archiving marathon {marathon_id} for guild {guild_id} left {remaining} team(s) to retry.")
+        return {"archived": archived, "remaining": remaining}
+
+    async def _archive_chunk(self, guild_id: int, docs: List[Dict[str, Any]]) -> int:
+        """Copies team documents into the archive, then deletes the ones whose copy succeeded. Returns the number moved."""
+        archived_at = datetime.utcnow()
+        operations = [ReplaceOne({"_id": doc["_id"]}, {**doc, "archived_at": archived_at}, upsert=True) for doc in docs]
+        result = await self.db.bulk_write_result(TEAM_ARCHIVE_COLLECTION, operations, ordered=False)
+        if result is None:
+            return 0
+        failed = {error["index"] for error in result.get("writeErrors", [])}
+        for index in sorted(failed):
+            logger.error(f"Failed to archive team '{docs[index].get('team_role')}' for guild {guild_id}.")
+        copied_ids = [doc["_id"] for index, doc in enumerate(docs) if index not in failed]
+        if not copied_ids:
+            return 0
+        return await self.db.delete_many(TEAMS_COLLECTION, {"guild_id": guild_id, "_id": {"$in": copied_ids}})
+
+    async def get_archived_marathons(self, guild_id: int) -> List[str]:
+        """Lists the ids of the guild's archived marathons, newest first."""
+        marathon_ids = await self.db.distinct(TEAM_ARCHIVE_COLLECTION, "marathon_id", {"guild_id": guild_id})
+        return sorted(marathon_ids, reverse=True)
+
+    async def get_archived_teams(self, guild_id: int, marathon_id: str) -> List[Dict[str, Any]]:
+        """Retrieves the archived teams of one marathon, ordered by team number."""
+        return [doc async for doc in self.db.find_iter(
+            TEAM_ARCHIVE_COLLECTION, {"guild_id": guild_id, "marathon_id": marathon_id}, sort=[("team_number", 1)]
+        )]
+
+    async def find_archived_teams_by_member(self, guild_id: int, user_id: str) -> List[Dict[str, Any]]:
+        """Retrieves every archived team a member was part of, most recently archived first."""
+        return [doc async for doc in self.db.find_iter(
+            TEAM_ARCHIVE_COLLECTION, {"guild_id": guild_id, "member_ids": user_id}, sort=[("archived_at", -1)]
+        )]
+
+    # ========== UNREGISTERED MEMBER MANAGEMENT ==========
+    # Each unregistered member is stored as its own document:
+    # {guild_id, user_id, role_type ("leaders" | "members"), username, display_name, role_title, profile_data, updated_at}
+    # Until the split migration has run, a guild may still hold its legacy document (no user_id), which reads skip.
+
+    async def get_unregistered_member(self, guild_id: int, user_id: str, projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+        """Point read of a single unregistered member. Defaults to the fields needed to build a TeamMember."""
+        return await self.db.find_one(
             UNREGISTERED_MEMBERS_COLLECTION,
-            {"guild_id": guild_id},
-            {"$set": update_data},
-            upsert=True
+            {"guild_id": guild_id, "user_id": user_id},
+            projection or self.UNREGISTERED_PROFILE_PROJECTION
         )
 
-    async def remove_unregistered_member(self, guild_id: int, user_id: str) -> bool:
-        """Removes a user from both unregistered leader and member lists in a single operation."""
-        return await self.db.update_one(
+    async def get_unregistered_members(self, guild_id: int, role_type: Optional[str] = None, projection: Optional[Dict[str, int]] = None, skip: int = 0, limit: int = 0) -> List[Dict[str, Any]]:
+        """
+        Retrieves a page of unregistered members, leaders first.
+
+        Args:
+            role_type (str, optional): "leaders" or "members" to restrict the result to one category.
+            projection (dict, optional): Fields to return. Defaults to the TeamMember fields.
+            skip (int): Number of members to skip.
+            limit (int): Page size (0 for all).
+        """
+        query = {"guild_id": guild_id, "user_id": {"$exists": True}}
+        if role_type:
+            query["role_type"] = role_type
+        return await self.db.find_with_projection(
             UNREGISTERED_MEMBERS_COLLECTION,
-            {"guild_id": guild_id},
-            {
-                "$unset": {f"leaders.{user_id}": "", f"members.{user_id}": ""},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
+            query,
+            projection or self.UNREGISTERED_PROFILE_PROJECTION,
+            sort=[("role_type", 1), ("user_id", 1)],
+            limit=limit,
+            skip=skip
         )
 
+    async def get_unregistered_ids(self, guild_id: int) -> set:
+        """Returns the IDs of all unregistered members of a guild (an index-only read)."""
+        docs = await self.db.find_with_projection(UNREGISTERED_MEMBERS_COLLECTION, {"guild_id": guild_id}, {"_id": 0, "user_id": 1})
+        # Filtered here rather than with $exists, which would need the documents and lose the index-only read
+        return {doc["user_id"] for doc in docs if "user_id" in doc}
+
+    async def save_unregistered_member(self, guild_id: int, user_id: str, member_data: Dict, role_type: str, batch: Optional[WriteBatch] = None) -> Union[bool, int]:
+        """Saves or updates an unregistered member's data in the correct category (leaders/members)."""
+        if role_type not in ["leaders", "members"]:
+            raise ValueError("role_type must be 'leaders' or 'members'")
+
+        query = {"guild_id": guild_id, "user_id": user_id}
+        update_data = {"$set": {**member_data, "role_type": role_type, "updated_at": datetime.utcnow()}}
+        if batch is not None:
+            return batch.update_one(UNREGISTERED_MEMBERS_COLLECTION, query, update_data, upsert=True)
+        return await self.db.update_one(UNREGISTERED_MEMBERS_COLLECTION, query, update_data, upsert=True)
+
+    async def remove_unregistered_member(self, guild_id: int, user_id: str, batch: Optional[WriteBatch] = None) -> Union[bool, int]:
+        """Removes a user from the unregistered members, whichever category they are in."""
+        query = {"guild_id": guild_id, "user_id": user_id}
+        if batch is not None:
+            return batch.delete_one(UNREGISTERED_MEMBERS_COLLECTION, query)
+        return await self.db.delete_one(UNREGISTERED_MEMBERS_COLLECTION, query)
+
+    async def remove_unregistered_members(self, guild_id: int, user_ids: Iterable[str], batch: Optional[WriteBatch] = None) -> int:
+        """Removes many users from the unregistered members with a single delete. Returns the number removed."""
+        query = {"guild_id": guild_id, "user_id": {"$in": list(user_ids)}}
+        if batch is not None:
+            return batch.delete_many(UNREGISTERED_MEMBERS_COLLECTION, query)
+        return await self.db.delete_many(UNREGISTERED_MEMBERS_COLLECTION, query)
+
     async def move_unregistered_member_role(self, guild_id: int, user_id: str, from_type: str, to_type: str) -> bool:
-        """Atomically moves a member from one role type to another within the unregistered document."""
+        """Atomically moves a member from one role type to another."""
         if from_type not in ["leaders", "members"] or to_type not in ["leaders", "members"]:
             raise ValueError("role_type must be 'leaders' or 'members'")
 
-        unregistered_doc = await self.get_unregistered_document(guild_id)
-        if not unregistered_doc or user_id not in unregistered_doc.get(from_type, {}):
+        moved = await self.db.update_one(
+            UNREGISTERED_MEMBERS_COLLECTION,
+            {"guild_id": guild_id, "user_id": user_id, "role_type": from_type},
+            {"$set": {"role_type": to_type, "updated_at": datetime.utcnow()}}
+        )
+        if not moved:
             logger.warning(f"User {user_id} not found in unregistered '{from_type}' list for guild {guild_id}.")
-            return False
+        return moved
 
-        member_data = unregistered_doc[from_type][user_id]
-
-        update_pipeline = {
-            "$set": {f"{to_type}.{user_id}": member_data, "updated_at": datetime.utcnow()},
-            "$unset": {f"{from_type}.{user_id}": ""}
-        }
-
-        return await self.db.update_one(UNREGISTERED_MEMBERS_COLLECTION, {"guild_id": guild_id}, update_pipeline)
+    async def split_legacy_unregistered_documents(self) -> int:
+        """
+        One-shot migration from the legacy layout (one document per guild holding `leaders` and
+        `members` maps) to one document per member. Existing per-member documents are never
+        overwritten, and each legacy document is deleted only after all of its members were copied.
+        """
+        migrated = 0
+        async for legacy_doc in self.db.find_iter(UNREGISTERED_MEMBERS_COLLECTION, {"user_id": {"$exists": False}}):
+            batch = self.batch()
+            for role_type in ("leaders", "members"):
+                for user_id, member_data in (legacy_doc.get(role_type) or {}).items():
+                    batch.update_one(
+                        UNREGISTERED_MEMBERS_COLLECTION,
+                        {"guild_id": legacy_doc["guild_id"], "user_id": user_id},
+                        {"$setOnInsert": {**member_data, "role_type": role_type, "updated_at": legacy_doc.get("updated_at") or datetime.utcnow()}},
+                        upsert=True
+                    )
+            report = await batch.flush()
+            if not report.ok:
+                raise RuntimeError(f"Could not split unregistered members of guild {legacy_doc['guild_id']}: {report.errors}")
+            await self.db.delete_one(UNREGISTERED_MEMBERS_COLLECTION, {"_id": legacy_doc["_id"]})
+            migrated += report.requested
+        return migrated
 
     # ========== SETTINGS: TEAM PANEL ==========
 
@@ -128,40 +483,52 @@ class TeamDatabaseService:
         """Saves or updates the team panel info within the guild's settings document."""
         panel_data = {"channel_id": channel_id, "message_id": message_id}
         update_data = {"team_panel": panel_data, "updated_at": datetime.utcnow()}
-        return await self.db.update_one(
+        result = await self.db.update_one(
             SETTINGS_COLLECTION,
             {"guild_id": guild_id},
             {"$set": update_data},
             upsert=True
         )
+        self.settings_cache.invalidate(guild_id)
+        return result
 
     async def get_team_panel(self, guild_id: int) -> Optional[Dict[str, Any]]:
         """Retrieves the team panel object from the guild's settings document."""
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
-        return settings_doc.get("team_panel") if settings_doc else None
+        return await self.settings_cache.get_field(guild_id, "team_panel")
 
     async def delete_team_panel(self, guild_id: int) -> bool:
         """Deletes the team panel object from the guild's settings document."""
-        return await self.db.update_one(
+        result = await self.db.update_one(
             SETTINGS_COLLECTION,
             {"guild_id": guild_id},
             {"$unset": {"team_panel": ""}, "$set": {"updated_at": datetime.utcnow()}}
         )
+        self.settings_cache.invalidate(guild_id)
+        return result
 
     # ========== SETTINGS: MARATHON STATE ==========
 
     async def get_marathon_state(self, guild_id: int) -> bool:
         """Retrieves the marathon's active status from the guild's settings document."""
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
-        if settings_doc and "marathon_state" in settings_doc:
-            return settings_doc["marathon_state"].get("is_active", False)
+        marathon_state = await self.settings_cache.get_field(guild_id, "marathon_state")
+        if marathon_state:
+            return marathon_state.get("is_active", False)
         return False
 
-    async def set_marathon_state(self, guild_id: int, is_active: bool) -> bool:
-        """Sets the marathon state within the guild's settings document."""
+    async def set_marathon_state(self, guild_id: int, is_active: bool, marathon_id: Optional[str] = None) -> bool:
+        """
+        Sets the marathon state within the guild's settings document.
+
+        Args:
+            guild_id (int): The guild.
+            is_active (bool): The new state.
+            marathon_id (str, optional): Id of the marathon, kept after it ends. Activating without one starts a new marathon id.
+        """
+        now = datetime.utcnow()
         state_data = {
             "is_active": is_active,
-            "last_changed": datetime.utcnow()
+            "last_changed": now,
+            "marathon_id": marathon_id or (self.new_marathon_id(now) if is_active else None)
         }
         update_data = {"marathon_state": state_data, "updated_at": datetime.utcnow()}
         result = await self.db.update_one(
@@ -170,27 +537,32 @@ class TeamDatabaseService:
             {"$set": update_data},
             upsert=True
         )
+        self.settings_cache.invalidate(guild_id)
         return result
 
     async def get_marathon_state_document(self, guild_id: int) -> Optional[Dict[str, Any]]:
         """Retrieves the marathon state object from the guild's settings document."""
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
-        return settings_doc.get("marathon_state") if settings_doc else None
+        return await self.settings_cache.get_field(guild_id, "marathon_state")
+
+    @staticmethod
+    def new_marathon_id(started_at: Optional[datetime] = None) -> str:
+        """Builds a marathon id from its start time, e.g. "20240601-183000". Unique within a guild."""
+        return (started_at or datetime.utcnow()).strftime("%Y%m%d-%H%M%S")
 
     # ========== SETTINGS: COMMUNICATION CHANNEL ==========
 
     async def get_communication_channel_id(self, guild_id: int) -> Optional[int]:
         """Retrieves the communication channel ID from the guild's settings document."""
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
-        if settings_doc and "channel" in settings_doc:
-            return settings_doc["channel"].get("communication_channel")
+        channels = await self.settings_cache.get_field(guild_id, "channel")
+        if channels:
+            return channels.get("communication_channel")
         return None
 
     async def get_setting_field(self, guild_id: int, section: str, field: str) -> Optional[int]:
         """
         Retrieves a nested field value from the guild's settings document.
         """
-        settings_doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
+        settings_doc = await self.settings_cache.get(guild_id)
         if not settings_doc:
             return None
         section_data = settings_doc.get(section, {})
@@ -204,3 +576,12 @@ class TeamDatabaseService:
         except (ValueError, TypeError):
             return value
 
+    # ========== SETTINGS: AI MODEL ==========
+
+    async def get_active_ai_model(self, guild_id: int) -> str:
+        """Retrieves the active AI model for the guild, returning the default if not set."""
+        return await self.settings_cache.get_field(guild_id, "ai_model", DEFAULT_AI_MODEL)
+
+    async def get_ai_fallback_models(self, guild_id: int) -> List[str]:
+        """Retrieves the models tried after the guild's active model fails, returning the default chain if not set."""
+        return await self.settings_cache.get_field(guild_id, "ai_fallback_models", AI_FALLBACK_MODELS)
@@ -3,7 +3,7 @@ import re
 from typing import Set, Tuple, List, Dict
 
 from ..models.team import TeamConfig, InvalidTeamError, TeamMember
-from ..utils.team_utils import fetch_member_safely, get_member_role_title
+from ..utils.team_utils import fetch_member_safely, fetch_members_batch, get_member_role_title
 
 class TeamValidator:
     """Handles validation logic for teams and members."""
@@ -29,27 +29,38 @@ class TeamValidator:
         return mention_ids
 
     async def filter_and_validate_members(self, guild: discord.Guild, member_ids: Set[str], current_team_size: int, allow_unregistered: bool, target_team_name: str = None) -> Tuple[Set[str], List[str], Dict[str, str]]:
-        """Validates and filters a set of member IDs, returning valid IDs and conflicts."""
+        """
+        Validates and filters a set of member IDs, returning valid IDs and conflicts.
+        All members are resolved with one Discord lookup and all team conflicts are found
+        with one database query, regardless of how many members are mentioned.
+        """
         if current_team_size + len(member_ids) > self.config.max_team_size:
             raise InvalidTeamError(f"Adding these members would exceed the max team size of {self.config.max_team_size}.")
 
         valid_ids, invalid_members, conflicted_members = set(), [], {}
 
+        resolved = await fetch_members_batch(guild, member_ids)
+        candidates = []
         for user_id in member_ids:
-            member = await fetch_member_safely(guild, user_id)
+            member = resolved.get(user_id)
             if not member or member.bot or (get_member_role_title(member) == "Unregistered" and not allow_unregistered):
                 invalid_members.append(user_id)
                 continue
+            candidates.append(user_id)
 
-            # Check if member is already in another team
-            other_team_doc = await self.db.find_team_by_member(guild.id, user_id)
-            if other_team_doc:
-                other_team_name = other_team_doc.get("team_role")
-                # If adding to a team, check if it's the *same* team
-                if not target_team_name or other_team_name != target_team_name:
-                    conflicted_members[user_id] = f"already in {other_team_name}"
-                    continue
+        # Check if members are already in another team
+        team_by_member = {}
+        if candidates:
+            for team_doc in await self.db.find_teams_by_members(guild.id, candidates):
+                for user_id in team_doc.get("member_ids", []):
+                    team_by_member.setdefault(user_id, team_doc.get("team_role"))
 
+        for user_id in candidates:
+            other_team_name = team_by_member.get(user_id)
+            # If adding to a team, check if it's the *same* team
+            if other_team_name and (not target_team_name or other_team_name != target_team_name):
+                conflicted_members[user_id] = f"already in {other_team_name}"
+                continue
             valid_ids.add(user_id)
 
         return valid_ids, invalid_members, conflicted_members
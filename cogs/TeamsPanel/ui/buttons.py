@@ -7,6 +7,7 @@ from ..models.team import TeamNotFoundError
 from .modals import DeleteMemberModal, EditChannelNameModal, TeamFormationModal
 
 from ..permissions import moderator_required
+from database import DatabaseUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -25,8 +26,11 @@ class TeamButton(Button):
 
     async def handle_error(self, interaction: discord.Interaction, error: Exception):
         """Standardized error handling for all button interactions."""
-        logger.error(f"Error in '{self.label}' button: {error}", exc_info=True)
         responder = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+        if isinstance(error, DatabaseUnavailableError):
+            logger.warning(f"'{self.label}' button failed, database unavailable: {error}")
+            return await responder("⚠️ The database is temporarily unavailable. Please try again in a moment.", ephemeral=True)
+        logger.error(f"Error in '{self.label}' button: {error}", exc_info=True)
         await responder("❌ An error occurred. The incident has been logged.", ephemeral=True)
 
 class ViewTeamButton(TeamButton):
@@ -37,7 +41,7 @@ class ViewTeamButton(TeamButton):
     async def callback(self, interaction: discord.Interaction):
         try:
             from .views import TeamDropdownView # Avoid circular import
-            teams = await self.team_manager.get_all_teams(interaction.guild_id)
+            teams = await self.team_manager.get_team_summaries(interaction.guild_id)
             if not teams:
                 return await interaction.response.send_message("ℹ️ No teams are registered in the database.", ephemeral=True)
 
@@ -54,7 +58,7 @@ class DeleteTeamButton(TeamButton):
     async def callback(self, interaction: discord.Interaction):
         try:
             from .views import TeamDropdownView # Avoid circular import
-            teams = await self.team_manager.get_all_teams(interaction.guild_id)
+            teams = await self.team_manager.get_team_summaries(interaction.guild_id)
             if not teams:
                 return await interaction.response.send_message("ℹ️ No teams are available to delete.", ephemeral=True)
 
@@ -126,6 +130,10 @@ class EndMarathonButton(TeamButton):
         embed = discord.Embed(title="🏁 Marathon End Results", description="Cleanup summary:", color=discord.Color.orange())
         embed.add_field(name="🗑️ Channels Removed", value="\n".join(f"• {c}" for c in results['removed_channels']) or "None", inline=False)
         embed.add_field(name="✨ Teams Processed", value="\n".join(f"• {t}" for t in results['processed_teams']) or "None", inline=False)
+        archive_text = f"{results.get('archived_teams', 0)} team(s) archived as marathon `{results['marathon_id']}`"
+        if results.get('archive_remaining'):
+            archive_text += f"\n⚠️ {results['archive_remaining']} team(s) could not be archived. End the marathon again to retry."
+        embed.add_field(name="📦 Archive", value=archive_text, inline=False)
         return embed
 
 class RefreshButton(TeamButton):
@@ -271,15 +279,15 @@ class AssignMemberButton(TeamButton):
     async def callback(self, interaction: discord.Interaction):
         try:
             from .views import UnregisteredMemberDropdownView # Avoid circular import
-            unregistered_doc = await self.team_manager.team_service.get_unregistered_document(interaction.guild_id)
-
-            leaders = unregistered_doc.get("leaders", {}) if unregistered_doc else {}
-            members = unregistered_doc.get("members", {}) if unregistered_doc else {}
+            # A select menu holds at most 25 options, so only that page is read
+            unassigned = await self.team_manager.team_service.get_unregistered_members(
+                interaction.guild_id, projection={"_id": 0, "user_id": 1, "display_name": 1, "role_title": 1}, limit=25
+            )
 
-            if not leaders and not members:
+            if not unassigned:
                 return await interaction.response.send_message("ℹ️ There are no unassigned members to assign.", ephemeral=True)
 
-            view = UnregisteredMemberDropdownView(self.team_manager, self.panel_manager, {**leaders, **members})
+            view = UnregisteredMemberDropdownView(self.team_manager, self.panel_manager, {data["user_id"]: data for data in unassigned})
             await interaction.response.send_message("Select a member to find a suitable team for them:", view=view, ephemeral=True)
         except Exception as e:
             await self.handle_error(interaction, e)
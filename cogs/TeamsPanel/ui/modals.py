@@ -98,8 +98,8 @@ class DeleteMemberModal(Modal, title="Remove Member(s) from Team"):
             if not member_ids_to_remove:
                 return await interaction.followup.send("❌ No valid numbers provided.", ephemeral=True)
 
-            removed, invalid = await self.team_manager.member_service.remove_members_from_team(
-                interaction.guild.id, team, member_ids_to_remove
+            removed, invalid = await self.team_manager.remove_members_from_team(
+                interaction.guild, self.team_role, member_ids_to_remove
             )
 
             msg = [f"**Results for {self.team_role}:**"]
@@ -139,18 +139,9 @@ class TeamFormationModal(Modal, title="Confirm New Team Formation"):
 
         await interaction.response.defer(thinking=True, ephemeral=True)
         try:
-            unassigned_doc = await self.team_manager.team_service.get_unregistered_document(interaction.guild_id)
-            leaders, members = [], []
-
-            if unassigned_doc:
-                for user_id, data in unassigned_doc.get("leaders", {}).items():
-                    leader_profile = dict(data)
-                    leader_profile["user_id"] = user_id
-                    leaders.append(leader_profile)
-                for user_id, data in unassigned_doc.get("members", {}).items():
-                    member_profile = dict(data)
-                    member_profile["user_id"] = user_id
-                    members.append(member_profile)
+            team_service = self.team_manager.team_service
+            leaders = await team_service.get_unregistered_members(interaction.guild_id, role_type="leaders")
+            members = await team_service.get_unregistered_members(interaction.guild_id, role_type="members")
 
             if not leaders and not members:
                 return await interaction.followup.send("ℹ️ No unassigned members found.", ephemeral=True)
@@ -4,7 +4,7 @@ from typing import List, Dict, Optional
 import logging
 
 from ..utils.team_utils import fetch_member_safely, get_member_role_title
-from ..models.team import Team, TeamNotFoundError
+from ..models.team import Team, TeamSummary, TeamNotFoundError
 from .buttons import (
     ViewTeamButton, DeleteTeamButton, StartMarathonButton, EndMarathonButton,
     ReflectButton, RefreshButton, EditChannelNameButton, DeleteMemberButton,
@@ -33,7 +33,7 @@ class MainPanelView(View):
 
 class TeamDropdown(Select):
     """Dropdown menu to select a team for view/delete actions."""
-    def __init__(self, team_manager, panel_manager, teams: List[Team], action: str):
+    def __init__(self, team_manager, panel_manager, teams: List[TeamSummary], action: str):
         self.team_manager = team_manager
         self.panel_manager = panel_manager
         self.action = action
@@ -41,7 +41,7 @@ class TeamDropdown(Select):
         options = [
             discord.SelectOption(
                 label=team.team_role,
-                description=f"#{team.channel_name} | {len(team.members)} members",
+                description=f"#{team.channel_name} | {team.member_count} members",
                 value=team.team_role
             ) for team in teams
         ]
@@ -96,7 +96,7 @@ class TeamDropdown(Select):
 
 
 class TeamDropdownView(View):
-    def __init__(self, team_manager, panel_manager, teams: List[Team], action: str, timeout: Optional[float] = 180):
+    def __init__(self, team_manager, panel_manager, teams: List[TeamSummary], action: str, timeout: Optional[float] = 180):
         super().__init__(timeout=timeout)
         self.add_item(TeamDropdown(team_manager, panel_manager, teams, action))
 
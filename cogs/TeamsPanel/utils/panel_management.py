@@ -23,7 +23,7 @@ class PanelManager:
 
     async def build_teams_embed(self, guild_id: int) -> discord.Embed:
         """Builds the main team management panel embed with up-to-date team info."""
-        teams = await self.team_manager.get_all_teams(guild_id)
+        teams = await self.team_manager.get_team_summaries(guild_id)
         is_marathon_active = await self.team_manager.is_marathon_active(guild_id)
         embed = discord.Embed(title="🏆 Team Management Panel", color=discord.Color(int("242429",16)))
 
@@ -31,7 +31,7 @@ class PanelManager:
             embed.description = "No teams are registered yet. Use `/create_team` or the `Fetch Data` button to find teams."
         else:
             team_list = "\n".join(
-                f"• `{team.team_role}` ({len(team.members)} members) - `#{team.channel_name}`"
+                f"• `{team.team_role}` ({team.member_count} members) - `#{team.channel_name}`"
                 for team in teams
             )
             embed.description = f"**Registered Teams:**\n{team_list}"
@@ -1,40 +1,124 @@
+import discord
 from discord import Message
 import logging
+from typing import Any, Dict, List, Optional
 
 from ..services.ai_handler import AIExtractionError
+from ..services.profile_jobs import QUEUED, RUNNING, DONE, FAILED
 
 logger = logging.getLogger(__name__)
 
+# Reactions the bot keeps on a profile message while its extraction job progresses ("done" is shown by 💾)
+JOB_STATUS_REACTIONS = {QUEUED: "⏳", RUNNING: "⚙️", FAILED: "❌"}
+# Reactions replaced by each status (a batch puts jobs it could not finish back in the queue)
+JOB_STATUS_REPLACES = {QUEUED: (FAILED, RUNNING), RUNNING: (QUEUED,), DONE: (RUNNING,), FAILED: (RUNNING,)}
+
 class ProfileParser:
     """Handles profile parsing functionality."""
 
-    def __init__(self, team_manager):
+    def __init__(self, team_manager, bot=None):
         self.team_manager = team_manager
+        self.bot = bot
+
+    async def process_job(self, job: Dict[str, Any]) -> bool:
+        """ProfileJobQueue handler: fetches the job's message and parses it. Returns whether the profile was saved."""
+        channel = self.bot.get_channel(job["channel_id"])
+        if channel is None:
+            return False
+        try:
+            message = await channel.fetch_message(job["message_id"])
+        except discord.NotFound:
+            return False
+        return await self.handle_profile_parsing(message, job["guild_id"])
+
+    async def process_jobs(self, jobs: List[Dict[str, Any]]) -> Dict[int, Optional[bool]]:
+        """
+        ProfileJobQueue batch handler: extracts the profiles of one guild's jobs together.
+
+        Returns:
+            Dict[int, Optional[bool]]: message_id -> True if saved, False if it cannot succeed,
+                None (or missing) if the job should be retried.
+        """
+        outcomes: Dict[int, Optional[bool]] = {}
+        messages: Dict[str, Message] = {}
+        for job in jobs:
+            channel = self.bot.get_channel(job["channel_id"])
+            try:
+                message = await channel.fetch_message(job["message_id"]) if channel else None
+            except discord.NotFound:
+                message = None
+            if message is None:
+                outcomes[job["message_id"]] = False
+                continue
+            messages[str(message.id)] = message
+        if not messages:
+            return outcomes
+
+        guild_id = jobs[0]["guild_id"]
+        try:
+            extracted = await self.team_manager.ai_handler.extract_profiles_batch(
+                {message_id: message.content for message_id, message in messages.items()}, guild_id
+            )
+        except AIExtractionError as e:
+            logger.warning(f"Batched profile extraction failed for guild {guild_id}: {e}")
+            return outcomes
+
+        for message_id, message in messages.items():
+            if message_id not in extracted:
+                continue  # Retried by the queue
+            data = extracted[message_id]
+            if not data:
+                await message.channel.send("❌ AI failed to extract data.", delete_after=5)
+                outcomes[message.id] = False
+                continue
+            try:
+                outcomes[message.id] = await self.save_extracted_profile(message, data)
+            except Exception as e:
+                logger.error(f"Error saving parsed profile {message.id}: {e}", exc_info=True)
+        return outcomes
 
-    async def handle_profile_parsing(self, message: Message, guild_id: int):
-        """Internal logic for parsing profile messages from reactions."""
+    async def show_job_status(self, job: Dict[str, Any], status: str):
+        """ProfileJobQueue status callback: swaps the bot's status reaction on the job's message."""
+        channel = self.bot.get_channel(job["channel_id"])
+        if channel is None:
+            return
+        message = channel.get_partial_message(job["message_id"])
+        for replaced in JOB_STATUS_REPLACES.get(status, ()):
+            await message.remove_reaction(JOB_STATUS_REACTIONS[replaced], self.bot.user)
+        if status in JOB_STATUS_REACTIONS:
+            await message.add_reaction(JOB_STATUS_REACTIONS[status])
+
+    async def handle_profile_parsing(self, message: Message, guild_id: int) -> bool:
+        """Internal logic for parsing profile messages from reactions. Returns whether profile data was saved."""
         try:
             extracted_data = await self.team_manager.ai_handler.extract_profile_data(message.content, guild_id)
             if not extracted_data:
-                return await message.channel.send("❌ AI failed to extract data.", delete_after=5)
-
-            role_title = self.team_manager._get_member_role_title(message.author)
-            if role_title == "Unregistered":
-                return await message.channel.send(f"⚠️ {message.author.mention} needs a team role.", delete_after=15)
-
-            # Save to unassigned members collection
-            role_type = "leaders" if role_title == "Team Leader" else "members"
-            member_data = {
-                "username": message.author.name,
-                "display_name": message.author.display_name,
-                "role_title": role_title,
-                "profile_data": extracted_data
-            }
-            await self.team_manager.team_service.save_unregistered_member(message.guild.id, str(message.author.id), member_data, role_type)
-            await message.add_reaction("💾")  # Add a save icon reaction
-            logger.info(f"Profile data saved for {message.author.mention}. profile_data: \n{extracted_data}")
+                await message.channel.send("❌ AI failed to extract data.", delete_after=5)
+                return False
+            return await self.save_extracted_profile(message, extracted_data)
         except AIExtractionError as e:
             await message.channel.send(f"❌ AI Error: {e}", delete_after=5)
         except Exception as e:
             logger.error(f"Error in profile parsing: {e}", exc_info=True)
             await message.channel.send("❌ An unexpected error occurred.", delete_after=5)
+        return False
+
+    async def save_extracted_profile(self, message: Message, extracted_data: Dict) -> bool:
+        """Saves extracted profile data for the message's author as an unassigned member. Returns whether it was saved."""
+        role_title = self.team_manager._get_member_role_title(message.author)
+        if role_title == "Unregistered":
+            await message.channel.send(f"⚠️ {message.author.mention} needs a team role.", delete_after=15)
+            return False
+
+        # Save to unassigned members collection
+        role_type = "leaders" if role_title == "Team Leader" else "members"
+        member_data = {
+            "username": message.author.name,
+            "display_name": message.author.display_name,
+            "role_title": role_title,
+            "profile_data": extracted_data
+        }
+        await self.team_manager.team_service.save_unregistered_member(message.guild.id, str(message.author.id), member_data, role_type)
+        await message.add_reaction("💾")  # Add a save icon reaction
+        logger.info(f"Profile data saved for {message.author.mention}. profile_data: \n{extracted_data}")
+        return True
@@ -1,8 +1,9 @@
+import asyncio
 import discord
 import logging
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, Iterable, Optional, TypeVar
 
-from ..models.team import Team, TeamMember, TeamError
+from ..models.team import Team, TeamMember, TeamSummary, TeamError, TeamConflictError
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +16,39 @@ async def fetch_member_safely(guild: discord.Guild, user_id: str) -> Optional[di
         logger.warning(f"Could not fetch member {user_id}: {e}")
         return None
 
+async def fetch_members_batch(guild: discord.Guild, user_ids: Iterable[str]) -> Dict[str, discord.Member]:
+    """
+    Resolves many member IDs at once: cached members are used directly and the rest are
+    requested in a single gateway query (chunks of 100, the gateway limit).
+    IDs that cannot be resolved are omitted from the result.
+    """
+    resolved, missing = {}, []
+    for user_id in user_ids:
+        try:
+            member = guild.get_member(int(user_id))
+        except ValueError:
+            logger.warning(f"Could not fetch member {user_id}: invalid ID")
+            continue
+        if member:
+            resolved[user_id] = member
+        else:
+            missing.append(int(user_id))
+
+    for i in range(0, len(missing), 100):
+        chunk = missing[i:i + 100]
+        try:
+            for member in await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True):
+                resolved[str(member.id)] = member
+        except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException) as e:
+            # Fall back to individual lookups, e.g. when the members intent is unavailable.
+            logger.warning(f"Batch member query failed, falling back to individual fetches: {e}")
+            for member_id in chunk:
+                member = await fetch_member_safely(guild, str(member_id))
+                if member:
+                    resolved[str(member_id)] = member
+
+    return resolved
+
 def get_member_role_title(member: discord.Member) -> str:
     """Determines a member's role title based on their Discord roles."""
     roles = {role.name for role in member.roles}
@@ -32,7 +66,33 @@ def build_team_from_data(guild_id: int, team_data: Dict) -> Team:
         team_role=team_data["team_role"],
         channel_name=team_data["channel_name"],
         members=members,
-        _team_number=team_data.get("team_number")
+        _team_number=team_data.get("team_number"),
+        version=team_data.get("version", 0)
+    )
+
+T = TypeVar("T")
+
+async def retry_on_conflict(operation: Callable[[], Awaitable[T]], attempts: int = 3, delay: float = 0.05) -> T:
+    """
+    Runs a read-modify-write operation, re-running it from scratch when it raises
+    TeamConflictError because another edit won the race. The operation must re-read the team.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await operation()
+        except TeamConflictError as e:
+            if attempt == attempts:
+                raise
+            logger.info(f"Retrying after concurrent team modification (attempt {attempt}/{attempts}): {e}")
+            await asyncio.sleep(delay * attempt)
+
+def build_team_summary_from_data(summary_data: Dict) -> TeamSummary:
+    """Builds a TeamSummary object from a team summary aggregation result."""
+    return TeamSummary(
+        team_role=summary_data["team_role"],
+        channel_name=summary_data["channel_name"],
+        member_count=summary_data.get("member_count", 0),
+        _team_number=summary_data.get("team_number")
     )
 
 async def cleanup_team_discord_resources(guild: discord.Guild, team: Team):
@@ -13,6 +13,61 @@ SETTINGS_COLLECTION=os.getenv("SETTINGS_COLLECTION", "settings")
 TEAMS_COLLECTION =os.getenv("TEAMS_COLLECTION ", "teams")
 UNREGISTERED_MEMBERS_COLLECTION=os.getenv("UNREGISTERED_MEMBERS_COLLECTION", "unregistered_members")
 EMBEDS_COLLECTION=os.getenv("EMBEDS_COLLECTION", "embeds")
+MIGRATIONS_COLLECTION=os.getenv("MIGRATIONS_COLLECTION", "migrations")
+COUNTERS_COLLECTION=os.getenv("COUNTERS_COLLECTION", "counters")
+TEAM_ARCHIVE_COLLECTION=os.getenv("TEAM_ARCHIVE_COLLECTION", "team_archive")
+PROFILE_JOBS_COLLECTION=os.getenv("PROFILE_JOBS_COLLECTION", "profile_jobs")
+AI_EXTRACTION_CACHE_COLLECTION=os.getenv("AI_EXTRACTION_CACHE_COLLECTION", "extraction_cache")
+
+# --- MongoDB Client Options ---
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 0))  # 0 keeps idle connections open indefinitely
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000))
+MONGO_COMPRESSORS = [c.strip() for c in os.getenv("MONGO_COMPRESSORS", "").split(",") if c.strip()]  # e.g. "zstd,snappy,zlib"
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+# --- Database Instrumentation ---
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 100))
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", 100))
+DB_EXPLAIN_SAMPLE_RATE = float(os.getenv("DB_EXPLAIN_SAMPLE_RATE", 0.0))  # Fraction of slow reads to explain
+DB_CURSOR_BATCH_SIZE = int(os.getenv("DB_CURSOR_BATCH_SIZE", 100))  # Documents fetched per round trip by find_iter/aggregate_iter
+
+# --- Database Resilience ---
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", 3))  # Total attempts for retryable errors, including the first
+DB_RETRY_BASE_DELAY_MS = float(os.getenv("DB_RETRY_BASE_DELAY_MS", 50))
+DB_RETRY_MAX_DELAY_MS = float(os.getenv("DB_RETRY_MAX_DELAY_MS", 1000))
+DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv("DB_BREAKER_FAILURE_THRESHOLD", 5))  # Consecutive failures before failing fast
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", 30))  # Seconds before a probe request is let through
+
+# --- Settings Cache ---
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", 60))  # Seconds, used only while change streams are unavailable
+SETTINGS_CACHE_WATCH_RETRY = float(os.getenv("SETTINGS_CACHE_WATCH_RETRY", 300))  # Seconds before re-opening a closed change stream
+
+# --- Team Cache ---
+TEAM_CACHE_MAX_GUILDS = int(os.getenv("TEAM_CACHE_MAX_GUILDS", 100))  # Least recently used guilds are evicted beyond this
+TEAM_CACHE_MAX_TEAMS_PER_GUILD = int(os.getenv("TEAM_CACHE_MAX_TEAMS_PER_GUILD", 200))
+TEAM_CACHE_TTL = float(os.getenv("TEAM_CACHE_TTL", 30))  # Seconds, used only while change streams are unavailable
+TEAM_CACHE_WATCH_RETRY = float(os.getenv("TEAM_CACHE_WATCH_RETRY", 300))  # Seconds before re-opening a closed change stream
+
+# --- Marathon Archive ---
+TEAM_ARCHIVE_BATCH_SIZE = int(os.getenv("TEAM_ARCHIVE_BATCH_SIZE", 100))  # Teams copied and deleted per round trip when a marathon ends
+
+# --- Profile Extraction Jobs ---
+PROFILE_JOB_WORKERS = int(os.getenv("PROFILE_JOB_WORKERS", 4))  # Extractions running at once
+PROFILE_JOB_BATCH_SIZE = int(os.getenv("PROFILE_JOB_BATCH_SIZE", 10))  # Jobs of one guild a worker claims together for batched extraction
+PROFILE_JOB_MAX_QUEUED_PER_GUILD = int(os.getenv("PROFILE_JOB_MAX_QUEUED_PER_GUILD", 500))  # Further requests are refused
+PROFILE_JOB_LEASE = float(os.getenv("PROFILE_JOB_LEASE", 300))  # Seconds before a running job is presumed abandoned
+PROFILE_JOB_MAX_ATTEMPTS = int(os.getenv("PROFILE_JOB_MAX_ATTEMPTS", 3))  # Runs of an abandoned job before it is failed
+PROFILE_JOB_RETRY_BACKOFF = float(os.getenv("PROFILE_JOB_RETRY_BACKOFF", 30))  # Seconds before a batch job is retried, doubled per attempt
+PROFILE_JOB_RETRY_BACKOFF_MAX = float(os.getenv("PROFILE_JOB_RETRY_BACKOFF_MAX", 600))  # Longest wait before a retry
+PROFILE_JOB_SWEEP_INTERVAL = float(os.getenv("PROFILE_JOB_SWEEP_INTERVAL", 30))  # Seconds between checks for abandoned or foreign jobs
+
+# --- Guild State Store ---
+GUILD_STATE_ENABLED = os.getenv("GUILD_STATE_ENABLED", "false").lower() == "true"  # Needs a replica set for change streams
+GUILD_STATE_SNAPSHOT_PATH = os.getenv("GUILD_STATE_SNAPSHOT_PATH", "guild_state.snapshot")  # Empty disables snapshots
+GUILD_STATE_SNAPSHOT_INTERVAL = float(os.getenv("GUILD_STATE_SNAPSHOT_INTERVAL", 60))  # Seconds between snapshots
+GUILD_STATE_WATCH_RETRY = float(os.getenv("GUILD_STATE_WATCH_RETRY", 30))  # Seconds before re-opening a closed change stream
 
 # --- AI Model Configuration ---
 
@@ -26,6 +81,17 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 DEFAULT_AI_MODEL = os.getenv("DEFAULT_AI_MODEL", "gemini-2.5-flash")
 
 AI_TIMEOUT = int(os.getenv("AI_TIMEOUT", 30))
+# Per-provider overrides of AI_TIMEOUT in seconds, e.g. "google=20,openrouter=60"
+AI_PROVIDER_TIMEOUTS = {
+    name.strip(): float(seconds) for name, _, seconds in
+    (item.partition("=") for item in os.getenv("AI_PROVIDER_TIMEOUTS", "").split(",")) if seconds.strip()
+}
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", 5))
+
+# Connection pool shared by the OpenAI-compatible providers
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", 100))  # Requests in flight beyond this wait for a connection
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", 20))  # Idle connections kept open for reuse
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", 30))  # Seconds an idle connection is kept
 
 # --- Team & Server Configuration ---
 REACTION_EMOJI=os.getenv("REACTION_EMOJI", "✅")
@@ -89,6 +155,13 @@ POE_MODELS = [
   "o1-mini", # 337 points/message
   "GPT-4-Turbo", # 378 points/message
 ]
+POE_DAILY_POINTS = int(os.getenv("POE_DAILY_POINTS", 3000))  # Free tier allowance, shared by every Poe model
+POE_MODEL_POINTS = {
+  "Assistant": 7, "Gemma-2-9b-it": 5, "GPT-5-nano": 6, "GPT-4.1-nano": 6, "GPT-4o-mini": 9,
+  "GPT-3.5-Turbo-Instruct": 10, "GPT-3.5-Turbo": 11, "GPT-3.5-Turbo-Raw": 12, "GPT-4.1-mini": 25,
+  "GPT-5-mini": 26, "GPT-4o-Aug": 117, "GPT-5-Chat": 130, "o3-mini": 202, "GPT-4o": 224, "GPT-4.1": 226,
+  "o4-mini": 248, "GPT-5": 251, "ChatGPT-4o-Latest": 337, "o1-mini": 337, "GPT-4-Turbo": 378,
+}
 
 GOOGLE_MODELS = [
   "gemini-1.5-flash", # 1000 Requests Per Minute, Unlimited Requests Per Day
@@ -96,6 +169,12 @@ GOOGLE_MODELS = [
   "gemini-1.5-pro", # 5 Requests Per Minute, 25 Requests Per Day
   "gemini-2.5-pro", # 5 Requests Per Minute, 25 Requests Per Day
 ]
+GOOGLE_MODEL_QUOTAS = {
+  "gemini-1.5-flash": {"rpm": 1000},
+  "gemini-2.5-flash": {"rpm": 5, "rpd": 500},
+  "gemini-1.5-pro": {"rpm": 5, "rpd": 25},
+  "gemini-2.5-pro": {"rpm": 5, "rpd": 25},
+}
 
 DEEPSEEK_MODELS = [
   "deepseek-chat",
@@ -118,3 +197,56 @@ OPENROUTER_MODELS = [
   "mistralai/mistral-small-24b-instruct-2501:free",
   "mistralai/mistral-7b-instruct:free",
 ]
+OPENROUTER_FREE_QUOTA = {"rpm": 20, "rpd": 50}  # Shared by every ":free" model
+
+# --- AI Batch Extraction ---
+# Several profiles are extracted per request; the batch size per model follows its context window and output limit.
+AI_BATCH_MAX_PROFILES = int(os.getenv("AI_BATCH_MAX_PROFILES", 10))
+AI_BATCH_CONTEXT_SHARE = float(os.getenv("AI_BATCH_CONTEXT_SHARE", 0.5))  # Fraction of the context window a batch prompt may fill
+AI_BATCH_OUTPUT_TOKENS_PER_PROFILE = int(os.getenv("AI_BATCH_OUTPUT_TOKENS_PER_PROFILE", 300))
+AI_DEFAULT_CONTEXT_TOKENS = 8192
+AI_DEFAULT_MAX_OUTPUT_TOKENS = 4096
+AI_MODEL_CONTEXT_TOKENS = {
+  "gemini-1.5-flash": 1_048_576, "gemini-2.5-flash": 1_048_576, "gemini-1.5-pro": 2_097_152, "gemini-2.5-pro": 1_048_576,
+  "deepseek-chat": 65_536, "deepseek-coder": 16_384,
+  "GPT-4o-mini": 128_000, "GPT-4o": 128_000, "GPT-4.1-nano": 1_047_576, "GPT-4.1-mini": 1_047_576, "GPT-4.1": 1_047_576,
+  "GPT-3.5-Turbo": 16_385, "Gemma-2-9b-it": 8192,
+}
+AI_MODEL_MAX_OUTPUT_TOKENS = {
+  "gemini-1.5-flash": 8192, "gemini-2.5-flash": 65_536, "gemini-1.5-pro": 8192, "gemini-2.5-pro": 65_536,
+  "deepseek-chat": 8192, "GPT-4o-mini": 16_384, "GPT-4o": 16_384,
+}
+
+# --- Local Profile Extraction ---
+# Formulaic profiles are extracted by rules (timezone parser + keyword taxonomy) without an AI call.
+LOCAL_EXTRACTION_ENABLED = os.getenv("LOCAL_EXTRACTION_ENABLED", "true").lower() == "true"
+LOCAL_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("LOCAL_EXTRACTION_MIN_CONFIDENCE", 0.8))  # Less confident results go to the AI model
+
+# --- AI Extraction Cache ---
+AI_EXTRACTION_CACHE_TTL = int(os.getenv("AI_EXTRACTION_CACHE_TTL", 30 * 86400))  # Seconds a stored extraction is reused
+AI_EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("AI_EXTRACTION_CACHE_MAX_ENTRIES", 2048))  # Kept in memory in front of the collection
+
+# --- AI Rate Limits ---
+# Quotas are token buckets: "rpm"/"rpd" are requests per minute/day, "points_per_day" is spent per call
+# by the model's cost. Model quotas apply per model; provider quotas are shared by all of the provider's models.
+AI_MODEL_QUOTAS = {**GOOGLE_MODEL_QUOTAS}
+AI_PROVIDER_QUOTAS = {
+  "openrouter": OPENROUTER_FREE_QUOTA,
+  "poe": {"points_per_day": POE_DAILY_POINTS},
+}
+AI_MODEL_COSTS = {**POE_MODEL_POINTS}  # Cost against "points_per_day" buckets; 1 for unlisted models
+AI_RATE_LIMIT_MAX_WAIT = float(os.getenv("AI_RATE_LIMIT_MAX_WAIT", 120))  # Seconds a call may wait for quota before failing
+AI_RATE_LIMIT_BACKOFF = float(os.getenv("AI_RATE_LIMIT_BACKOFF", 60))  # Pause after a 429 that carries no Retry-After
+
+# --- AI Failover & Hedging ---
+# Models tried, in order, after a guild's active model fails; guilds can set their own chain ("ai_fallback_models" setting).
+# Models of providers without an API key are skipped.
+AI_FALLBACK_MODELS = [m.strip() for m in os.getenv(
+    "AI_FALLBACK_MODELS", "gemini-1.5-flash,deepseek-chat,GPT-4o-mini,deepseek/deepseek-chat-v3-0324:free,openai/gpt-oss-20b"
+).split(",") if m.strip()]
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "true").lower() == "true"  # Start the next model when a call outlasts its provider's p95
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", 2))  # Seconds; a hedge never starts sooner than this
+AI_HEDGE_DEFAULT_DELAY = float(os.getenv("AI_HEDGE_DEFAULT_DELAY", 15))  # Seconds, until a provider has enough latency samples
+AI_HEALTH_WINDOW = float(os.getenv("AI_HEALTH_WINDOW", 300))  # Seconds of calls that provider health is computed from
+AI_HEALTH_MIN_SAMPLES = int(os.getenv("AI_HEALTH_MIN_SAMPLES", 5))  # Calls in the window before health is judged
+AI_HEALTH_MAX_ERROR_RATE = float(os.getenv("AI_HEALTH_MAX_ERROR_RATE", 0.5))  # Providers failing more often are tried last
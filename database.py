@@ -1,47 +1,448 @@
+import asyncio
+import importlib.util
 import logging
 import motor.motor_asyncio
-from pymongo.errors import ServerSelectionTimeoutError, DuplicateKeyError
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+from datetime import datetime
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple, TypeVar, Union, Awaitable, AsyncIterator
+from config import (
+    MIGRATIONS_COLLECTION, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_COMPRESSORS, MONGO_READ_PREFERENCE,
+    DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG_SIZE, DB_EXPLAIN_SAMPLE_RATE, DB_CURSOR_BATCH_SIZE,
+    DB_RETRY_ATTEMPTS, DB_RETRY_BASE_DELAY_MS, DB_RETRY_MAX_DELAY_MS, DB_BREAKER_FAILURE_THRESHOLD, DB_BREAKER_RESET_SECONDS
+)
+from db_monitoring import CommandListener, PoolStatsListener
+from db_resilience import CircuitBreaker, DatabaseUnavailableError, DbResult, DbStatus, ErrorKind, RetryPolicy, classify_error
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Server error codes meaning a change stream cannot continue from the requested resume token
+_RESUME_FAILED_CODES = {
+    260,  # InvalidResumeToken
+    280,  # ChangeStreamFatalError
+    286,  # ChangeStreamHistoryLost
+}
+
+class ChangeStreamResumeError(Exception):
+    """Raised by DatabaseManager.watch when a resume token was rejected, e.g. because it fell off the oplog."""
+    pass
+
+class MigrationError(Exception):
+    """Raised by DatabaseManager.run_migrations when a migration fails; the migrations after it were not run."""
+    pass
+
+def _index_keys(index_info: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """Normalizes the key spec of an `index_information()` entry (directions come back as floats)."""
+    return tuple((field, direction if isinstance(direction, str) else int(direction)) for field, direction in index_info.get("key", []))
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """Declares an index that a service relies on. Registered with DatabaseManager.register_indexes."""
+    name: str
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+    expire_after_seconds: Optional[int] = None  # Makes it a TTL index: documents expire this long after the indexed date
+
+    def matches(self, index_info: Dict[str, Any]) -> bool:
+        """Checks whether an entry from `index_information()` has the same definition."""
+        return (
+            _index_keys(index_info) == tuple(self.keys)
+            and bool(index_info.get("unique", False)) == self.unique
+            and index_info.get("expireAfterSeconds") == self.expire_after_seconds
+        )
+
+# Python modules pymongo needs for each wire compressor (zlib ships with the standard library).
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+@dataclass(frozen=True)
+class MongoClientOptions:
+    """Connection pool, compression and read preference settings passed to the Motor client."""
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: int = 0
+    server_selection_timeout_ms: int = 30000
+    compressors: Tuple[str, ...] = field(default_factory=tuple)
+    read_preference: str = "primary"
+
+    @classmethod
+    def from_config(cls) -> "MongoClientOptions":
+        """Builds the options from the MONGO_* values in config.py."""
+        return cls(
+            max_pool_size=MONGO_MAX_POOL_SIZE,
+            min_pool_size=MONGO_MIN_POOL_SIZE,
+            max_idle_time_ms=MONGO_MAX_IDLE_TIME_MS,
+            server_selection_timeout_ms=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            compressors=tuple(MONGO_COMPRESSORS),
+            read_preference=MONGO_READ_PREFERENCE,
+        )
+
+    def available_compressors(self) -> List[str]:
+        """Returns the requested compressors whose Python packages are installed, in order of preference."""
+        available = []
+        for name in self.compressors:
+            module = _COMPRESSOR_MODULES.get(name)
+            if module is None:
+                logger.warning(f"Ignoring unknown MongoDB compressor '{name}'.")
+            elif importlib.util.find_spec(module) is None:
+                logger.warning(f"Ignoring MongoDB compressor '{name}': the '{module}' package is not installed.")
+            else:
+                available.append(name)
+        return available
+
+    def to_client_kwargs(self) -> Dict[str, Any]:
+        """Converts the options into AsyncIOMotorClient keyword arguments."""
+        kwargs = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "readPreference": self.read_preference,
+        }
+        if self.max_idle_time_ms:
+            kwargs["maxIdleTimeMS"] = self.max_idle_time_ms
+        compressors = self.available_compressors()
+        if compressors:
+            kwargs["compressors"] = ",".join(compressors)
+        return kwargs
+
+# Update operators that can be folded into a single update document.
+_MERGEABLE_OPERATORS = {"$set", "$unset"}
+
+def _paths_overlap(path: str, other: str) -> bool:
+    """Checks whether two dotted field paths touch the same data (equal, or one contains the other)."""
+    return path == other or path.startswith(other + ".") or other.startswith(path + ".")
+
+@dataclass
+class _QueuedWrite:
+    """A write waiting in a WriteBatch, possibly standing in for several coalesced requests."""
+    kind: str
+    query: Optional[Dict[str, Any]]
+    document: Any
+    upsert: bool
+    op_indexes: List[int]
+
+    def to_operation(self):
+        if self.kind == "insert_one":
+            return InsertOne(self.document)
+        if self.kind == "update_one":
+            return UpdateOne(self.query, self.document, upsert=self.upsert)
+        if self.kind == "update_many":
+            return UpdateMany(self.query, self.document, upsert=self.upsert)
+        if self.kind == "delete_one":
+            return DeleteOne(self.query)
+        return DeleteMany(self.query)
+
+    def merge(self, kind: str, query: Dict[str, Any], update: Any, upsert: bool) -> bool:
+        """
+        Folds another $set/$unset update of the same documents into this one.
+        Returns False (leaving this write untouched) if the two cannot be combined.
+        """
+        if kind != self.kind or kind not in ("update_one", "update_many") or query != self.query:
+            return False
+        # A later plain update can ride along with an earlier upsert (it would hit the upserted
+        # document anyway), but not the other way round.
+        if upsert and not self.upsert:
+            return False
+        if not isinstance(update, dict) or not isinstance(self.document, dict):
+            return False
+        if set(update) - _MERGEABLE_OPERATORS or set(self.document) - _MERGEABLE_OPERATORS:
+            return False
+
+        for operator, fields in update.items():
+            for path in fields:
+                for other_operator, other_fields in self.document.items():
+                    for other in other_fields:
+                        # Re-setting the same path is fine (the later value wins, as it would sequentially);
+                        # anything else touching overlapping paths would conflict in a single update.
+                        if _paths_overlap(path, other) and not (path == other and operator == other_operator):
+                            return False
+
+        for operator, fields in update.items():
+            self.document.setdefault(operator, {}).update(fields)
+        return True
+
+@dataclass
+class BulkWriteReport:
+    """Outcome of WriteBatch.flush(). Operation indexes are the values returned when queueing."""
+    requested: int = 0
+    sent: int = 0
+    round_trips: int = 0
+    inserted: int = 0
+    matched: int = 0
+    modified: int = 0
+    deleted: int = 0
+    upserted: int = 0
+    upserted_ids: Dict[int, Any] = field(default_factory=dict)
+    errors: Dict[int, str] = field(default_factory=dict)
+    unavailable: bool = False  # The database became unavailable; failed operations may be retried later
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def succeeded(self, op_index: int) -> bool:
+        """Checks whether a queued operation was applied."""
+        return op_index not in self.errors
+
+class WriteBatch:
+    """
+    Unit of work that collects the writes of one logical operation and flushes them as a
+    single bulk write per collection.
+
+    Successive $set/$unset updates with an identical filter are coalesced into one update.
+    Collections are flushed unordered unless the batch was created with ordered=True, or a
+    write to a filter could not be merged with an earlier write to the same filter, in which
+    case that collection is flushed ordered so the writes still apply in sequence.
+    """
+
+    def __init__(self, db: "DatabaseManager", ordered: bool = False):
+        self.db = db
+        self.ordered = ordered
+        self._writes: Dict[str, List[_QueuedWrite]] = {}
+        self._ordered_collections: Set[str] = set()
+        self._after_flush: List[Callable[[], None]] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def insert_one(self, collection_name: str, document: Dict[str, Any]) -> int:
+        """Queues an insert and returns its operation index."""
+        return self._queue(collection_name, "insert_one", None, document)
+
+    def update_one(self, collection_name: str, query: Dict[str, Any], update_data: Dict[str, Any], upsert: bool = False) -> int:
+        """Queues a single-document update and returns its operation index."""
+        return self._queue(collection_name, "update_one", query, update_data, upsert)
+
+    def update_many(self, collection_name: str, query: Dict[str, Any], update_data: Dict[str, Any], upsert: bool = False) -> int:
+        """Queues a multi-document update and returns its operation index."""
+        return self._queue(collection_name, "update_many", query, update_data, upsert)
+
+    def delete_one(self, collection_name: str, query: Dict[str, Any]) -> int:
+        """Queues a single-document delete and returns its operation index."""
+        return self._queue(collection_name, "delete_one", query, None)
+
+    def delete_many(self, collection_name: str, query: Dict[str, Any]) -> int:
+        """Queues a multi-document delete and returns its operation index."""
+        return self._queue(collection_name, "delete_many", query, None)
+
+    def after_flush(self, callback: Callable[[], None]):
+        """Registers a callback to run once the queued writes have been sent, e.g. to invalidate a cache."""
+        self._after_flush.append(callback)
+
+    def _queue(self, collection_name: str, kind: str, query: Optional[Dict[str, Any]], document: Any, upsert: bool = False) -> int:
+        op_index = self._count
+        self._count += 1
+        writes = self._writes.setdefault(collection_name, [])
+
+        if query is not None:
+            previous = next((w for w in reversed(writes) if w.query == query), None)
+            if previous is not None:
+                if previous.merge(kind, query, document, upsert):
+                    previous.op_indexes.append(op_index)
+                    return op_index
+                self._ordered_collections.add(collection_name)
+
+        if isinstance(document, dict) and kind.startswith("update"):
+            # Copy so that later merges never modify the caller's update document.
+            document = {operator: dict(fields) if isinstance(fields, dict) else fields for operator, fields in document.items()}
+        writes.append(_QueuedWrite(kind, query, document, upsert, [op_index]))
+        return op_index
+
+    async def flush(self) -> BulkWriteReport:
+        """
+        Sends every queued write (one round trip per collection) and empties the batch.
+
+        Returns:
+            BulkWriteReport: Aggregate counts plus per-operation upserted ids and errors.
+        """
+        report = BulkWriteReport(requested=self._count)
+        writes, ordered_collections, after_flush = self._writes, self._ordered_collections, self._after_flush
+        self._writes, self._ordered_collections, self._after_flush, self._count = {}, set(), [], 0
+
+        for collection_name, queued in writes.items():
+            if report.unavailable:
+                # Fail fast instead of waiting on an unhealthy database once per collection.
+                for write in queued:
+                    for op_index in write.op_indexes:
+                        report.errors[op_index] = "database unavailable"
+                continue
+
+            ordered = self.ordered or collection_name in ordered_collections
+            try:
+                result = await self.db.bulk_write_result(collection_name, [w.to_operation() for w in queued], ordered=ordered)
+            except DatabaseUnavailableError:
+                report.unavailable = True
+                result = None
+            report.sent += len(queued)
+            report.round_trips += 1
+
+            if result is None:
+                for write in queued:
+                    for op_index in write.op_indexes:
+                        report.errors[op_index] = "database unavailable" if report.unavailable else "bulk write failed"
+                continue
+
+            report.inserted += result.get("nInserted", 0)
+            report.matched += result.get("nMatched", 0)
+            report.modified += result.get("nModified", 0)
+            report.deleted += result.get("nRemoved", 0)
+            report.upserted += result.get("nUpserted", 0)
+            for upsert in result.get("upserted", []):
+                for op_index in queued[upsert["index"]].op_indexes:
+                    report.upserted_ids[op_index] = upsert["_id"]
+
+            write_errors = result.get("writeErrors", [])
+            for error in write_errors:
+                for op_index in queued[error["index"]].op_indexes:
+                    report.errors[op_index] = error.get("errmsg", "write error")
+            if ordered and write_errors:
+                # An ordered bulk write stops at its first error; later writes never ran.
+                for write in queued[write_errors[0]["index"] + 1:]:
+                    for op_index in write.op_indexes:
+                        report.errors.setdefault(op_index, "not executed after an earlier error")
+
+        if report.errors:
+            logger.warning(f"Write batch finished with {len(report.errors)} failed operation(s) out of {report.requested}.")
+        # Run even if writes failed: some of them may still have been applied.
+        for callback in after_flush:
+            callback()
+        return report
+
 class DatabaseManager:
-    """Manages all interactions with the MongoDB database."""
+    """
+    Manages all interactions with the MongoDB database.
+
+    Every driver call goes through a retry policy and a circuit breaker (see db_resilience).
+    Methods return None/[]/False/0 only when nothing matched or a query was rejected; when the
+    database itself is unavailable they raise DatabaseUnavailableError instead. Use `attempt()`
+    to get a DbResult rather than an exception.
+    """
 
-    def __init__(self, mongo_uri: str, db_name: str):
+    def __init__(self, mongo_uri: str, db_name: str, options: Optional[MongoClientOptions] = None):
         """
         Initializes the MongoDB connection and selects the database.
 
         Args:
             mongo_uri (str): The connection URI for the MongoDB instance.
             db_name (str): The name of the database to use.
+            options (MongoClientOptions, optional): Client settings. Defaults to the values in config.py.
         """
+        self._index_registry: Dict[str, Dict[str, IndexSpec]] = {}
+        self._retired_indexes: Dict[str, Set[str]] = {}
+        self._migrations: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self.options = options or MongoClientOptions.from_config()
+        self.pool_stats = PoolStatsListener()
+        self.command_stats = CommandListener(DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG_SIZE, DB_EXPLAIN_SAMPLE_RATE)
+        self.retry_policy = RetryPolicy(DB_RETRY_ATTEMPTS, DB_RETRY_BASE_DELAY_MS / 1000, DB_RETRY_MAX_DELAY_MS / 1000)
+        self.breaker = CircuitBreaker(DB_BREAKER_FAILURE_THRESHOLD, DB_BREAKER_RESET_SECONDS)
         try:
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri)
-            self.db = self.client[db_name]
+            self.db = self._open_database(mongo_uri, db_name)
             logger.info(f"Successfully connected to MongoDB database: {db_name}")
         except Exception as e:
             logger.critical(f"Failed to connect to MongoDB: {e}")
             raise
 
-    async def find_one(self, collection_name: str, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def _open_database(self, mongo_uri: str, db_name: str):
+        """Creates the client and returns the database handle. Overridden by alternative backends (see db_memory)."""
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(
+            mongo_uri, event_listeners=[self.pool_stats, self.command_stats], **self.options.to_client_kwargs()
+        )
+        return self.client[db_name]
+
+    # ========== RESILIENCE ==========
+
+    async def _execute(self, operation: str, call: Callable[[], Awaitable[T]], idempotent: bool = True) -> T:
+        """
+        Runs a driver call through the circuit breaker and retry policy.
+
+        Args:
+            operation (str): Name used in log messages.
+            call (callable): Creates a fresh awaitable for every attempt.
+            idempotent (bool): Whether the call may be repeated after an ambiguous network error.
+                               Writes are only retried when the server reports it did not apply them.
+
+        Returns:
+            The result of the call. Permanent errors (e.g. DuplicateKeyError) are re-raised unchanged.
+
+        Raises:
+            DatabaseUnavailableError: If the breaker is open, or the error is infrastructural
+                                      and retries are exhausted or not allowed.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = await call()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == ErrorKind.PERMANENT:
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                if not self.retry_policy.should_retry(kind, idempotent, attempt):
+                    logger.error(f"Database unavailable during {operation} ({kind.value}, attempt {attempt}): {e}")
+                    raise DatabaseUnavailableError(f"{operation} failed: {e}") from e
+                delay = self.retry_policy.backoff(attempt)
+                logger.warning(f"Retrying {operation} in {delay * 1000:.0f} ms after {kind.value} error: {e}")
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _stream_error(self, operation: str, error: Exception):
+        """Raises DatabaseUnavailableError for infrastructural errors that interrupt a cursor; permanent errors are only logged."""
+        if classify_error(error) == ErrorKind.PERMANENT:
+            logger.error(f"Error during {operation}: {error}")
+            return
+        self.breaker.record_failure()
+        logger.error(f"Database unavailable during {operation}: {error}")
+        raise DatabaseUnavailableError(f"{operation} failed: {error}") from error
+
+    async def attempt(self, operation: Awaitable[T]) -> DbResult[T]:
+        """
+        Awaits any DatabaseManager call and returns a typed result instead of raising when the
+        database is unavailable.
+
+        Example:
+            result = await db.attempt(db.find_one(TEAMS_COLLECTION, query))
+            if result.unavailable: ...  # unknown, do not treat as "not found"
+            elif result.empty: ...      # definitely no match
+
+        Returns:
+            DbResult: OK with the value, EMPTY for None/empty containers, or UNAVAILABLE with the error.
+        """
+        try:
+            return DbResult.of(await operation)
+        except DatabaseUnavailableError as e:
+            return DbResult(DbStatus.UNAVAILABLE, error=e)
+
+    def get_health(self) -> Dict[str, Any]:
+        """Returns the circuit breaker state and failure counters."""
+        return self.breaker.snapshot()
+
+    async def find_one(self, collection_name: str, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
         """
         Finds a single document in a collection.
 
         Args:
             collection_name (str): The name of the collection to search.
             query (dict): The filter query to find the document.
+            projection (dict, optional): Fields to include/exclude.
 
         Returns:
             Optional[dict]: The found document, or None if not found.
         """
         try:
             collection = self.db[collection_name]
-            return await collection.find_one(query)
-        except ServerSelectionTimeoutError:
-            logger.error("Database connection error. Could not execute find_one.")
-            return None
+            return await self._execute("find_one", lambda: collection.find_one(query, projection))
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred during find_one: {e}")
             return None
@@ -59,11 +460,10 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            cursor = collection.find(query)
-            return await cursor.to_list(length=None)  # length=None to get all documents
-        except ServerSelectionTimeoutError:
-            logger.error("Database connection error. Could not execute find_many.")
-            return []
+            # length=None to get all documents
+            return await self._execute("find_many", lambda: collection.find(query).to_list(length=None))
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred during find_many: {e}")
             return []
@@ -81,14 +481,13 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.insert_one(document)
+            result = await self._execute("insert_one", lambda: collection.insert_one(document), idempotent=False)
             return str(result.inserted_id)
         except DuplicateKeyError:
             logger.warning(f"Attempted to insert a document with a duplicate key in '{collection_name}'.")
             return None
-        except ServerSelectionTimeoutError:
-            logger.error("Database connection error. Could not execute insert_one.")
-            return None
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred during insert_one: {e}")
             return None
@@ -106,8 +505,10 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.insert_many(documents)
+            result = await self._execute("insert_many", lambda: collection.insert_many(documents), idempotent=False)
             return [str(doc_id) for doc_id in result.inserted_ids]
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during insert_many: {e}")
             return []
@@ -129,23 +530,22 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.update_one(query, update_data, upsert=upsert)
+            result = await self._execute("update_one", lambda: collection.update_one(query, update_data, upsert=upsert), idempotent=False)
             return result.modified_count > 0 or result.upserted_id is not None
-        except ServerSelectionTimeoutError:
-            logger.error("Database connection error. Could not execute update_one.")
-            return False
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred during update_one: {e}")
             return False
 
-    async def update_many(self, collection_name: str, query: Dict[str, Any], update_data: Dict[str, Any], upsert: bool = False) -> int:
+    async def update_many(self, collection_name: str, query: Dict[str, Any], update_data: Union[Dict[str, Any], List[Dict[str, Any]]], upsert: bool = False) -> int:
         """
         Updates multiple documents in a collection.
 
         Args:
             collection_name (str): The name of the collection.
             query (dict): The filter to match documents.
-            update_data (dict): Update operators (e.g., {"$set": {...}}).
+            update_data (dict | list): Update operators (e.g., {"$set": {...}}) or an update pipeline.
             upsert (bool): If True, insert a new document if no match is found.
 
         Returns:
@@ -153,12 +553,40 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.update_many(query, update_data, upsert=upsert)
+            result = await self._execute("update_many", lambda: collection.update_many(query, update_data, upsert=upsert), idempotent=False)
             return result.modified_count
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during update_many: {e}")
             return 0
 
+    async def find_one_and_update(self, collection_name: str, query: Dict[str, Any], update_data: Dict[str, Any], upsert: bool = False, projection: Optional[Dict[str, int]] = None, sort: Optional[List[tuple]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically updates a single document and returns it as it is after the update.
+
+        Args:
+            collection_name (str): The name of the collection.
+            query (dict): The filter to find the document.
+            update_data (dict): The update operations to apply.
+            upsert (bool): If True, creates the document if it doesn't exist.
+            projection (dict, optional): Fields to include/exclude in the returned document.
+            sort (list, optional): Which document to update when several match, e.g. [("created_at", 1)].
+
+        Returns:
+            Optional[dict]: The updated document, or None if no document matched (or on error).
+        """
+        try:
+            collection = self.db[collection_name]
+            return await self._execute("find_one_and_update", lambda: collection.find_one_and_update(
+                query, update_data, projection=projection, sort=sort, upsert=upsert, return_document=ReturnDocument.AFTER
+            ), idempotent=False)
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"Error during find_one_and_update: {e}")
+            return None
+
     async def delete_one(self, collection_name: str, query: Dict[str, Any]) -> bool:
         """
         Deletes a single document from a collection.
@@ -172,11 +600,10 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.delete_one(query)
+            result = await self._execute("delete_one", lambda: collection.delete_one(query), idempotent=False)
             return result.deleted_count > 0
-        except ServerSelectionTimeoutError:
-            logger.error("Database connection error. Could not execute delete_one.")
-            return False
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred during delete_one: {e}")
             return False
@@ -194,8 +621,10 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.delete_many(query)
+            result = await self._execute("delete_many", lambda: collection.delete_many(query), idempotent=False)
             return result.deleted_count
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during delete_many: {e}")
             return 0
@@ -214,7 +643,7 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.update_one(query, {'$set': document}, upsert=True)
+            result = await self._execute("upsert", lambda: collection.update_one(query, {'$set': document}, upsert=True))
             if result.upserted_id:
                 return str(result.upserted_id)
             # If an existing document was updated, we need to find it to return its ID.
@@ -222,9 +651,8 @@ class DatabaseManager:
                 updated_doc = await self.find_one(collection_name, query)
                 return str(updated_doc['_id']) if updated_doc else None
             return None
-        except ServerSelectionTimeoutError:
-            logger.error("Database connection error. Could not execute upsert.")
-            return None
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred during upsert: {e}")
             return None
@@ -244,13 +672,15 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.replace_one(query, new_document, upsert=upsert)
+            result = await self._execute("replace_one", lambda: collection.replace_one(query, new_document, upsert=upsert))
             return result.modified_count > 0 or result.upserted_id is not None
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during replace_one: {e}")
             return False
 
-    async def find_with_projection(self, collection_name: str, query: Dict[str, Any], projection: Dict[str, int], sort: Optional[List[tuple]] = None) -> List[Dict[str, Any]]:
+    async def find_with_projection(self, collection_name: str, query: Dict[str, Any], projection: Dict[str, int], sort: Optional[List[tuple]] = None, limit: int = 0, skip: int = 0) -> List[Dict[str, Any]]:
         """
         Finds documents with projection (select fields) and optional sorting.
 
@@ -259,6 +689,8 @@ class DatabaseManager:
             query (dict): The filter to apply.
             projection (dict): Fields to include/exclude, e.g. {"field": 1, "other": 0}.
             sort (list): Optional sort spec, e.g. [("field", 1)] for ascending.
+            limit (int): Maximum number of documents to return (0 for no limit).
+            skip (int): Number of documents to skip, for paging.
 
         Returns:
             list: Matching documents.
@@ -268,16 +700,111 @@ class DatabaseManager:
             cursor = collection.find(query, projection)
             if sort:
                 cursor = cursor.sort(sort)
-            return await cursor.to_list(length=None)
+            if skip:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
+            return await self._execute("find_with_projection", lambda: cursor.clone().to_list(length=None))
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during find_with_projection: {e}")
             return []
 
+    async def find_iter(
+        self,
+        collection_name: str,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, int]] = None,
+        sort: Optional[List[tuple]] = None,
+        batch_size: int = DB_CURSOR_BATCH_SIZE,
+        max_time_ms: Optional[int] = None,
+        no_cursor_timeout: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams matching documents, holding at most one batch in memory.
+
+        Args:
+            collection_name (str): The name of the collection.
+            query (dict): The filter to apply.
+            projection (dict, optional): Fields to include/exclude.
+            sort (list, optional): Sort spec, e.g. [("field", 1)].
+            batch_size (int): Documents fetched per round trip.
+            max_time_ms (int, optional): Server-side time limit for the query.
+            no_cursor_timeout (bool): Keep the cursor alive on the server while the caller is slow.
+                                      The cursor is always closed when iteration ends or is abandoned.
+
+        Yields:
+            dict: Matching documents. Query errors are logged and end the iteration.
+
+        Raises:
+            DatabaseUnavailableError: If the database is unavailable, so a cut-short stream is never
+                                      mistaken for a complete one. Streams are not retried.
+        """
+        cursor = None
+        self.breaker.before_call()
+        try:
+            collection = self.db[collection_name]
+            cursor = collection.find(query, projection, batch_size=batch_size, no_cursor_timeout=no_cursor_timeout)
+            if sort:
+                cursor = cursor.sort(sort)
+            if max_time_ms:
+                cursor = cursor.max_time_ms(max_time_ms)
+            async for doc in cursor:
+                yield doc
+            self.breaker.record_success()
+        except Exception as e:
+            self._stream_error("find_iter", e)
+        finally:
+            if cursor is not None:
+                await cursor.close()
+
+    async def aggregate_iter(
+        self,
+        collection_name: str,
+        pipeline: List[Dict[str, Any]],
+        batch_size: int = DB_CURSOR_BATCH_SIZE,
+        max_time_ms: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams the results of an aggregation pipeline, holding at most one batch in memory.
+
+        Args:
+            collection_name (str): The name of the collection.
+            pipeline (list): The aggregation pipeline.
+            batch_size (int): Documents fetched per round trip.
+            max_time_ms (int, optional): Server-side time limit for the aggregation.
+
+        Yields:
+            dict: Pipeline output documents. Query errors are logged and end the iteration.
+
+        Raises:
+            DatabaseUnavailableError: If the database is unavailable. Streams are not retried.
+        """
+        cursor = None
+        self.breaker.before_call()
+        try:
+            collection = self.db[collection_name]
+            options = {"batchSize": batch_size}
+            if max_time_ms:
+                options["maxTimeMS"] = max_time_ms
+            cursor = collection.aggregate(pipeline, **options)
+            async for doc in cursor:
+                yield doc
+            self.breaker.record_success()
+        except Exception as e:
+            self._stream_error("aggregate_iter", e)
+        finally:
+            if cursor is not None:
+                await cursor.close()
+
     async def count_documents(self, collection_name: str, query: Dict[str, Any]) -> int:
         """Returns the number of documents matching a query."""
         try:
             collection = self.db[collection_name]
-            return await collection.count_documents(query)
+            return await self._execute("count_documents", lambda: collection.count_documents(query))
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during count_documents: {e}")
             return 0
@@ -286,8 +813,10 @@ class DatabaseManager:
         """Checks if at least one document exists for a query."""
         try:
             collection = self.db[collection_name]
-            doc = await collection.find_one(query, {"_id": 1})
+            doc = await self._execute("document_exists", lambda: collection.find_one(query, {"_id": 1}))
             return doc is not None
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during document_exists: {e}")
             return False
@@ -296,8 +825,9 @@ class DatabaseManager:
         """Runs an aggregation pipeline."""
         try:
             collection = self.db[collection_name]
-            cursor = collection.aggregate(pipeline)
-            return await cursor.to_list(length=None)
+            return await self._execute("aggregate", lambda: collection.aggregate(pipeline).to_list(length=None))
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during aggregate: {e}")
             return []
@@ -306,7 +836,9 @@ class DatabaseManager:
         """Gets distinct values for a field in documents matching query."""
         try:
             collection = self.db[collection_name]
-            return await collection.distinct(field, query or {})
+            return await self._execute("distinct", lambda: collection.distinct(field, query or {}))
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during distinct: {e}")
             return []
@@ -324,17 +856,51 @@ class DatabaseManager:
         """
         try:
             collection = self.db[collection_name]
-            result = await collection.bulk_write(operations)
+            result = await self._execute("bulk_write", lambda: collection.bulk_write(operations), idempotent=False)
             return result.acknowledged
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during bulk_write: {e}")
             return False
 
+    async def bulk_write_result(self, collection_name: str, operations: List[Any], ordered: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Executes bulk write operations and returns the server's per-operation outcome.
+
+        Args:
+            collection_name (str): The name of the collection.
+            operations (list): pymongo write operations (InsertOne, UpdateOne, DeleteOne, ...).
+            ordered (bool): Stop at the first error instead of attempting every operation.
+
+        Returns:
+            Optional[dict]: The raw bulk result (nInserted, nMatched, nModified, nRemoved, nUpserted,
+                            upserted and writeErrors, indexed by position in `operations`),
+                            or None if the bulk write could not be executed at all.
+        """
+        try:
+            collection = self.db[collection_name]
+            result = await self._execute("bulk_write_result", lambda: collection.bulk_write(operations, ordered=ordered), idempotent=False)
+            return result.bulk_api_result
+        except BulkWriteError as e:
+            return e.details
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"Error during bulk_write_result: {e}")
+            return None
+
+    def batch(self, ordered: bool = False) -> WriteBatch:
+        """Starts a WriteBatch that coalesces writes and flushes them with bulk_write_result."""
+        return WriteBatch(self, ordered)
+
     async def drop_collection(self, collection_name: str) -> bool:
         """Drops an entire collection."""
         try:
-            await self.db.drop_collection(collection_name)
+            await self._execute("drop_collection", lambda: self.db.drop_collection(collection_name))
             return True
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during drop_collection: {e}")
             return False
@@ -342,12 +908,14 @@ class DatabaseManager:
     async def list_collections(self) -> List[str]:
         """Lists all collection names in the database."""
         try:
-            return await self.db.list_collection_names()
+            return await self._execute("list_collections", self.db.list_collection_names)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during list_collections: {e}")
             return []
 
-    async def create_index(self, collection_name: str, keys: List[tuple], unique: bool = False) -> Optional[str]:
+    async def create_index(self, collection_name: str, keys: List[tuple], unique: bool = False, name: Optional[str] = None, expire_after_seconds: Optional[int] = None) -> Optional[str]:
         """
         Creates an index on the given fields.
 
@@ -355,32 +923,252 @@ class DatabaseManager:
             collection_name (str): The name of the collection.
             keys (list): A list of (field, direction) pairs, e.g. [("username", 1)].
             unique (bool): Whether the index should enforce uniqueness.
+            name (str, optional): Explicit index name. Defaults to the driver-generated name.
+            expire_after_seconds (int, optional): Creates a TTL index that deletes documents this many seconds after the indexed date.
 
         Returns:
             str: The name of the created index.
         """
         try:
             collection = self.db[collection_name]
-            return await collection.create_index(keys, unique=unique)
+            options = {"unique": unique}
+            if name:
+                options["name"] = name
+            if expire_after_seconds is not None:
+                options["expireAfterSeconds"] = expire_after_seconds
+            return await self._execute("create_index", lambda: collection.create_index(keys, **options))
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error during create_index: {e}")
             return None
 
-    async def watch(self, collection_name: Optional[str] = None, pipeline: Optional[List[Dict[str, Any]]] = None):
+    async def drop_index(self, collection_name: str, name: str) -> bool:
+        """Drops an index by name."""
+        try:
+            collection = self.db[collection_name]
+            await self._execute("drop_index", lambda: collection.drop_index(name))
+            return True
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"Error during drop_index: {e}")
+            return False
+
+    async def index_information(self, collection_name: str) -> Dict[str, Any]:
+        """Returns the existing indexes of a collection keyed by index name."""
+        try:
+            collection = self.db[collection_name]
+            return await self._execute("index_information", collection.index_information)
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"Error during index_information: {e}")
+            return {}
+
+    # ========== INDEX REGISTRY ==========
+
+    def register_indexes(self, indexes: Dict[str, List[IndexSpec]]):
+        """
+        Registers the indexes a service requires. Called from service constructors;
+        the indexes are created later by `ensure_indexes` during startup.
+
+        Args:
+            indexes (dict): Maps a collection name to the IndexSpecs it needs.
+        """
+        for collection_name, specs in indexes.items():
+            registered = self._index_registry.setdefault(collection_name, {})
+            for spec in specs:
+                existing = registered.get(spec.name)
+                if existing and existing != spec:
+                    logger.warning(f"Conflicting declarations for index '{spec.name}' on '{collection_name}'. Keeping the first one.")
+                    continue
+                registered[spec.name] = spec
+
+    def retire_indexes(self, indexes: Dict[str, List[str]]):
+        """
+        Registers indexes that a schema change made obsolete. `ensure_indexes` drops them
+        (by name) before creating the registered ones, so they cannot block the new layout.
+
+        Args:
+            indexes (dict): Maps a collection name to the names of its retired indexes.
+        """
+        for collection_name, names in indexes.items():
+            self._retired_indexes.setdefault(collection_name, set()).update(names)
+
+    async def ensure_indexes(self) -> Dict[str, Dict[str, List[str]]]:
+        """
+        Idempotently creates every registered index and reports drift between the
+        registry and what exists in the database. Drifted indexes are never dropped
+        automatically, since rebuilding an index on a live collection is an operator decision;
+        only indexes explicitly retired with `retire_indexes` are dropped.
+
+        Returns:
+            dict: Per collection, the index names that were "dropped" (retired), "created",
+                  already "ok", have "drift" (same name or keys but a different definition),
+                  "failed", or exist in the database but are "unmanaged" by the registry.
+        """
+        report = {}
+        for collection_name in list(self._retired_indexes) + [c for c in self._index_registry if c not in self._retired_indexes]:
+            specs = self._index_registry.get(collection_name, {})
+            existing = await self.index_information(collection_name)
+            result = {"dropped": [], "created": [], "ok": [], "drift": [], "failed": [], "unmanaged": []}
+
+            for name in self._retired_indexes.get(collection_name, ()):
+                if name in existing and name not in specs:
+                    if await self.drop_index(collection_name, name):
+                        result["dropped"].append(name)
+                        del existing[name]
+                    else:
+                        result["failed"].append(name)
+
+            for spec in specs.values():
+                info = existing.get(spec.name)
+                if info is not None:
+                    (result["ok"] if spec.matches(info) else result["drift"]).append(spec.name)
+                    continue
+
+                # The same keys may already be indexed under a different (e.g. auto-generated) name.
+                same_keys = [n for n, i in existing.items() if _index_keys(i) == tuple(spec.keys)]
+                if same_keys:
+                    result["drift"].append(f"{spec.name} (exists as {same_keys[0]})")
+                    continue
+
+                created = await self.create_index(collection_name, list(spec.keys), unique=spec.unique, name=spec.name, expire_after_seconds=spec.expire_after_seconds)
+                result["created" if created else "failed"].append(spec.name)
+
+            managed_keys = {tuple(spec.keys) for spec in specs.values()}
+            for name, info in existing.items():
+                if name == "_id_" or name in specs:
+                    continue
+                if _index_keys(info) not in managed_keys:
+                    result["unmanaged"].append(name)
+
+            if result["dropped"]:
+                logger.info(f"Dropped retired indexes on '{collection_name}': {', '.join(result['dropped'])}")
+            if result["created"]:
+                logger.info(f"Created indexes on '{collection_name}': {', '.join(result['created'])}")
+            if result["drift"]:
+                logger.warning(f"Index drift on '{collection_name}': {', '.join(result['drift'])}")
+            if result["failed"]:
+                logger.error(f"Failed to create indexes on '{collection_name}': {', '.join(result['failed'])}")
+            if result["unmanaged"]:
+                logger.info(f"Unmanaged indexes on '{collection_name}': {', '.join(result['unmanaged'])}")
+            report[collection_name] = result
+        return report
+
+    # ========== ONE-SHOT MIGRATIONS ==========
+
+    def register_migration(self, name: str, migration: Callable[[], Awaitable[Any]]):
+        """
+        Registers a one-shot data migration. Migrations run once per database, in
+        registration order, the next time `run_migrations` is called.
+
+        Args:
+            name (str): Unique, stable name recorded once the migration succeeds.
+            migration (callable): Coroutine function performing the migration. It must be
+                                  idempotent, since a crash before it is recorded re-runs it.
+        """
+        self._migrations.setdefault(name, migration)
+
+    async def run_migrations(self) -> List[str]:
+        """
+        Runs every registered migration that has not been recorded as applied. Stops at the first
+        failure, since later migrations may depend on the data it fixes.
+
+        Returns:
+            list: The names of the migrations applied during this call.
+
+        Raises:
+            MigrationError: If a migration failed. The migrations before it stay recorded as applied.
+        """
+        applied = set(await self.distinct(MIGRATIONS_COLLECTION, "_id"))
+        newly_applied = []
+        for name, migration in self._migrations.items():
+            if name in applied:
+                continue
+            try:
+                result = await migration()
+            except Exception as e:
+                logger.error(f"Migration '{name}' failed: {e}", exc_info=True)
+                raise MigrationError(f"Migration '{name}' failed: {e}") from e
+            await self.insert_one(MIGRATIONS_COLLECTION, {"_id": name, "applied_at": datetime.utcnow(), "result": result})
+            logger.info(f"Applied migration '{name}': {result}")
+            newly_applied.append(name)
+        return newly_applied
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Returns live connection pool statistics.
+
+        Returns:
+            dict: Open and checked-out connections, connection churn, checkout failures and
+                  checkout wait times (ms), with a per-server breakdown under "servers".
+        """
+        return self.pool_stats.snapshot()
+
+    def get_latency_report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns latency statistics per operation.
+
+        Returns:
+            dict: Keyed "<collection>.<command>", each with count, errors, avg/p50/p95/p99/max (ms)
+                  and total time, ordered by total time spent.
+        """
+        return self.command_stats.latency_report()
+
+    def get_slow_queries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Returns the most recent slow queries (filter shapes only, no values), newest first."""
+        return self.command_stats.slow_queries(limit)
+
+    def enable_explain_sampling(self):
+        """Lets the command listener run `explain` on sampled slow reads. Must be called from the bot's event loop."""
+        if self.command_stats.explain_sample_rate > 0:
+            self.command_stats.enable_explain(asyncio.get_running_loop(), self._explain)
+
+    async def _explain(self, collection_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.db.command({"explain": command, "verbosity": "queryPlanner"})
+
+    async def watch(
+        self,
+        collection_name: Optional[str] = None,
+        pipeline: Optional[List[Dict[str, Any]]] = None,
+        on_open: Optional[Callable[[], None]] = None,
+        full_document: Optional[str] = None,
+        resume_after: Optional[Dict[str, Any]] = None
+    ):
         """
         Watches a collection (or the whole DB if collection_name is None) for real-time changes.
 
         Args:
             collection_name (str, optional): The collection to watch. If None, watch the entire DB.
             pipeline (list, optional): Aggregation pipeline to filter changes.
+            on_open (callable, optional): Called once the change stream has been opened successfully.
+            full_document (str, optional): E.g. "updateLookup" to include the current document in update events.
+            resume_after (dict, optional): Resume token (an event's `_id`) to continue after.
 
         Yields:
             dict: Change stream events.
+
+        Raises:
+            ChangeStreamResumeError: If `resume_after` was given and the server can no longer resume from it.
+                                     Any other error is logged and ends the stream.
         """
+        options = {}
+        if full_document:
+            options["full_document"] = full_document
+        if resume_after:
+            options["resume_after"] = resume_after
         try:
             target = self.db[collection_name] if collection_name else self.db
-            async with target.watch(pipeline or []) as stream:
+            async with target.watch(pipeline or [], **options) as stream:
+                if on_open:
+                    on_open()
                 async for change in stream:
                     yield change
+        except OperationFailure as e:
+            if resume_after and e.code in _RESUME_FAILED_CODES:
+                raise ChangeStreamResumeError(f"Cannot resume change stream: {e}") from e
+            logger.error(f"Error during watch: {e}")
         except Exception as e:
             logger.error(f"Error during watch: {e}")
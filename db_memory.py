@@ -0,0 +1,1551 @@
+import asyncio
+import copy
+import functools
+import itertools
+import logging
+import random
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import bson
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ExecutionTimeout, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from database import DatabaseManager, MongoClientOptions
+
+logger = logging.getLogger(__name__)
+
+# Sentinel for a path that does not exist in a document (distinct from an explicit null).
+_MISSING = object()
+
+# Documents returned in the first batch of a cursor when no batch size is given (server default).
+_DEFAULT_FIRST_BATCH = 101
+
+# Change events retained for resume tokens.
+_CHANGE_LOG_SIZE = 10000
+
+# ========== VALUES, PATHS AND ORDERING ==========
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _type_rank(value: Any) -> int:
+    """BSON comparison order of the types the in-memory backend stores."""
+    if value is None or value is _MISSING:
+        return 1
+    if _is_number(value):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+def _compare(a: Any, b: Any) -> int:
+    """Three-way comparison following MongoDB's cross-type ordering."""
+    rank_a, rank_b = _type_rank(a), _type_rank(b)
+    if rank_a != rank_b:
+        return -1 if rank_a < rank_b else 1
+    if rank_a == 1:
+        return 0
+    if isinstance(a, dict):
+        a, b = list(a.items()), list(b.items())
+    if isinstance(a, list):
+        for item_a, item_b in zip(a, b):
+            if isinstance(item_a, tuple):
+                result = _compare(item_a[0], item_b[0]) or _compare(item_a[1], item_b[1])
+            else:
+                result = _compare(item_a, item_b)
+            if result:
+                return result
+        return (len(a) > len(b)) - (len(a) < len(b))
+    if rank_a == 10:
+        a, b = repr(a), repr(b)
+    return (a > b) - (a < b)
+
+def _equal(a: Any, b: Any) -> bool:
+    if type(a) is type(b) and type(a) in (str, int, float, ObjectId):
+        return a == b
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    return _type_rank(a) == _type_rank(b) and _compare(a, b) == 0
+
+def _hashable(value: Any) -> Any:
+    """A hashable key for grouping, distinct values and unique indexes."""
+    if isinstance(value, dict):
+        return ("d", tuple((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("l", tuple(_hashable(v) for v in value))
+    if isinstance(value, bool):
+        return ("b", value)
+    if value is _MISSING:
+        return None
+    try:
+        hash(value)
+    except TypeError:
+        return ("r", repr(value))
+    return value
+
+def _truthy(value: Any) -> bool:
+    """Aggregation truthiness: false, null, missing and 0 are false; everything else is true."""
+    if value is _MISSING or value is None or value is False:
+        return False
+    if _is_number(value):
+        return value != 0
+    return True
+
+def _resolve(value: Any, parts: List[str]) -> Any:
+    """Resolves a dotted path for expressions. Arrays along the path are mapped over, as in MongoDB."""
+    for index, part in enumerate(parts):
+        if isinstance(value, dict):
+            if part not in value:
+                return _MISSING
+            value = value[part]
+        elif isinstance(value, list):
+            if part.isdigit():
+                position = int(part)
+                if position >= len(value):
+                    return _MISSING
+                value = value[position]
+                continue
+            rest = parts[index:]
+            return [r for r in (_resolve(item, rest) for item in value if isinstance(item, dict)) if r is not _MISSING]
+        else:
+            return _MISSING
+    return value
+
+def _candidates(value: Any, parts: List[str]) -> List[Any]:
+    """Every value a query path can match, expanding arrays the way MongoDB does. Empty if the path is missing."""
+    if not parts:
+        return [value] + value if isinstance(value, list) else [value]
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        return _candidates(value[head], rest) if head in value else []
+    if isinstance(value, list):
+        found = []
+        if head.isdigit() and int(head) < len(value):
+            found.extend(_candidates(value[int(head)], rest))
+        for item in value:
+            if isinstance(item, dict):
+                found.extend(_candidates(item, parts))
+        return found
+    return []
+
+def _get(doc: Dict[str, Any], path: str) -> Any:
+    """Strict path lookup used by updates (numeric parts index arrays, nothing is mapped)."""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+def _parent(doc: Dict[str, Any], path: str, create: bool) -> Tuple[Any, str]:
+    parts = path.split(".")
+    current = doc
+    for part in parts[:-1]:
+        if isinstance(current, list) and part.isdigit():
+            position = int(part)
+            if position >= len(current):
+                if not create:
+                    return None, parts[-1]
+                current.extend([None] * (position + 1 - len(current)))
+            if current[position] is None and create:
+                current[position] = {}
+            current = current[position]
+        elif isinstance(current, dict):
+            if part not in current:
+                if not create:
+                    return None, parts[-1]
+                current[part] = {}
+            current = current[part]
+        elif create:
+            raise OperationFailure(f"Cannot create field '{part}' in element {{{part}: {current!r}}}", code=28)
+        else:
+            return None, parts[-1]
+    return current, parts[-1]
+
+def _set(doc: Dict[str, Any], path: str, value: Any):
+    parent, key = _parent(doc, path, create=True)
+    if isinstance(parent, list):
+        if not key.isdigit():
+            raise OperationFailure(f"Cannot create field '{key}' in an array", code=28)
+        position = int(key)
+        parent.extend([None] * (position + 1 - len(parent)))
+        parent[position] = value
+    elif isinstance(parent, dict):
+        parent[key] = value
+    else:
+        raise OperationFailure(f"Cannot create field '{key}' in element {parent!r}", code=28)
+
+def _unset(doc: Dict[str, Any], path: str):
+    parent, key = _parent(doc, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(key, None)
+    elif isinstance(parent, list) and key.isdigit() and int(key) < len(parent):
+        parent[int(key)] = None
+
+def _sort_documents(docs: List[Dict[str, Any]], sort: Iterable[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    sort = list(sort)
+
+    def compare(a, b):
+        for path, direction in sort:
+            value_a, value_b = _resolve(a, path.split(".")), _resolve(b, path.split("."))
+            result = _compare(value_a, value_b)
+            if result:
+                return result if direction >= 0 else -result
+        return 0
+
+    return sorted(docs, key=functools.cmp_to_key(compare))
+
+def _normalize_sort(key_or_list: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [tuple(item) for item in key_or_list]
+
+# ========== QUERIES ==========
+
+def _is_operator_dict(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(key.startswith("$") for key in value)
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Evaluates a MongoDB query filter against a document."""
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$expr":
+            if not _truthy(evaluate(condition, doc)):
+                return False
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}", code=2)
+        elif not _match_field(_candidates(doc, key.split(".")), condition):
+            return False
+    return True
+
+def _match_field(values: List[Any], condition: Any) -> bool:
+    if _is_operator_dict(condition):
+        options = condition.get("$options", "")
+        return all(_match_operator(values, operator, argument, options) for operator, argument in condition.items() if operator != "$options")
+    return _match_equal(values, condition)
+
+def _match_equal(values: List[Any], target: Any) -> bool:
+    if target is None:
+        return not values or any(value is None for value in values)
+    if isinstance(target, re.Pattern):
+        return any(isinstance(value, str) and target.search(value) for value in values)
+    return any(_equal(value, target) for value in values)
+
+def _comparable(a: Any, b: Any) -> bool:
+    return _type_rank(a) == _type_rank(b) and a is not None
+
+def _match_operator(values: List[Any], operator: str, argument: Any, options: str = "") -> bool:
+    if operator == "$eq":
+        return _match_equal(values, argument)
+    if operator == "$ne":
+        return not _match_equal(values, argument)
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        check = {"$gt": lambda r: r > 0, "$gte": lambda r: r >= 0, "$lt": lambda r: r < 0, "$lte": lambda r: r <= 0}[operator]
+        return any(_comparable(value, argument) and check(_compare(value, argument)) for value in values)
+    if operator == "$in":
+        return any(_match_equal(values, target) for target in argument)
+    if operator == "$nin":
+        return not any(_match_equal(values, target) for target in argument)
+    if operator == "$exists":
+        return bool(values) == bool(argument)
+    if operator == "$size":
+        return any(isinstance(value, list) and len(value) == argument for value in values)
+    if operator == "$all":
+        return bool(argument) and all(_match_equal(values, target) for target in argument)
+    if operator == "$elemMatch":
+        for value in values:
+            if not isinstance(value, list):
+                continue
+            for element in value:
+                if _is_operator_dict(argument):
+                    if _match_field(_candidates(element, []), argument):
+                        return True
+                elif isinstance(element, dict) and matches(element, argument):
+                    return True
+        return False
+    if operator == "$not":
+        return not _match_field(values, argument)
+    if operator == "$regex":
+        flags = re.IGNORECASE if "i" in options else 0
+        flags |= re.MULTILINE if "m" in options else 0
+        pattern = argument if isinstance(argument, re.Pattern) else re.compile(argument, flags)
+        return any(isinstance(value, str) and pattern.search(value) for value in values)
+    raise OperationFailure(f"unknown operator: {operator}", code=2)
+
+# ========== EXPRESSIONS ==========
+
+def evaluate(expression: Any, doc: Dict[str, Any], variables: Optional[Dict[str, Any]] = None) -> Any:
+    """Evaluates an aggregation expression against a document. Returns _MISSING for missing fields."""
+    variables = variables or {}
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, _, path = expression[2:].partition(".")
+        if name in ("ROOT", "CURRENT"):
+            base = doc
+        elif name in variables:
+            base = variables[name]
+        else:
+            raise OperationFailure(f"Use of undefined variable: {name}", code=17276)
+        return _resolve(base, path.split(".")) if path else base
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _resolve(doc, expression[1:].split("."))
+    if isinstance(expression, list):
+        return [_null(evaluate(item, doc, variables)) for item in expression]
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith("$"):
+            operator, argument = next(iter(expression.items()))
+            handler = _EXPRESSION_OPERATORS.get(operator)
+            if handler is None:
+                raise OperationFailure(f"Unrecognized expression '{operator}'", code=168)
+            return handler(argument, doc, variables)
+        result = {}
+        for key, value in expression.items():
+            evaluated = evaluate(value, doc, variables)
+            if evaluated is not _MISSING:
+                result[key] = evaluated
+        return result
+    return expression
+
+def _null(value: Any) -> Any:
+    return None if value is _MISSING else value
+
+def _args(argument: Any, doc: Dict[str, Any], variables: Dict[str, Any]) -> List[Any]:
+    if not isinstance(argument, list):
+        argument = [argument]
+    return [_null(evaluate(item, doc, variables)) for item in argument]
+
+def _expr_if_null(argument, doc, variables):
+    for item in argument:
+        value = evaluate(item, doc, variables)
+        if value is not _MISSING and value is not None:
+            return value
+    return None
+
+def _expr_size(argument, doc, variables):
+    value = _args(argument, doc, variables)[0]
+    if not isinstance(value, list):
+        raise OperationFailure("The argument to $size must be an array", code=17124)
+    return len(value)
+
+def _expr_object_to_array(argument, doc, variables):
+    value = _args(argument, doc, variables)[0]
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        raise OperationFailure("$objectToArray requires a document input", code=40390)
+    return [{"k": key, "v": item} for key, item in value.items()]
+
+def _expr_array_to_object(argument, doc, variables):
+    value = _args(argument, doc, variables)[0]
+    if value is None:
+        return None
+    result = {}
+    for item in value:
+        if isinstance(item, dict):
+            result[item["k"]] = item["v"]
+        else:
+            result[item[0]] = item[1]
+    return result
+
+def _expr_filter(argument, doc, variables):
+    items = _null(evaluate(argument["input"], doc, variables))
+    if items is None:
+        return None
+    name = argument.get("as", "this")
+    return [item for item in items if _truthy(evaluate(argument["cond"], doc, {**variables, name: item}))]
+
+def _expr_map(argument, doc, variables):
+    items = _null(evaluate(argument["input"], doc, variables))
+    if items is None:
+        return None
+    name = argument.get("as", "this")
+    return [_null(evaluate(argument["in"], doc, {**variables, name: item})) for item in items]
+
+def _expr_comparison(check: Callable[[int], bool]):
+    def handler(argument, doc, variables):
+        a, b = _args(argument, doc, variables)
+        return check(_compare(a, b))
+    return handler
+
+def _expr_cond(argument, doc, variables):
+    if isinstance(argument, dict):
+        condition, then, otherwise = argument["if"], argument["then"], argument["else"]
+    else:
+        condition, then, otherwise = argument
+    return evaluate(then if _truthy(evaluate(condition, doc, variables)) else otherwise, doc, variables)
+
+def _expr_numbers(argument, doc, variables) -> List[Any]:
+    values = _args(argument, doc, variables)
+    if len(values) == 1 and isinstance(values[0], list):
+        values = values[0]
+    return [value for value in values if _is_number(value)]
+
+def _expr_min_max(pick: Callable):
+    def handler(argument, doc, variables):
+        values = _args(argument, doc, variables)
+        if len(values) == 1 and isinstance(values[0], list):
+            values = values[0]
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        return functools.reduce(lambda a, b: pick(a, b), values)
+    return handler
+
+def _expr_subtract(argument, doc, variables):
+    a, b = _args(argument, doc, variables)
+    return None if a is None or b is None else a - b
+
+def _expr_multiply(argument, doc, variables):
+    values = _args(argument, doc, variables)
+    return None if any(value is None for value in values) else functools.reduce(lambda a, b: a * b, values, 1)
+
+def _expr_concat(argument, doc, variables):
+    values = _args(argument, doc, variables)
+    return None if any(value is None for value in values) else "".join(values)
+
+_EXPRESSION_OPERATORS: Dict[str, Callable[[Any, Dict[str, Any], Dict[str, Any]], Any]] = {
+    "$literal": lambda argument, doc, variables: argument,
+    "$ifNull": _expr_if_null,
+    "$size": _expr_size,
+    "$objectToArray": _expr_object_to_array,
+    "$arrayToObject": _expr_array_to_object,
+    "$filter": _expr_filter,
+    "$map": _expr_map,
+    "$eq": _expr_comparison(lambda r: r == 0),
+    "$ne": _expr_comparison(lambda r: r != 0),
+    "$gt": _expr_comparison(lambda r: r > 0),
+    "$gte": _expr_comparison(lambda r: r >= 0),
+    "$lt": _expr_comparison(lambda r: r < 0),
+    "$lte": _expr_comparison(lambda r: r <= 0),
+    "$and": lambda argument, doc, variables: all(_truthy(evaluate(item, doc, variables)) for item in argument),
+    "$or": lambda argument, doc, variables: any(_truthy(evaluate(item, doc, variables)) for item in argument),
+    "$not": lambda argument, doc, variables: not _truthy(evaluate(argument[0] if isinstance(argument, list) else argument, doc, variables)),
+    "$cond": _expr_cond,
+    "$in": lambda argument, doc, variables: any(_equal(item, _args(argument, doc, variables)[0]) for item in _args(argument, doc, variables)[1]),
+    "$add": lambda argument, doc, variables: sum(_expr_numbers(argument, doc, variables)),
+    "$sum": lambda argument, doc, variables: sum(_expr_numbers(argument, doc, variables)),
+    "$subtract": _expr_subtract,
+    "$multiply": _expr_multiply,
+    "$max": _expr_min_max(lambda a, b: a if _compare(a, b) >= 0 else b),
+    "$min": _expr_min_max(lambda a, b: a if _compare(a, b) <= 0 else b),
+    "$concat": _expr_concat,
+}
+
+# ========== PROJECTIONS ==========
+
+def _is_inclusion(value: Any) -> bool:
+    return value is True or (_is_number(value) and value != 0)
+
+def _copy_path(source: Any, target: Dict[str, Any], parts: List[str]):
+    head, rest = parts[0], parts[1:]
+    if not isinstance(source, dict) or head not in source:
+        return
+    value = source[head]
+    if not rest:
+        target[head] = copy.deepcopy(value)
+    elif isinstance(value, dict):
+        sub = target.setdefault(head, {})
+        if isinstance(sub, dict):
+            _copy_path(value, sub, rest)
+    elif isinstance(value, list):
+        projected = []
+        for item in value:
+            if isinstance(item, dict):
+                sub = {}
+                _copy_path(item, sub, rest)
+                projected.append(sub)
+        target[head] = projected
+
+def project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Applies a find projection or a $project stage to a document, returning a copy."""
+    if not projection:
+        return copy.deepcopy(doc)
+    include_id = projection.get("_id", 1)
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    excluding = all(value is False or (_is_number(value) and value == 0) for value in fields.values())
+
+    if excluding:
+        result = copy.deepcopy(doc)
+        for path in fields:
+            _unset(result, path)
+        if not _is_inclusion(include_id) and not isinstance(include_id, (str, dict)):
+            result.pop("_id", None)
+        elif isinstance(include_id, (str, dict)):
+            result["_id"] = _null(evaluate(include_id, doc))
+        return result
+
+    result = {}
+    if _is_inclusion(include_id) and "_id" in doc:
+        result["_id"] = copy.deepcopy(doc["_id"])
+    elif isinstance(include_id, (str, dict)):
+        result["_id"] = _null(evaluate(include_id, doc))
+    for path, value in fields.items():
+        if _is_inclusion(value):
+            _copy_path(doc, result, path.split("."))
+        elif value is False or (_is_number(value) and value == 0):
+            raise OperationFailure(f"Cannot do exclusion on field {path} in inclusion projection", code=31254)
+        else:
+            computed = evaluate(value, doc)
+            if computed is not _MISSING:
+                _set(result, path, computed)
+    return result
+
+# ========== AGGREGATION ==========
+
+def _stage_add_fields(docs, spec):
+    results = []
+    for doc in docs:
+        new = copy.deepcopy(doc)
+        for path, expression in spec.items():
+            value = evaluate(expression, doc)
+            if value is _MISSING:
+                _unset(new, path)
+            else:
+                _set(new, path, value)
+        results.append(new)
+    return results
+
+def _stage_unset(docs, spec):
+    paths = [spec] if isinstance(spec, str) else spec
+    results = []
+    for doc in docs:
+        new = copy.deepcopy(doc)
+        for path in paths:
+            _unset(new, path)
+        results.append(new)
+    return results
+
+def _stage_unwind(docs, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"].lstrip("$")
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    index_field = spec.get("includeArrayIndex")
+    results = []
+    for doc in docs:
+        value = _get(doc, path)
+        if isinstance(value, list) and value:
+            for position, item in enumerate(value):
+                new = copy.deepcopy(doc)
+                _set(new, path, copy.deepcopy(item))
+                if index_field:
+                    new[index_field] = position
+                results.append(new)
+        elif value is _MISSING or value is None or isinstance(value, list):
+            if preserve:
+                new = copy.deepcopy(doc)
+                if isinstance(value, list):
+                    _unset(new, path)
+                if index_field:
+                    new[index_field] = None
+                results.append(new)
+        else:
+            new = copy.deepcopy(doc)
+            if index_field:
+                new[index_field] = None
+            results.append(new)
+    return results
+
+def _stage_group(docs, spec):
+    groups: Dict[Any, Dict[str, Any]] = {}
+    accumulated: Dict[Any, Dict[str, List[Any]]] = {}
+    for doc in docs:
+        key = _null(evaluate(spec["_id"], doc))
+        hashed = _hashable(key)
+        if hashed not in groups:
+            groups[hashed] = {"_id": key}
+            accumulated[hashed] = {name: [] for name in spec if name != "_id"}
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            (operator, expression), = accumulator.items()
+            accumulated[hashed][name].append(1 if operator == "$count" else evaluate(expression, doc))
+
+    results = []
+    for hashed, group in groups.items():
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            operator = next(iter(accumulator))
+            values = accumulated[hashed][name]
+            present = [value for value in values if value is not _MISSING and value is not None]
+            numbers = [value for value in present if _is_number(value)]
+            if operator in ("$sum", "$count"):
+                group[name] = sum(numbers)
+            elif operator == "$avg":
+                group[name] = sum(numbers) / len(numbers) if numbers else None
+            elif operator == "$min":
+                group[name] = min(present, key=functools.cmp_to_key(_compare)) if present else None
+            elif operator == "$max":
+                group[name] = max(present, key=functools.cmp_to_key(_compare)) if present else None
+            elif operator == "$first":
+                group[name] = _null(values[0]) if values else None
+            elif operator == "$last":
+                group[name] = _null(values[-1]) if values else None
+            elif operator == "$push":
+                group[name] = [value for value in values if value is not _MISSING]
+            elif operator == "$addToSet":
+                unique = {}
+                for value in values:
+                    if value is not _MISSING:
+                        unique.setdefault(_hashable(value), value)
+                group[name] = list(unique.values())
+            else:
+                raise OperationFailure(f"unknown group operator '{operator}'", code=15952)
+        results.append(group)
+    return results
+
+def _stage_replace_root(docs, spec):
+    expression = spec["newRoot"] if isinstance(spec, dict) and "newRoot" in spec else spec
+    results = []
+    for doc in docs:
+        value = evaluate(expression, doc)
+        if not isinstance(value, dict):
+            raise OperationFailure("'newRoot' expression must evaluate to an object", code=40228)
+        results.append(value)
+    return results
+
+_PIPELINE_STAGES: Dict[str, Callable[[List[Dict[str, Any]], Any], List[Dict[str, Any]]]] = {
+    "$match": lambda docs, spec: [doc for doc in docs if matches(doc, spec)],
+    "$project": lambda docs, spec: [project(doc, spec) for doc in docs],
+    "$addFields": _stage_add_fields,
+    "$set": _stage_add_fields,
+    "$unset": _stage_unset,
+    "$unwind": _stage_unwind,
+    "$sort": lambda docs, spec: _sort_documents(docs, spec.items()),
+    "$skip": lambda docs, spec: docs[spec:],
+    "$limit": lambda docs, spec: docs[:spec],
+    "$count": lambda docs, spec: [{spec: len(docs)}] if docs else [],
+    "$group": _stage_group,
+    "$replaceRoot": _stage_replace_root,
+    "$replaceWith": _stage_replace_root,
+}
+
+# Stages allowed in an update pipeline.
+_UPDATE_PIPELINE_STAGES = {"$addFields", "$set", "$unset", "$project", "$replaceRoot", "$replaceWith"}
+
+def run_pipeline(docs: Iterable[Dict[str, Any]], pipeline: List[Dict[str, Any]], allowed: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    """Runs the supported subset of aggregation stages over the given documents, returning copies."""
+    results = list(docs)
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        handler = _PIPELINE_STAGES.get(name)
+        if handler is None or (allowed is not None and name not in allowed):
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", code=40324)
+        results = handler(results, spec)
+    return copy.deepcopy(results)
+
+# ========== UPDATES ==========
+
+def _update_inc(doc, path, amount):
+    current = _get(doc, path)
+    if current is _MISSING:
+        _set(doc, path, amount)
+    elif _is_number(current):
+        _set(doc, path, current + amount)
+    else:
+        raise OperationFailure("Cannot apply $inc to a value of non-numeric type", code=14)
+
+def _update_mul(doc, path, factor):
+    current = _get(doc, path)
+    if current is _MISSING:
+        _set(doc, path, 0)
+    elif _is_number(current):
+        _set(doc, path, current * factor)
+    else:
+        raise OperationFailure("Cannot apply $mul to a value of non-numeric type", code=14)
+
+def _update_bound(keep_new: Callable[[int], bool]):
+    def handler(doc, path, value):
+        current = _get(doc, path)
+        if current is _MISSING or keep_new(_compare(value, current)):
+            _set(doc, path, copy.deepcopy(value))
+    return handler
+
+def _array_at(doc, path, operator) -> List[Any]:
+    current = _get(doc, path)
+    if current is _MISSING:
+        current = []
+        _set(doc, path, current)
+    elif not isinstance(current, list):
+        raise OperationFailure(f"The field '{path}' must be an array for {operator}", code=2)
+    return current
+
+def _update_push(doc, path, value):
+    array = _array_at(doc, path, "$push")
+    if isinstance(value, dict) and "$each" in value:
+        array.extend(copy.deepcopy(value["$each"]))
+        if "$slice" in value:
+            limit = value["$slice"]
+            array[:] = array[limit:] if limit < 0 else array[:limit]
+    else:
+        array.append(copy.deepcopy(value))
+
+def _update_add_to_set(doc, path, value):
+    array = _array_at(doc, path, "$addToSet")
+    items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+    for item in items:
+        if not any(_equal(existing, item) for existing in array):
+            array.append(copy.deepcopy(item))
+
+def _pull_matches(element: Any, condition: Any) -> bool:
+    if _is_operator_dict(condition):
+        return _match_field(_candidates(element, []), condition)
+    if isinstance(condition, dict) and isinstance(element, dict):
+        return matches(element, condition)
+    return _equal(element, condition)
+
+def _update_pull(doc, path, condition):
+    current = _get(doc, path)
+    if isinstance(current, list):
+        current[:] = [element for element in current if not _pull_matches(element, condition)]
+
+def _update_pull_all(doc, path, values):
+    current = _get(doc, path)
+    if isinstance(current, list):
+        current[:] = [element for element in current if not any(_equal(element, value) for value in values)]
+
+def _update_rename(doc, path, new_path):
+    value = _get(doc, path)
+    if value is not _MISSING:
+        _unset(doc, path)
+        _set(doc, new_path, value)
+
+_UPDATE_OPERATORS: Dict[str, Callable[[Dict[str, Any], str, Any], None]] = {
+    "$set": lambda doc, path, value: _set(doc, path, copy.deepcopy(value)),
+    "$setOnInsert": lambda doc, path, value: _set(doc, path, copy.deepcopy(value)),
+    "$unset": lambda doc, path, value: _unset(doc, path),
+    "$inc": _update_inc,
+    "$mul": _update_mul,
+    "$max": _update_bound(lambda r: r > 0),
+    "$min": _update_bound(lambda r: r < 0),
+    "$push": _update_push,
+    "$addToSet": _update_add_to_set,
+    "$pull": _update_pull,
+    "$pullAll": _update_pull_all,
+    "$rename": _update_rename,
+    "$currentDate": lambda doc, path, value: _set(doc, path, datetime.utcnow()),
+}
+
+def apply_update(doc: Dict[str, Any], update: Union[Dict[str, Any], List[Dict[str, Any]]], inserting: bool = False) -> Dict[str, Any]:
+    """Returns a copy of `doc` with an update document or update pipeline applied."""
+    if isinstance(update, list):
+        updated = run_pipeline([doc], update, allowed=_UPDATE_PIPELINE_STAGES)[0]
+    else:
+        updated = copy.deepcopy(doc)
+        for operator, fields in update.items():
+            handler = _UPDATE_OPERATORS.get(operator)
+            if handler is None:
+                raise OperationFailure(f"Unknown modifier: {operator}", code=9)
+            if operator == "$setOnInsert" and not inserting:
+                continue
+            for path, value in fields.items():
+                handler(updated, path, value)
+    if "_id" in doc and not _equal(updated.get("_id", _MISSING), doc["_id"]):
+        raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'", code=66)
+    return updated
+
+def _upsert_seed(query: Dict[str, Any]) -> Dict[str, Any]:
+    """The document an upsert starts from: the equality conditions of its filter."""
+    seed = {}
+    for key, condition in query.items():
+        if key == "$and":
+            for sub in condition:
+                for path, value in _flatten(_upsert_seed(sub)):
+                    _set(seed, path, value)
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_dict(condition):
+            if "$eq" in condition:
+                _set(seed, key, copy.deepcopy(condition["$eq"]))
+        else:
+            _set(seed, key, copy.deepcopy(condition))
+    return seed
+
+def _flatten(doc: Dict[str, Any], prefix: str = "") -> List[Tuple[str, Any]]:
+    return [(f"{prefix}{key}", value) for key, value in doc.items()]
+
+def _validate_update(update: Any):
+    if isinstance(update, list):
+        return
+    if not isinstance(update, dict) or not update or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+
+def _validate_replacement(replacement: Any):
+    if isinstance(replacement, dict) and any(key.startswith("$") for key in replacement):
+        raise ValueError("replacement can not include $ operators")
+
+# ========== LATENCY AND FAULT INJECTION ==========
+
+@dataclass
+class LatencyProfile:
+    """
+    Simulated server round-trip time, in milliseconds.
+
+    `per_command_ms` is keyed by command name ("find", "getMore", "update", "insert", "delete",
+    "findAndModify", "aggregate", ...) or by "<collection>.<command>" for a single collection.
+    Every round trip sleeps for the matching latency plus uniform jitter of +/- `jitter_ms`.
+    """
+    default_ms: float = 0.0
+    per_command_ms: Dict[str, float] = field(default_factory=dict)
+    jitter_ms: float = 0.0
+
+    def sample(self, collection: str, command: str, rng: random.Random) -> float:
+        """Returns the latency of one round trip, in seconds."""
+        base = self.per_command_ms.get(f"{collection}.{command}", self.per_command_ms.get(command, self.default_ms))
+        if self.jitter_ms:
+            base += rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(base, 0.0) / 1000
+
+@dataclass
+class _FaultRule:
+    error: Any
+    command: Optional[str]
+    collection: Optional[str]
+    remaining: Optional[int]
+    rate: float
+    after_apply: bool
+
+class FaultInjector:
+    """Makes matching round trips raise an error, to exercise retries and the circuit breaker."""
+
+    def __init__(self, rng: random.Random):
+        self._rng = rng
+        self._rules: List[_FaultRule] = []
+
+    def add(self, error: Any, command: Optional[str] = None, collection: Optional[str] = None,
+            times: Optional[int] = 1, rate: float = 1.0, after_apply: bool = False):
+        """
+        Args:
+            error: Exception instance, class or factory to raise, e.g. AutoReconnect("connection reset").
+            command (str, optional): Only fail this command ("find", "update", ...). Defaults to every command.
+            collection (str, optional): Only fail round trips on this collection.
+            times (int, optional): Number of failures before the rule is used up. None never runs out.
+            rate (float): Probability that a matching round trip fails.
+            after_apply (bool): Raise after the operation was applied (a lost reply) instead of before.
+        """
+        self._rules.append(_FaultRule(error, command, collection, times, rate, after_apply))
+
+    def clear(self):
+        self._rules.clear()
+
+    def check(self, collection: str, command: str, after_apply: bool):
+        for rule in self._rules:
+            if rule.after_apply != after_apply or rule.remaining == 0:
+                continue
+            if rule.command not in (None, command) or rule.collection not in (None, collection):
+                continue
+            if self._rng.random() >= rule.rate:
+                continue
+            if rule.remaining is not None:
+                rule.remaining -= 1
+            error = rule.error
+            raise error if isinstance(error, BaseException) else error()
+
+# ========== CURSORS AND CHANGE STREAMS ==========
+
+class _MemoryCommandCursor:
+    """Cursor over a command's results, fetched in batches with one simulated round trip each."""
+
+    def __init__(self, collection: "_MemoryCollection", command: str, compute: Callable[[], List[Dict[str, Any]]],
+                 command_doc: Dict[str, Any], batch_size: int = 0, max_time_ms: Optional[int] = None):
+        self._collection = collection
+        self._command = command
+        self._compute = compute
+        self._command_doc = command_doc
+        self._batch_size = batch_size
+        self._max_time_ms = max_time_ms
+        self._buffer: deque = deque()
+        self._pending: List[Dict[str, Any]] = []
+        self._started = False
+        self._closed = False
+
+    def batch_size(self, batch_size: int):
+        self._batch_size = batch_size
+        return self
+
+    def max_time_ms(self, max_time_ms: Optional[int]):
+        self._max_time_ms = max_time_ms
+        return self
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed and (not self._started or bool(self._buffer or self._pending))
+
+    async def _refill(self):
+        database = self._collection.database
+        if not self._started:
+            self._started = True
+            async with database.round_trip(self._collection.name, self._command, self._command_doc, self._max_time_ms):
+                results = self._compute()
+                first = self._batch_size or _DEFAULT_FIRST_BATCH
+                self._buffer.extend(database._transfer(results[:first]))
+                self._pending = results[first:]
+        elif self._pending:
+            get_more = {"getMore": 0, "collection": self._collection.name, "batchSize": self._batch_size}
+            async with database.round_trip(self._collection.name, "getMore", get_more, self._max_time_ms):
+                size = self._batch_size or len(self._pending)
+                self._buffer.extend(database._transfer(self._pending[:size]))
+                self._pending = self._pending[size:]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if self._closed:
+            raise StopAsyncIteration
+        if not self._buffer and (not self._started or self._pending):
+            await self._refill()
+        if self._buffer:
+            return self._buffer.popleft()
+        raise StopAsyncIteration
+
+    async def next(self) -> Dict[str, Any]:
+        return await self.__anext__()
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = []
+        async for doc in self:
+            results.append(doc)
+            if length and len(results) >= length:
+                break
+        return results
+
+    async def close(self):
+        self._closed = True
+        self._buffer.clear()
+        self._pending = []
+
+class _MemoryCursor(_MemoryCommandCursor):
+    """Find cursor supporting the chained modifiers DatabaseManager uses."""
+
+    def __init__(self, collection: "_MemoryCollection", filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None,
+                 batch_size: int = 0, no_cursor_timeout: bool = False, sort: Any = None, skip: int = 0, limit: int = 0, **kwargs):
+        super().__init__(collection, "find", self._results, {}, batch_size)
+        self._filter = filter or {}
+        self._projection = projection
+        self._no_cursor_timeout = no_cursor_timeout
+        self._sort = _normalize_sort(sort)
+        self._skip = skip
+        self._limit = limit
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int):
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    def clone(self) -> "_MemoryCursor":
+        return _MemoryCursor(self._collection, self._filter, self._projection, self._batch_size, self._no_cursor_timeout,
+                             self._sort, self._skip, self._limit).max_time_ms(self._max_time_ms)
+
+    async def _refill(self):
+        if not self._started:
+            self._command_doc = {"find": self._collection.name, "filter": self._filter, "sort": dict(self._sort),
+                                 "projection": self._projection, "skip": self._skip, "limit": self._limit}
+        await super()._refill()
+
+    def _results(self) -> List[Dict[str, Any]]:
+        return self._collection._select(self._filter, self._projection, self._sort, self._skip, self._limit)
+
+class _MemoryChangeStream:
+    """Change stream over the in-memory change log, resumable with the `_id` token of any retained event."""
+
+    def __init__(self, database: "_MemoryDatabase", collection_name: Optional[str], pipeline: Optional[List[Dict[str, Any]]] = None,
+                 full_document: Optional[str] = None, resume_after: Optional[Dict[str, Any]] = None,
+                 start_after: Optional[Dict[str, Any]] = None, **kwargs):
+        self._database = database
+        self._collection_name = collection_name
+        self._pipeline = pipeline or []
+        self._full_document = full_document
+        self._resume_from = resume_after or start_after
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+        self.resume_token: Optional[Dict[str, Any]] = None
+
+    async def _open(self):
+        command_doc = {"aggregate": self._collection_name or 1, "pipeline": [{"$changeStream": {}}] + self._pipeline}
+        async with self._database.round_trip(self._collection_name or self._database.name, "aggregate", command_doc):
+            self._database._streams.add(self)
+            if self._resume_from is not None:
+                for event in self._database._replay(self._resume_from):
+                    self._offer(event)
+
+    async def __aenter__(self):
+        await self._open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if not self._database._streams.__contains__(self) and not self._closed:
+            await self._open()
+        event = await self._queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        self.resume_token = event["_id"]
+        return event
+
+    async def next(self) -> Dict[str, Any]:
+        return await self.__anext__()
+
+    async def try_next(self) -> Optional[Dict[str, Any]]:
+        if self._queue.empty():
+            return None
+        return await self.__anext__()
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            self._database._streams.discard(self)
+            self._queue.put_nowait(None)
+
+    def _offer(self, event: Dict[str, Any]):
+        if self._collection_name and event["ns"].get("coll") != self._collection_name:
+            return
+        event = copy.deepcopy(event)
+        if event["operationType"] == "update" and self._full_document not in ("updateLookup", "whenAvailable", "required"):
+            event.pop("fullDocument", None)
+        for result in run_pipeline([event], self._pipeline):
+            self._queue.put_nowait(result)
+
+# ========== COLLECTIONS ==========
+
+def _id_key(value: Any) -> Any:
+    return _hashable(value)
+
+def _normalize(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Stores a copy of the document as MongoDB would: BSON-encodable, with tuples as arrays and datetimes at millisecond precision."""
+    return bson.decode(bson.encode(document))
+
+class _MemoryCollection:
+    """A collection held in memory, exposing the subset of the motor collection API DatabaseManager uses."""
+
+    def __init__(self, database: "_MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        self._indexes: Dict[str, Dict[str, Any]] = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        self._unique: Dict[str, Dict[Any, Any]] = {}
+
+    # ---- internals (synchronous, so every operation applies atomically) ----
+
+    def _index_value(self, doc: Dict[str, Any], keys: List[Tuple[str, Any]]) -> Any:
+        return tuple(_hashable(_null(_resolve(doc, path.split(".")))) for path, _ in keys)
+
+    def _check_unique(self, doc: Dict[str, Any], own_key: Any = _MISSING):
+        for name, entries in self._unique.items():
+            value = self._index_value(doc, self._indexes[name]["key"])
+            holder = entries.get(value, _MISSING)
+            if holder is not _MISSING and holder != own_key:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: {name} dup key: {value}",
+                    11000, {"index": name, "keyValue": value}
+                )
+
+    def _index(self, doc: Dict[str, Any], key: Any):
+        for name, entries in self._unique.items():
+            entries[self._index_value(doc, self._indexes[name]["key"])] = key
+
+    def _unindex(self, doc: Dict[str, Any]):
+        for name, entries in self._unique.items():
+            entries.pop(self._index_value(doc, self._indexes[name]["key"]), None)
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        if not isinstance(document, dict):
+            raise TypeError("document must be an instance of dict")
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        key = _id_key(document["_id"])
+        if key in self._docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: _id_ dup key: {document['_id']!r}",
+                11000, {"index": "_id_"}
+            )
+        self._check_unique(document)
+        stored = _normalize(document)
+        self._docs[key] = stored
+        self._index(stored, key)
+        self.database._mark_created(self.name)
+        self.database._publish(self.name, "insert", stored)
+        return document["_id"]
+
+    def _matching(self, query: Optional[Dict[str, Any]], sort: Any = None) -> List[Dict[str, Any]]:
+        docs = [doc for doc in self._docs.values() if matches(doc, query)]
+        sort = _normalize_sort(sort)
+        return _sort_documents(docs, sort) if sort else docs
+
+    def _select(self, query, projection, sort, skip, limit) -> List[Dict[str, Any]]:
+        docs = self._matching(query, sort)
+        limit = abs(limit or 0)
+        docs = docs[skip:skip + limit] if limit else docs[skip:]
+        return [project(doc, projection) for doc in docs]
+
+    def _replace_stored(self, old: Dict[str, Any], new: Dict[str, Any], operation: str):
+        key = _id_key(old["_id"])
+        self._check_unique(new, own_key=key)
+        self._unindex(old)
+        self._docs[key] = new
+        self._index(new, key)
+        self.database._publish(self.name, operation, new, previous=old)
+
+    def _update(self, query: Dict[str, Any], update: Any, multi: bool, upsert: bool, replacement: bool = False, sort: Any = None) -> Dict[str, Any]:
+        """Applies an update and returns the raw server reply ({n, nModified, upserted})."""
+        if replacement:
+            _validate_replacement(update)
+        else:
+            _validate_update(update)
+        targets = self._matching(query, sort)
+        if not multi:
+            targets = targets[:1]
+
+        if not targets:
+            if not upsert:
+                return {"n": 0, "nModified": 0, "ok": 1.0}
+            if replacement:
+                new = copy.deepcopy(update)
+                seed_id = _upsert_seed(query).get("_id", _MISSING)
+                if "_id" not in new and seed_id is not _MISSING:
+                    new["_id"] = seed_id
+            else:
+                new = apply_update(_upsert_seed(query), update, inserting=True)
+            upserted_id = self._insert(new)
+            return {"n": 1, "nModified": 0, "upserted": upserted_id, "ok": 1.0}
+
+        modified = 0
+        for doc in targets:
+            if replacement:
+                new = copy.deepcopy(update)
+                if "_id" in new and not _equal(new["_id"], doc["_id"]):
+                    raise OperationFailure("The _id field cannot be changed", code=66)
+                new = {"_id": doc["_id"], **{k: v for k, v in new.items() if k != "_id"}}
+            else:
+                new = apply_update(doc, update)
+            new = _normalize(new)
+            if _equal(new, doc):
+                continue
+            self._replace_stored(doc, new, "replace" if replacement else "update")
+            modified += 1
+        return {"n": len(targets), "nModified": modified, "ok": 1.0}
+
+    def _delete(self, query: Dict[str, Any], multi: bool) -> int:
+        targets = self._matching(query)
+        if not multi:
+            targets = targets[:1]
+        for doc in targets:
+            self._unindex(doc)
+            del self._docs[_id_key(doc["_id"])]
+            self.database._publish(self.name, "delete", doc)
+        return len(targets)
+
+    # ---- reads ----
+
+    async def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, *args, sort: Any = None, **kwargs) -> Optional[Dict[str, Any]]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        command_doc = {"find": self.name, "filter": filter or {}, "limit": 1, "singleBatch": True}
+        async with self.database.round_trip(self.name, "find", command_doc, kwargs.get("max_time_ms")):
+            results = self.database._transfer(self._select(filter, projection, sort, 0, 1))
+        return results[0] if results else None
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, *args, **kwargs) -> _MemoryCursor:
+        return _MemoryCursor(self, filter, projection, *args, **kwargs)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> _MemoryCommandCursor:
+        batch_size = kwargs.get("batchSize", kwargs.get("batch_size", 0))
+        command_doc = {"aggregate": self.name, "pipeline": pipeline, "cursor": {"batchSize": batch_size}}
+        return _MemoryCommandCursor(self, "aggregate", lambda: run_pipeline(self._docs.values(), pipeline),
+                                    command_doc, batch_size, kwargs.get("maxTimeMS"))
+
+    async def count_documents(self, filter: Dict[str, Any], **kwargs) -> int:
+        pipeline = [{"$match": filter}, {"$group": {"_id": 1, "n": {"$sum": 1}}}]
+        async with self.database.round_trip(self.name, "aggregate", {"aggregate": self.name, "pipeline": pipeline}, kwargs.get("maxTimeMS")):
+            count = len(self._matching(filter))
+        skip = kwargs.get("skip", 0)
+        limit = kwargs.get("limit", 0)
+        count = max(count - skip, 0)
+        return min(count, limit) if limit else count
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        async with self.database.round_trip(self.name, "count", {"count": self.name}):
+            return len(self._docs)
+
+    async def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None, **kwargs) -> List[Any]:
+        async with self.database.round_trip(self.name, "distinct", {"distinct": self.name, "key": key, "query": filter or {}}):
+            values = {}
+            for doc in self._matching(filter):
+                for value in _candidates(doc, key.split(".")):
+                    if not isinstance(value, list):
+                        values.setdefault(_hashable(value), copy.deepcopy(value))
+        return list(values.values())
+
+    # ---- writes ----
+
+    async def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        async with self.database.round_trip(self.name, "insert", {"insert": self.name, "documents": [document]}):
+            inserted_id = self._insert(document)
+        return InsertOneResult(inserted_id, True)
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True, **kwargs) -> InsertManyResult:
+        await self.bulk_write([InsertOne(doc) for doc in documents], ordered=ordered)
+        return InsertManyResult([doc["_id"] for doc in documents], True)
+
+    async def update_one(self, filter: Dict[str, Any], update: Any, upsert: bool = False, **kwargs) -> UpdateResult:
+        command_doc = {"update": self.name, "updates": [{"q": filter, "u": update, "upsert": upsert}]}
+        async with self.database.round_trip(self.name, "update", command_doc):
+            raw = self._update(filter, update, multi=False, upsert=upsert, sort=kwargs.get("sort"))
+        return UpdateResult(raw, True)
+
+    async def update_many(self, filter: Dict[str, Any], update: Any, upsert: bool = False, **kwargs) -> UpdateResult:
+        command_doc = {"update": self.name, "updates": [{"q": filter, "u": update, "upsert": upsert, "multi": True}]}
+        async with self.database.round_trip(self.name, "update", command_doc):
+            raw = self._update(filter, update, multi=True, upsert=upsert)
+        return UpdateResult(raw, True)
+
+    async def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        command_doc = {"update": self.name, "updates": [{"q": filter, "u": replacement, "upsert": upsert}]}
+        async with self.database.round_trip(self.name, "update", command_doc):
+            raw = self._update(filter, replacement, multi=False, upsert=upsert, replacement=True)
+        return UpdateResult(raw, True)
+
+    async def find_one_and_update(self, filter: Dict[str, Any], update: Any, projection: Optional[Dict[str, Any]] = None,
+                                  sort: Any = None, upsert: bool = False, return_document: bool = ReturnDocument.BEFORE, **kwargs) -> Optional[Dict[str, Any]]:
+        _validate_update(update)
+        command_doc = {"findAndModify": self.name, "query": filter, "update": update, "upsert": upsert}
+        async with self.database.round_trip(self.name, "findAndModify", command_doc):
+            targets = self._matching(filter, sort)[:1]
+            before = targets[0] if targets else None
+            raw = self._update(filter, update, multi=False, upsert=upsert, sort=sort)
+            if return_document == ReturnDocument.BEFORE:
+                result = before
+            else:
+                key = _id_key(raw["upserted"]) if "upserted" in raw else _id_key(before["_id"]) if before else None
+                result = self._docs.get(key) if key is not None else None
+            return self.database._transfer([project(result, projection)])[0] if result is not None else None
+
+    async def delete_one(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        async with self.database.round_trip(self.name, "delete", {"delete": self.name, "deletes": [{"q": filter, "limit": 1}]}):
+            deleted = self._delete(filter, multi=False)
+        return DeleteResult({"n": deleted, "ok": 1.0}, True)
+
+    async def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        async with self.database.round_trip(self.name, "delete", {"delete": self.name, "deletes": [{"q": filter, "limit": 0}]}):
+            deleted = self._delete(filter, multi=True)
+        return DeleteResult({"n": deleted, "ok": 1.0}, True)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        """
+        Executes write models with the same batching as pymongo: an ordered bulk write sends one
+        command per run of same-type operations, an unordered one sends one command per type.
+        """
+        kinds = {InsertOne: "insert", UpdateOne: "update", UpdateMany: "update", ReplaceOne: "update", DeleteOne: "delete", DeleteMany: "delete"}
+        indexed = []
+        for position, request in enumerate(requests):
+            kind = kinds.get(type(request))
+            if kind is None:
+                raise TypeError(f"{request!r} is not a valid request")
+            indexed.append((position, kind, request))
+
+        if ordered:
+            commands = [(kind, list(group)) for kind, group in itertools.groupby(indexed, key=lambda item: item[1])]
+        else:
+            commands = [(kind, [item for item in indexed if item[1] == kind]) for kind in ("insert", "update", "delete")]
+            commands = [command for command in commands if command[1]]
+
+        result = {"writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+                  "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        for kind, items in commands:
+            statements = [{"q": getattr(request, "_filter", {})} for _, _, request in items]
+            command_doc = {kind: self.name, f"{kind}s" if kind != "insert" else "documents": statements}
+            async with self.database.round_trip(self.name, kind, command_doc):
+                for position, _, request in items:
+                    try:
+                        self._apply_write_model(request, position, result)
+                    except (DuplicateKeyError, OperationFailure) as e:
+                        result["writeErrors"].append({"index": position, "code": e.code, "errmsg": str(e), "op": request._doc if hasattr(request, "_doc") else request._filter})
+                        if ordered:
+                            break
+            if ordered and result["writeErrors"]:
+                break
+
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def _apply_write_model(self, request: Any, position: int, result: Dict[str, Any]):
+        if isinstance(request, InsertOne):
+            self._insert(request._doc)
+            result["nInserted"] += 1
+            return
+        if isinstance(request, (DeleteOne, DeleteMany)):
+            result["nRemoved"] += self._delete(request._filter, multi=isinstance(request, DeleteMany))
+            return
+        raw = self._update(request._filter, request._doc, multi=isinstance(request, UpdateMany),
+                           upsert=bool(request._upsert), replacement=isinstance(request, ReplaceOne))
+        if "upserted" in raw:
+            result["nUpserted"] += 1
+            result["upserted"].append({"index": position, "_id": raw["upserted"]})
+        else:
+            result["nMatched"] += raw["n"]
+            result["nModified"] += raw["nModified"]
+
+    # ---- indexes ----
+
+    async def create_index(self, keys: Any, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        keys = _normalize_sort(keys, 1)
+        name = name or "_".join(f"{path}_{direction}" for path, direction in keys)
+        async with self.database.round_trip(self.name, "createIndexes", {"createIndexes": self.name, "indexes": [{"name": name}]}):
+            existing = self._indexes.get(name)
+            if existing is not None:
+                if existing["key"] != keys or bool(existing.get("unique")) != unique or existing.get("expireAfterSeconds") != kwargs.get("expireAfterSeconds"):
+                    raise OperationFailure(f"An existing index has the same name as the requested index: {name}", code=86)
+                return name
+            if unique:
+                entries = {}
+                for key, doc in self._docs.items():
+                    value = self._index_value(doc, keys)
+                    if value in entries:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: {name} dup key: {value}", 11000)
+                    entries[value] = key
+                self._unique[name] = entries
+            self._indexes[name] = {"key": keys, "v": 2, **({"unique": True} if unique else {})}
+            if kwargs.get("expireAfterSeconds") is not None:
+                # Recorded for index_information(); like the TTL monitor's delay, readers must not rely on prompt expiry
+                self._indexes[name]["expireAfterSeconds"] = kwargs["expireAfterSeconds"]
+            self.database._mark_created(self.name)
+        return name
+
+    async def drop_index(self, index_or_name: Any, **kwargs):
+        name = index_or_name if isinstance(index_or_name, str) else "_".join(f"{p}_{d}" for p, d in _normalize_sort(index_or_name, 1))
+        async with self.database.round_trip(self.name, "dropIndexes", {"dropIndexes": self.name, "index": name}):
+            if name == "_id_":
+                raise OperationFailure("cannot drop _id index", code=72)
+            if name not in self._indexes:
+                raise OperationFailure(f"index not found with name [{name}]", code=27)
+            del self._indexes[name]
+            self._unique.pop(name, None)
+
+    async def index_information(self, **kwargs) -> Dict[str, Any]:
+        async with self.database.round_trip(self.name, "listIndexes", {"listIndexes": self.name}):
+            return copy.deepcopy(self._indexes)
+
+    def watch(self, pipeline: Optional[List[Dict[str, Any]]] = None, **kwargs) -> _MemoryChangeStream:
+        return _MemoryChangeStream(self.database, self.name, pipeline, **kwargs)
+
+class _MemoryDatabase:
+    """The database handle of InMemoryDatabaseManager, standing in for a motor database."""
+
+    def __init__(self, name: str, manager: "InMemoryDatabaseManager"):
+        self.name = name
+        self._manager = manager
+        self._collections: Dict[str, _MemoryCollection] = {}
+        self._created: Set[str] = set()
+        self._streams: Set[_MemoryChangeStream] = set()
+        self._changes: deque = deque(maxlen=_CHANGE_LOG_SIZE)
+        self._sequence = itertools.count(1)
+        self._request_ids = itertools.count(1)
+
+    def __getitem__(self, name: str) -> _MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = _MemoryCollection(self, name)
+        return collection
+
+    def _mark_created(self, name: str):
+        self._created.add(name)
+
+    def _transfer(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Encodes reply documents as the server would and decodes them as the driver does, so reads
+        pay a realistic client-side decoding cost. The decode time and reply size are recorded.
+        """
+        payload = [bson.encode(doc) for doc in documents]
+        start = time.perf_counter()
+        decoded = [bson.decode(raw) for raw in payload]
+        self._manager.decode_seconds += time.perf_counter() - start
+        self._manager.bytes_received += sum(len(raw) for raw in payload)
+        return decoded
+
+    @asynccontextmanager
+    async def round_trip(self, collection: str, command: str, command_doc: Dict[str, Any], max_time_ms: Optional[int] = None):
+        """
+        Simulates one server round trip: publishes command monitoring events (so the latency report
+        and slow query log work as with MongoDB), sleeps for the configured latency and raises any
+        injected fault. The body runs the operation itself, without awaiting, so it applies atomically.
+        """
+        manager = self._manager
+        event = SimpleNamespace(command_name=command, command={command: collection, **command_doc}, connection_id=("memory", 0),
+                                request_id=next(self._request_ids), duration_micros=0)
+        if command == "getMore":
+            event.command = command_doc
+        manager.command_stats.started(event)
+        start = time.perf_counter()
+        try:
+            delay = manager.latency.sample(collection, command, manager._rng)
+            if max_time_ms and delay * 1000 > max_time_ms:
+                await asyncio.sleep(max_time_ms / 1000)
+                raise ExecutionTimeout("operation exceeded time limit", code=50)
+            await asyncio.sleep(delay)
+            manager.faults.check(collection, command, after_apply=False)
+            yield
+            manager.faults.check(collection, command, after_apply=True)
+        except BaseException:
+            event.duration_micros = int((time.perf_counter() - start) * 1_000_000)
+            manager.command_stats.failed(event)
+            raise
+        event.duration_micros = int((time.perf_counter() - start) * 1_000_000)
+        manager.command_stats.succeeded(event)
+
+    def _publish(self, collection: str, operation: str, document: Dict[str, Any], previous: Optional[Dict[str, Any]] = None):
+        sequence = next(self._sequence)
+        event = {
+            "_id": {"_data": f"{sequence:016x}"},
+            "operationType": operation,
+            "wallTime": datetime.utcnow(),
+            "ns": {"db": self.name, "coll": collection},
+            "documentKey": {"_id": document["_id"]},
+        }
+        if operation != "delete":
+            event["fullDocument"] = copy.deepcopy(document)
+        if operation == "update":
+            event["updateDescription"] = {
+                "updatedFields": {k: copy.deepcopy(v) for k, v in document.items() if k not in previous or not _equal(previous[k], v)},
+                "removedFields": [k for k in previous if k not in document],
+            }
+        self._changes.append((sequence, event))
+        for stream in list(self._streams):
+            stream._offer(event)
+
+    def _replay(self, token: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            sequence = int(token["_data"], 16)
+        except (KeyError, TypeError, ValueError):
+            raise OperationFailure("Invalid resume token", code=280)
+        if self._changes and sequence < self._changes[0][0] - 1:
+            raise OperationFailure("Resume of change stream was not possible, as the resume point may no longer be in the oplog.", code=286)
+        return [event for position, event in self._changes if position > sequence]
+
+    async def drop_collection(self, name: str):
+        async with self.round_trip(name, "drop", {"drop": name}):
+            self._collections.pop(name, None)
+            self._created.discard(name)
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        async with self.round_trip(self.name, "listCollections", {"listCollections": 1}):
+            return sorted(self._created)
+
+    async def command(self, command: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        name = next(iter(command))
+        if name == "explain":
+            return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}, "ok": 1.0}
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"no such command: '{name}'", code=59)
+
+    def watch(self, pipeline: Optional[List[Dict[str, Any]]] = None, **kwargs) -> _MemoryChangeStream:
+        return _MemoryChangeStream(self, None, pipeline, **kwargs)
+
+# ========== MANAGER ==========
+
+class InMemoryDatabaseManager(DatabaseManager):
+    """
+    Drop-in DatabaseManager that keeps every collection in process, for benchmarks and load tests
+    without a live MongoDB.
+
+    Only the driver layer is replaced: every DatabaseManager method (including WriteBatch, the
+    index registry, migrations, retries and the circuit breaker) runs unchanged against it. Each
+    simulated server round trip sleeps for the configured latency, can fail through injected
+    faults, and is recorded by the command listener, so `get_latency_report()` shows how many
+    round trips and how much time each operation costs. Replies are BSON encoded and decoded,
+    and `decode_seconds`/`bytes_received` total the client-side decoding work and reply sizes.
+
+    Supports the query, update and aggregation operators the services use plus common ones
+    (comparisons, $in/$exists/$elemMatch, $set/$unset/$inc/$max/$addToSet/$pull/$push, update
+    pipelines, and $match/$project/$unwind/$group/$sort stages). Indexes enforce uniqueness but
+    do not speed up queries, which always scan the collection.
+    """
+
+    def __init__(self, db_name: str = "memory", latency: Optional[LatencyProfile] = None, seed: Optional[int] = None,
+                 options: Optional[MongoClientOptions] = None):
+        """
+        Args:
+            db_name (str): Name reported in change events and error messages.
+            latency (LatencyProfile, optional): Simulated round-trip latency. Defaults to none.
+            seed (int, optional): Seeds latency jitter and fault rates, for reproducible runs.
+            options (MongoClientOptions, optional): Accepted for signature compatibility; unused.
+        """
+        self.latency = latency or LatencyProfile()
+        self.decode_seconds = 0.0
+        self.bytes_received = 0
+        self._rng = random.Random(seed)
+        self.faults = FaultInjector(self._rng)
+        super().__init__(f"memory://{db_name}", db_name, options)
+
+    def _open_database(self, mongo_uri: str, db_name: str) -> _MemoryDatabase:
+        self.client = None
+        return _MemoryDatabase(db_name, self)
+
+    def inject_fault(self, error: Any, command: Optional[str] = None, collection: Optional[str] = None,
+                     times: Optional[int] = 1, rate: float = 1.0, after_apply: bool = False):
+        """Makes matching round trips fail. See FaultInjector.add for the arguments."""
+        self.faults.add(error, command, collection, times, rate, after_apply)
+
+    def clear_faults(self):
+        self.faults.clear()
+
+    def round_trips(self) -> Dict[str, int]:
+        """Returns the number of simulated round trips per "<collection>.<command>" since the last reset."""
+        return {operation: stats["count"] for operation, stats in self.get_latency_report().items()}
+
+    def reset_stats(self):
+        """Clears the latency report, slow query log and decode counters, e.g. between benchmark cases."""
+        self.command_stats.reset()
+        self.decode_seconds = 0.0
+        self.bytes_received = 0
@@ -0,0 +1,387 @@
+import asyncio
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Commands that are not tied to a collection (handshakes, auth, sessions) are not recorded.
+_IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "buildInfo", "saslStart", "saslContinue", "endSessions", "killCursors", "explain"}
+
+# Where each command keeps its filter, and which commands can be explained.
+_FILTER_FIELDS = {"find": "filter", "count": "query", "distinct": "query", "findAndModify": "query"}
+_EXPLAINABLE_FIELDS = {
+    "find": ("filter", "sort", "projection", "limit", "skip", "hint"),
+    "aggregate": ("pipeline", "cursor", "hint"),
+    "count": ("query", "limit", "skip", "hint"),
+    "distinct": ("key", "query"),
+}
+
+def filter_shape(value: Any) -> Any:
+    """
+    Replaces every literal value in a query with "?" while keeping field names and operators,
+    so slow queries can be grouped and logged without exposing user data.
+    """
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, dict) for item in value):
+            return [filter_shape(item) for item in value]
+        return "?"
+    return "?"
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Collects live connection pool statistics from pymongo's pool events.
+
+    pymongo publishes these events from its own threads, so every counter is guarded by a
+    lock. Statistics are kept per server address and summed by `snapshot()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[str, Dict[str, Any]] = {}
+
+    def _server(self, address) -> Dict[str, Any]:
+        key = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+        stats = self._servers.get(key)
+        if stats is None:
+            stats = self._servers[key] = {
+                "open_connections": 0,
+                "checked_out": 0,
+                "max_checked_out": 0,
+                "connections_created": 0,
+                "connections_closed": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "wait_time_total": 0.0,
+                "wait_time_max": 0.0,
+                "pool_clears": 0,
+            }
+        return stats
+
+    # ========== POOL EVENTS ==========
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)["pool_clears"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    # ========== CONNECTION EVENTS ==========
+
+    def connection_created(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats["connections_created"] += 1
+            stats["open_connections"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats["connections_closed"] += 1
+            stats["open_connections"] = max(0, stats["open_connections"] - 1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats["checkout_failures"] += 1
+            self._record_wait(stats, event.duration)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats["checkouts"] += 1
+            stats["checked_out"] += 1
+            stats["max_checked_out"] = max(stats["max_checked_out"], stats["checked_out"])
+            self._record_wait(stats, event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats["checked_out"] = max(0, stats["checked_out"] - 1)
+
+    @staticmethod
+    def _record_wait(stats: Dict[str, Any], duration: float):
+        # `duration` is the time (in seconds) spent waiting in the pool's checkout queue.
+        stats["wait_time_total"] += duration
+        stats["wait_time_max"] = max(stats["wait_time_max"], duration)
+
+    # ========== REPORTING ==========
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns a point-in-time copy of the pool statistics.
+
+        Returns:
+            dict: Totals across all servers (wait times in milliseconds) plus a per-server breakdown.
+        """
+        with self._lock:
+            servers = {address: dict(stats) for address, stats in self._servers.items()}
+
+        totals = {
+            key: sum(stats[key] for stats in servers.values())
+            for key in ("open_connections", "checked_out", "connections_created", "connections_closed", "checkouts", "checkout_failures", "pool_clears")
+        }
+        wait_total = sum(stats["wait_time_total"] for stats in servers.values())
+        attempts = totals["checkouts"] + totals["checkout_failures"]
+        totals["max_checked_out"] = max((stats["max_checked_out"] for stats in servers.values()), default=0)
+        totals["avg_wait_ms"] = wait_total / attempts * 1000 if attempts else 0.0
+        totals["max_wait_ms"] = max((stats["wait_time_max"] for stats in servers.values()), default=0.0) * 1000
+        totals["servers"] = servers
+        return totals
+
+    def reset(self):
+        """Resets cumulative counters while keeping the live gauges (open and checked-out connections)."""
+        with self._lock:
+            for stats in self._servers.values():
+                for key in ("max_checked_out", "connections_created", "connections_closed", "checkouts", "checkout_failures", "pool_clears"):
+                    stats[key] = stats["checked_out"] if key == "max_checked_out" else 0
+                stats["wait_time_total"] = 0.0
+                stats["wait_time_max"] = 0.0
+
+class _LatencyHistogram:
+    """Fixed-bucket latency histogram. Not thread-safe on its own; guarded by CommandListener."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, duration_ms: float, failed: bool):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        if failed:
+            self.errors += 1
+
+    def percentile(self, quantile: float) -> float:
+        """Returns the upper bound of the bucket holding the given quantile, capped at the observed max."""
+        if not self.count:
+            return 0.0
+        rank = quantile * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                bound = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+                return float(min(bound, self.max_ms))
+        return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "total_ms": self.total_ms,
+        }
+
+class CommandListener(monitoring.CommandListener):
+    """
+    Records per-(collection, command) latency histograms and a bounded slow-query log.
+
+    Commands are reported under their wire names (find, getMore, insert, update, delete,
+    aggregate, count, findAndModify, ...); DatabaseManager.bulk_write shows up as the
+    insert/update/delete commands it is split into. Slow reads can optionally be sampled for
+    an `explain`, which runs on the bot's event loop once `enable_explain` has been called.
+    """
+
+    def __init__(self, slow_query_ms: float = 100, slow_log_size: int = 100, explain_sample_rate: float = 0.0):
+        """
+        Args:
+            slow_query_ms (float): Commands at or above this duration go to the slow-query log.
+            slow_log_size (int): Number of slow queries kept in memory.
+            explain_sample_rate (float): Fraction (0-1) of slow reads to run `explain` on.
+        """
+        self.slow_query_ms = slow_query_ms
+        self.explain_sample_rate = explain_sample_rate
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], _LatencyHistogram] = {}
+        self._in_flight: Dict[Tuple[Any, int], Tuple[str, str, Dict[str, Any]]] = {}
+        self._slow_queries = deque(maxlen=slow_log_size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._explain: Optional[Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None
+
+    def enable_explain(self, loop: asyncio.AbstractEventLoop, explain: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        """
+        Enables explain sampling. Command events arrive on driver threads, so the explain
+        coroutine is scheduled onto `loop`.
+
+        Args:
+            loop: The event loop the bot runs on.
+            explain: Coroutine function taking (collection_name, explain_command) and returning the explain output.
+        """
+        self._loop = loop
+        self._explain = explain
+
+    # ========== COMMAND EVENTS ==========
+
+    def started(self, event):
+        command_name = event.command_name
+        if command_name in _IGNORED_COMMANDS:
+            return
+        target = event.command.get(command_name)
+        if command_name == "getMore":
+            target = event.command.get("collection")
+        if not isinstance(target, str):
+            return
+        with self._lock:
+            self._in_flight[(event.connection_id, event.request_id)] = (target, command_name, event.command)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        duration_ms = event.duration_micros / 1000
+        with self._lock:
+            started = self._in_flight.pop((event.connection_id, event.request_id), None)
+            if started is None:
+                return
+            collection, command_name, command = started
+            histogram = self._histograms.get((collection, command_name))
+            if histogram is None:
+                histogram = self._histograms[(collection, command_name)] = _LatencyHistogram()
+            histogram.record(duration_ms, failed)
+
+        if duration_ms >= self.slow_query_ms:
+            self._record_slow_query(collection, command_name, command, duration_ms, failed)
+
+    # ========== SLOW QUERIES ==========
+
+    def _record_slow_query(self, collection: str, command_name: str, command: Dict[str, Any], duration_ms: float, failed: bool):
+        entry = {
+            "timestamp": time.time(),
+            "collection": collection,
+            "command": command_name,
+            "duration_ms": duration_ms,
+            "failed": failed,
+            "filter_shape": filter_shape(self._extract_filter(command_name, command)),
+            "plan": None,
+        }
+        with self._lock:
+            self._slow_queries.append(entry)
+        logger.warning(f"Slow MongoDB {command_name} on '{collection}' ({duration_ms:.1f}ms): {entry['filter_shape']}")
+
+        if (
+            self._explain and self._loop and not failed
+            and command_name in _EXPLAINABLE_FIELDS
+            and random.random() < self.explain_sample_rate
+        ):
+            explain_command = {command_name: collection}
+            explain_command.update({key: command[key] for key in _EXPLAINABLE_FIELDS[command_name] if key in command})
+            self._loop.call_soon_threadsafe(self._schedule_explain, collection, explain_command, entry)
+
+    @staticmethod
+    def _extract_filter(command_name: str, command: Dict[str, Any]) -> Any:
+        if command_name in _FILTER_FIELDS:
+            return command.get(_FILTER_FIELDS[command_name], {})
+        if command_name in ("update", "delete"):
+            statements = command.get(f"{command_name}s") or []
+            return statements[0].get("q", {}) if statements else {}
+        if command_name == "aggregate":
+            pipeline = command.get("pipeline") or []
+            return pipeline[0].get("$match", {}) if pipeline else {}
+        return {}
+
+    def _schedule_explain(self, collection: str, explain_command: Dict[str, Any], entry: Dict[str, Any]):
+        self._loop.create_task(self._run_explain(collection, explain_command, entry))
+
+    async def _run_explain(self, collection: str, explain_command: Dict[str, Any], entry: Dict[str, Any]):
+        try:
+            plan = summarize_plan(await self._explain(collection, explain_command))
+        except Exception as e:
+            logger.error(f"Error explaining slow query on '{collection}': {e}")
+            return
+        with self._lock:
+            entry["plan"] = plan
+        logger.warning(f"Plan for slow {entry['command']} on '{collection}': {plan}")
+
+    # ========== REPORTING ==========
+
+    def latency_report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns latency statistics per operation, keyed "<collection>.<command>" and ordered
+        by total time spent so the most expensive operations come first.
+        """
+        with self._lock:
+            summaries = {f"{collection}.{command}": histogram.summary() for (collection, command), histogram in self._histograms.items()}
+        return dict(sorted(summaries.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+
+    def slow_queries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Returns the most recent slow queries, newest first."""
+        with self._lock:
+            entries = [dict(entry) for entry in reversed(self._slow_queries)]
+        return entries[:limit] if limit else entries
+
+    def reset(self):
+        """Clears all histograms and the slow-query log."""
+        with self._lock:
+            self._histograms.clear()
+            self._slow_queries.clear()
+
+def summarize_plan(explain_output: Dict[str, Any]) -> str:
+    """
+    Reduces explain output to its winning plan's stage chain, e.g. "FETCH > IXSCAN(guild_id_1)".
+    Handles both find-style output and aggregation output with a $cursor stage.
+    """
+    planner = _find_key(explain_output, "queryPlanner")
+    if not planner:
+        return "unknown"
+    stage = planner.get("winningPlan", {})
+    stage = stage.get("queryPlan", stage)  # Slot-based engine nests the classic plan
+    parts = []
+    while stage:
+        name = stage.get("stage", "?")
+        if stage.get("indexName"):
+            name += f"({stage['indexName']})"
+        parts.append(name)
+        stage = stage.get("inputStage") or (stage.get("inputStages") or [None])[0]
+    return " > ".join(parts) or "unknown"
+
+def _find_key(value: Any, key: str) -> Any:
+    if isinstance(value, dict):
+        if key in value:
+            return value[key]
+        children = value.values()
+    elif isinstance(value, list):
+        children = value
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
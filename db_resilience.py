@@ -0,0 +1,181 @@
+import logging
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, Generic, Optional, TypeVar
+
+from pymongo.errors import (
+    AutoReconnect, ConnectionFailure, ExecutionTimeout, NetworkTimeout, NotPrimaryError,
+    OperationFailure, ServerSelectionTimeoutError, WaitQueueTimeoutError, WTimeoutError
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Server error codes meaning the node refused the operation without applying it
+# (elections, step-downs, shutdowns), so even a write can be sent again.
+_NOT_APPLIED_CODES = {
+    91,     # ShutdownInProgress
+    189,    # PrimarySteppedDown
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+}
+
+class DatabaseUnavailableError(Exception):
+    """
+    Raised by DatabaseManager when MongoDB could not be reached or is unhealthy: retries were
+    exhausted, the error was not worth retrying, or the circuit breaker is open.
+
+    Unlike the None/[]/False a DatabaseManager method returns for "nothing matched", this means
+    the answer is unknown, so callers must not treat it as empty.
+    """
+    pass
+
+class ErrorKind(Enum):
+    """How a driver error should be handled."""
+    NOT_APPLIED = "not_applied"  # Rejected before being applied; safe to retry any operation
+    NETWORK = "network"          # Connection lost mid-operation; a write may or may not have been applied
+    OVERLOADED = "overloaded"    # Server or pool is too slow; retrying would only add load
+    UNREACHABLE = "unreachable"  # No server could be selected; the driver already waited for one
+    PERMANENT = "permanent"      # Query, validation or duplicate key errors; the server itself is healthy
+
+def classify_error(error: BaseException) -> ErrorKind:
+    """Classifies a pymongo exception for the retry policy and circuit breaker."""
+    # Order matters: several of these are subclasses of AutoReconnect/ConnectionFailure.
+    if isinstance(error, ServerSelectionTimeoutError):
+        return ErrorKind.UNREACHABLE
+    if isinstance(error, (WaitQueueTimeoutError, ExecutionTimeout, WTimeoutError)):
+        return ErrorKind.OVERLOADED
+    if isinstance(error, NotPrimaryError):
+        return ErrorKind.NOT_APPLIED
+    if isinstance(error, (AutoReconnect, NetworkTimeout, ConnectionFailure)):
+        return ErrorKind.NETWORK
+    if isinstance(error, OperationFailure):
+        if error.code in _NOT_APPLIED_CODES or error.has_error_label("RetryableWriteError"):
+            return ErrorKind.NOT_APPLIED
+    return ErrorKind.PERMANENT
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter, so that many callers failing
+    at once spread their retries out instead of hitting a recovering primary together.
+    """
+    attempts: int = 3
+    base_delay: float = 0.05
+    max_delay: float = 1.0
+
+    def should_retry(self, kind: ErrorKind, idempotent: bool, attempt: int) -> bool:
+        """
+        Args:
+            kind (ErrorKind): Classification of the error that just occurred.
+            idempotent (bool): Whether running the operation twice is harmless (reads).
+            attempt (int): Number of attempts made so far.
+        """
+        if attempt >= self.attempts:
+            return False
+        if kind == ErrorKind.NOT_APPLIED:
+            return True
+        return kind == ErrorKind.NETWORK and idempotent
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before the next attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """
+    Per-cluster circuit breaker.
+
+    After `failure_threshold` consecutive infrastructure failures the breaker opens and every
+    call fails fast with DatabaseUnavailableError. Once `reset_timeout` seconds have passed a
+    single probe call is let through ("half-open"): success closes the breaker, failure keeps it
+    open for another `reset_timeout`. Permanent errors (e.g. duplicate keys) count as successes,
+    since they prove the server is answering.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raises DatabaseUnavailableError if calls should currently fail fast."""
+        if self.state == self.CLOSED:
+            return
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Let one probe through; restarting the window keeps concurrent callers out until it
+            # reports back, and re-admits a probe if the first one was cancelled.
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return
+        self.rejected += 1
+        raise DatabaseUnavailableError("Database circuit breaker is open.")
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Database circuit breaker closed. MongoDB is reachable again.")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+            if self.state == self.CLOSED:
+                self.times_opened += 1
+                logger.error(f"Database circuit breaker opened after {self.consecutive_failures} consecutive failures.")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+class DbStatus(Enum):
+    OK = "ok"
+    EMPTY = "empty"
+    UNAVAILABLE = "unavailable"
+
+@dataclass(frozen=True)
+class DbResult(Generic[T]):
+    """
+    Explicit outcome of a database call, returned by `DatabaseManager.attempt`, for callers that
+    want to branch on "nothing found" versus "database unavailable" without a try/except.
+    """
+    status: DbStatus
+    value: Optional[T] = None
+    error: Optional[DatabaseUnavailableError] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == DbStatus.OK
+
+    @property
+    def empty(self) -> bool:
+        return self.status == DbStatus.EMPTY
+
+    @property
+    def unavailable(self) -> bool:
+        return self.status == DbStatus.UNAVAILABLE
+
+    @classmethod
+    def of(cls, value: T) -> "DbResult[T]":
+        """Wraps a successful return value; None and empty containers are EMPTY."""
+        if value is None or (isinstance(value, (list, dict, set)) and not value):
+            return cls(DbStatus.EMPTY, value)
+        return cls(DbStatus.OK, value)
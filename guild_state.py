@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import aclosing
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+
+from config import (
+    SETTINGS_COLLECTION, TEAMS_COLLECTION, EMBEDS_COLLECTION, UNREGISTERED_MEMBERS_COLLECTION,
+    GUILD_STATE_SNAPSHOT_PATH, GUILD_STATE_SNAPSHOT_INTERVAL, GUILD_STATE_WATCH_RETRY
+)
+from database import ChangeStreamResumeError, DatabaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Mirrored collections and the field identifying a document within its guild (None: one document per guild)
+MIRRORED_COLLECTIONS: Dict[str, Optional[str]] = {
+    SETTINGS_COLLECTION: None,
+    EMBEDS_COLLECTION: None,
+    TEAMS_COLLECTION: "team_role",
+    UNREGISTERED_MEMBERS_COLLECTION: "user_id",
+}
+
+# Events that change whole collections at once; only a full reload can tell what is left
+RELOAD_OPERATIONS = ("drop", "dropDatabase", "rename", "invalidate")
+
+def _guild_key(guild_id: Any) -> Any:
+    """Embeds store guild IDs as strings, the other collections as ints; the mirror uses ints."""
+    try:
+        return int(guild_id)
+    except (TypeError, ValueError):
+        return guild_id
+
+class GuildStateStore:
+    """
+    In-memory mirror of every guild's settings, embeds, teams and unregistered members, kept
+    current by a single change stream on the database.
+
+    Reads are synchronous and never touch MongoDB, so writes made by other bot instances or shards
+    become visible as soon as their change events arrive. Returned documents are shared and must be
+    treated as read-only.
+
+    The stream's resume token is saved with a snapshot of the mirror to `snapshot_path`. After a
+    restart the snapshot is loaded and the stream resumes where it left off; if the server no
+    longer has that position (or there is no snapshot), the mirror is rebuilt from a full reload.
+    A stream that breaks while running resumes from the last event it applied; one that reports a
+    mirrored collection dropped or renamed is reopened without a resume token, which reloads it.
+    """
+
+    def __init__(self, db, snapshot_path: str = GUILD_STATE_SNAPSHOT_PATH, snapshot_interval: float = GUILD_STATE_SNAPSHOT_INTERVAL,
+                 watch_retry: float = GUILD_STATE_WATCH_RETRY):
+        """
+        Args:
+            db (DatabaseManager): The shared database manager.
+            snapshot_path (str): File for the mirror snapshot and resume token. Empty disables snapshots.
+            snapshot_interval (float): Seconds between snapshots while events are arriving.
+            watch_retry (float): Seconds to wait before re-opening a closed change stream.
+        """
+        self.db = db
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.watch_retry = watch_retry
+        self._guilds: Dict[Any, Dict[str, Dict[Any, Dict[str, Any]]]] = {}
+        self._locations: Dict[Tuple[str, Any], Tuple[Any, Any]] = {}
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._backlog: Optional[List[Dict[str, Any]]] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._snapshot_at = 0.0
+        self._dirty = False
+
+        # Counters exposed through stats()
+        self.events_applied = 0
+        self.full_reloads = 0
+        self.resumes = 0
+        self.last_event_at: Optional[datetime] = None
+
+    # ========== READS ==========
+
+    @property
+    def ready(self) -> bool:
+        """Whether the mirror holds a complete copy of the mirrored collections."""
+        return self._ready.is_set()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the mirror is complete. Returns False if `timeout` seconds passed first."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def get_settings(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        return self._documents(guild_id, SETTINGS_COLLECTION).get(None)
+
+    def get_embeds(self, guild_id: int) -> Dict[str, Any]:
+        """Returns the guild's embeds map (embed name -> embed data)."""
+        doc = self._documents(guild_id, EMBEDS_COLLECTION).get(None)
+        return (doc or {}).get("embeds", {})
+
+    def get_team(self, guild_id: int, team_role: str) -> Optional[Dict[str, Any]]:
+        return self._documents(guild_id, TEAMS_COLLECTION).get(team_role)
+
+    def get_teams(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Returns the guild's team documents in team number order."""
+        teams = self._documents(guild_id, TEAMS_COLLECTION).values()
+        return sorted(teams, key=lambda doc: doc.get("team_number") or 0)
+
+    def get_unregistered_members(self, guild_id: int, role_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Returns the guild's unregistered members, leaders first, optionally restricted to one role type."""
+        members = self._documents(guild_id, UNREGISTERED_MEMBERS_COLLECTION).values()
+        if role_type:
+            members = [doc for doc in members if doc.get("role_type") == role_type]
+        return sorted(members, key=lambda doc: (doc.get("role_type", ""), doc.get("user_id", "")))
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns mirror sizes, event counters and how long ago the last change arrived."""
+        return {
+            "ready": self.ready,
+            "guilds": len(self._guilds),
+            "documents": len(self._locations),
+            "events_applied": self.events_applied,
+            "full_reloads": self.full_reloads,
+            "resumes": self.resumes,
+            "last_event_at": self.last_event_at,
+        }
+
+    def _documents(self, guild_id: int, collection_name: str) -> Dict[Any, Dict[str, Any]]:
+        return self._guilds.get(_guild_key(guild_id), {}).get(collection_name, {})
+
+    # ========== LIFECYCLE ==========
+
+    def start(self):
+        """Loads the snapshot (if any) and starts following the change stream. Safe to call more than once."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stops the change stream listener and saves a final snapshot."""
+        for task in (self._task, self._reload_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._reload_task = None
+        await self.save_snapshot()
+
+    async def _run(self):
+        if await self._load_snapshot():
+            self._ready.set()
+        pipeline = [{"$match": {"ns.coll": {"$in": list(MIRRORED_COLLECTIONS)}}}]
+        while True:
+            resume_after = self._resume_token if self.ready else None
+            reload_needed = False
+            try:
+                changes = self.db.watch(pipeline=pipeline, on_open=lambda: self._on_open(resume_after),
+                                        full_document="updateLookup", resume_after=resume_after)
+                async with aclosing(changes):
+                    async for change in changes:
+                        if not self._on_change(change):
+                            reload_needed = True
+                            break
+                        await self._maybe_snapshot()
+            except ChangeStreamResumeError as e:
+                logger.warning(f"Guild state stream could not resume ({e}). Rebuilding the mirror from a full reload.")
+                self._resume_token = None
+                self._ready.clear()
+                continue
+            if reload_needed:
+                continue
+            # DatabaseManager.watch only returns when the stream could not be opened or broke.
+            logger.warning(f"Guild state change stream closed. Retrying in {self.watch_retry}s.")
+            await asyncio.sleep(self.watch_retry)
+
+    def _on_open(self, resume_after: Optional[Dict[str, Any]]):
+        if resume_after is not None:
+            self.resumes += 1
+            logger.info("Guild state change stream resumed.")
+            return
+        # Events that arrive while the reload runs are held back and applied on top of it.
+        # A reload still running from an earlier stream is superseded by this one.
+        previous = self._reload_task
+        if previous is not None and not previous.done():
+            previous.cancel()
+        self._backlog = []
+        self._reload_task = asyncio.get_running_loop().create_task(self._full_reload(previous))
+
+    # ========== CHANGE EVENTS ==========
+
+    def _on_change(self, change: Dict[str, Any]) -> bool:
+        """Applies or holds back one event. Returns False if the stream must be reopened for a full reload."""
+        if change.get("operationType") in RELOAD_OPERATIONS:
+            logger.warning(f"Guild state stream reported '{change.get('operationType')}' on "
+                           f"'{(change.get('ns') or {}).get('coll')}'. Rebuilding the mirror from a full reload.")
+            self._ready.clear()
+            self._resume_token = None
+            if self._reload_task is not None:
+                self._reload_task.cancel()  # Whatever it loaded may predate the event
+            return False
+        if self._backlog is not None:
+            self._backlog.append(change)
+            return True
+        self._apply(change)
+        return True
+
+    def _apply(self, change: Dict[str, Any]):
+        operation = change.get("operationType")
+        collection_name = (change.get("ns") or {}).get("coll")
+        doc_id = (change.get("documentKey") or {}).get("_id")
+        self._resume_token = change.get("_id")
+        self.events_applied += 1
+        self.last_event_at = change.get("wallTime") or datetime.utcnow()
+        self._dirty = True
+
+        if operation == "delete":
+            self._remove(collection_name, doc_id)
+            return
+        full_document = change.get("fullDocument")
+        if full_document is None:
+            # updateLookup found nothing: the document was deleted after this update
+            self._remove(collection_name, doc_id)
+        else:
+            self._put(collection_name, full_document)
+
+    def _put(self, collection_name: str, doc: Dict[str, Any]):
+        key_field = MIRRORED_COLLECTIONS.get(collection_name, False)
+        if key_field is False or "guild_id" not in doc:
+            return
+        # A document's key can change (e.g. a renamed team), so drop its previous location first
+        self._remove(collection_name, doc.get("_id"))
+        guild_id = _guild_key(doc["guild_id"])
+        key = doc.get(key_field) if key_field else None
+        self._guilds.setdefault(guild_id, {}).setdefault(collection_name, {})[key] = doc
+        self._locations[(collection_name, doc.get("_id"))] = (guild_id, key)
+
+    def _remove(self, collection_name: str, doc_id: Any):
+        location = self._locations.pop((collection_name, doc_id), None)
+        if location is None:
+            return
+        guild_id, key = location
+        documents = self._guilds.get(guild_id, {}).get(collection_name, {})
+        documents.pop(key, None)
+        if not documents:
+            self._guilds.get(guild_id, {}).pop(collection_name, None)
+            if not self._guilds.get(guild_id):
+                self._guilds.pop(guild_id, None)
+
+    # ========== FULL RELOAD ==========
+
+    async def _full_reload(self, previous: Optional[asyncio.Task] = None):
+        """
+        Rebuilds the mirror from the mirrored collections, then applies the events that arrived meanwhile.
+
+        Args:
+            previous (asyncio.Task, optional): An earlier, cancelled reload; it is waited for so the two never interleave.
+        """
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        start = time.perf_counter()
+        try:
+            self._guilds.clear()
+            self._locations.clear()
+            for collection_name in MIRRORED_COLLECTIONS:
+                async for doc in self.db.find_iter(collection_name, {}):
+                    self._put(collection_name, doc)
+        except DatabaseUnavailableError as e:
+            # The stream will break too; the next reload starts over.
+            logger.error(f"Guild state reload failed: {e}")
+            self._backlog = None
+            return
+
+        backlog, self._backlog = self._backlog or [], None
+        for change in backlog:
+            self._apply(change)
+        self.full_reloads += 1
+        self._dirty = True
+        self._ready.set()
+        logger.info(f"Guild state mirror loaded {len(self._locations)} documents across {len(self._guilds)} guilds "
+                    f"in {(time.perf_counter() - start) * 1000:.0f}ms.")
+
+    # ========== SNAPSHOTS ==========
+
+    async def _maybe_snapshot(self):
+        if self._dirty and time.monotonic() - self._snapshot_at >= self.snapshot_interval:
+            await self.save_snapshot()
+
+    async def save_snapshot(self):
+        """Writes the mirror and the resume token of the last applied event to `snapshot_path`."""
+        if not self.snapshot_path or not self.ready or self._resume_token is None:
+            return
+        header = {"resume_token": self._resume_token, "saved_at": datetime.utcnow()}
+        records = [bson.encode(header)]
+        for (collection_name, _), (guild_id, key) in self._locations.items():
+            records.append(bson.encode({"c": collection_name, "d": self._guilds[guild_id][collection_name][key]}))
+        self._snapshot_at = time.monotonic()
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write_snapshot, b"".join(records))
+        except OSError as e:
+            logger.error(f"Failed to save guild state snapshot to '{self.snapshot_path}': {e}")
+
+    def _write_snapshot(self, payload: bytes):
+        temporary = f"{self.snapshot_path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(payload)
+        os.replace(temporary, self.snapshot_path)
+
+    async def _load_snapshot(self) -> bool:
+        """Restores the mirror and resume token from the snapshot file. Returns whether one was loaded."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            records = await asyncio.to_thread(self._read_snapshot)
+        except (OSError, bson.errors.BSONError) as e:
+            logger.error(f"Ignoring unreadable guild state snapshot '{self.snapshot_path}': {e}")
+            return False
+        if not records or "resume_token" not in records[0]:
+            return False
+        for record in records[1:]:
+            self._put(record["c"], record["d"])
+        self._resume_token = records[0]["resume_token"]
+        logger.info(f"Loaded guild state snapshot from {records[0]['saved_at']} with {len(records) - 1} documents.")
+        return True
+
+    def _read_snapshot(self) -> List[Dict[str, Any]]:
+        with open(self.snapshot_path, "rb") as file:
+            return bson.decode_all(file.read())
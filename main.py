@@ -2,9 +2,11 @@ import discord
 from discord.ext import commands
 import sys
 import logging
-from database import DatabaseManager
+from database import DatabaseManager, MigrationError
+from settings_cache import GuildSettingsCache
+from guild_state import GuildStateStore
 import webserver
-from config import DISCORD_TOKEN, MONGO_URI, DB_NAME
+from config import DISCORD_TOKEN, MONGO_URI, DB_NAME, GUILD_STATE_ENABLED
 import os
 
 # Configure logging
@@ -29,12 +31,29 @@ intents.members = True  # Required for team management
 intents.message_content = True  # Required for command processing
 intents.guilds = True  # Required for guild events
 
+class Bot(commands.Bot):
+    async def close(self):
+        """Stops the background services before disconnecting."""
+        await self.settings_cache.stop()
+        if self.guild_state:
+            await self.guild_state.stop()
+        await super().close()
+
 # Initialize bot
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+bot = Bot(command_prefix="!", intents=intents, help_command=None)
 
 # Initialize database with TeamDatabaseManager
 bot.db = DatabaseManager(MONGO_URI, db_name=DB_NAME)
 
+# Set once indexes and migrations are in place; cogs start their background services then (see on_database_ready)
+bot.database_ready = False
+
+# Per-guild settings cache shared by all cogs
+bot.settings_cache = GuildSettingsCache(bot.db)
+
+# Change-stream-fed mirror of every guild's settings, embeds, teams and unregistered members (opt-in)
+bot.guild_state = GuildStateStore(bot.db) if GUILD_STATE_ENABLED else None
+
 async def load_cogs(bot, logger):
     """Load all cogs from the cogs directory, including subdirectories."""
     cogs_dir = "./cogs"
@@ -81,7 +100,23 @@ async def on_ready():
         logger.info(f"Bot logged in as {bot.user.name}#{bot.user.discriminator}")
         logger.info(f"Bot ID: {bot.user.id}")
 
+        bot.db.enable_explain_sampling()
+        bot.settings_cache.start()
         await load_cogs(bot, logger)
+        # Cogs register their indexes and migrations while loading, so this must run after load_cogs
+        await bot.db.ensure_indexes()
+        try:
+            await bot.db.run_migrations()
+        except MigrationError as e:
+            logger.critical(f"Startup aborted, the database schema is not fully migrated: {e}")
+            await bot.close()
+            return
+        # Background services read and write the migrated schema, so they only start now
+        if not bot.database_ready:
+            bot.database_ready = True
+            if bot.guild_state:
+                bot.guild_state.start()
+            bot.dispatch("database_ready")
         logger.info(f"Connected to {len(bot.guilds)} guilds")
 
         synced_global = await bot.tree.sync()
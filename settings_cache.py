@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from config import SETTINGS_COLLECTION, SETTINGS_CACHE_TTL, SETTINGS_CACHE_WATCH_RETRY
+from database import DatabaseUnavailableError, IndexSpec
+
+logger = logging.getLogger(__name__)
+
+class GuildSettingsCache:
+    """
+    In-process, read-through cache of the per-guild settings documents.
+
+    A single instance is shared by every cog (see `bot.settings_cache`). While a change
+    stream on the settings collection is open, cached entries never expire and are dropped
+    as soon as the database reports a change. If change streams are unavailable (e.g. a
+    standalone mongod), entries fall back to a time-to-live instead.
+
+    Returned documents are shared between callers and must be treated as read-only.
+    While the database is unavailable, an expired entry is served rather than failing the lookup.
+    """
+    INDEXES = {
+        SETTINGS_COLLECTION: [
+            IndexSpec("guild_id_unique", (("guild_id", 1),), unique=True),
+        ],
+    }
+
+    def __init__(self, db, ttl: float = SETTINGS_CACHE_TTL, watch_retry: float = SETTINGS_CACHE_WATCH_RETRY):
+        """
+        Args:
+            db (DatabaseManager): The shared database manager.
+            ttl (float): Seconds an entry stays valid while no change stream is active.
+            watch_retry (float): Seconds to wait before re-opening a closed change stream.
+        """
+        self.db = db
+        self.db.register_indexes(self.INDEXES)
+        self.ttl = ttl
+        self.watch_retry = watch_retry
+        self._entries: Dict[int, Tuple[Optional[Dict[str, Any]], float]] = {}
+        self._guild_by_doc_id: Dict[Any, int] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+        self._stream_active = False
+        self._generation = 0
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_served = 0
+
+    # ========== READS ==========
+
+    async def get(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the settings document for a guild, loading it on a miss."""
+        entry = self._entries.get(guild_id)
+        if entry is not None and self._is_fresh(entry):
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        # Coalesce concurrent misses for the same guild into a single find_one.
+        pending = self._pending.get(guild_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[guild_id] = future
+        generation = self._generation
+        try:
+            doc = await self.db.find_one(SETTINGS_COLLECTION, {"guild_id": guild_id})
+            # Skip caching if an invalidation raced with the read; the next lookup reloads.
+            if generation == self._generation:
+                self._store(guild_id, doc)
+            future.set_result(doc)
+            return doc
+        except DatabaseUnavailableError as e:
+            if entry is None:
+                future.set_exception(e)
+                future.exception()
+                raise
+            # Settings change rarely; a stale copy beats failing every command while Mongo recovers.
+            self.stale_served += 1
+            logger.warning(f"Database unavailable, serving stale settings for guild {guild_id}.")
+            future.set_result(entry[0])
+            return entry[0]
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve the exception so a future nobody awaited does not warn on collection.
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(guild_id, None)
+
+    async def get_field(self, guild_id: int, field: str, default: Any = None) -> Any:
+        """Returns a top-level field of the guild's settings document."""
+        doc = await self.get(guild_id)
+        if not doc:
+            return default
+        return doc.get(field, default)
+
+    # ========== INVALIDATION ==========
+
+    def invalidate(self, guild_id: int):
+        """Drops the cached entry for a guild. Called after every local settings write."""
+        self._generation += 1
+        if self._entries.pop(guild_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        """Drops every cached entry."""
+        self._generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._guild_by_doc_id.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the current freshness mode."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_served": self.stale_served,
+            "size": len(self._entries),
+            "mode": "change_stream" if self._stream_active else "ttl",
+        }
+
+    # ========== CHANGE STREAM ==========
+
+    def start(self):
+        """Starts the background change stream listener. Safe to call more than once."""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch_settings())
+
+    async def stop(self):
+        """Stops the change stream listener and reverts to TTL freshness."""
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+        self._watch_task = None
+        self._stream_active = False
+
+    async def _watch_settings(self):
+        """Keeps a change stream open, re-opening it after `watch_retry` seconds if it closes."""
+        while True:
+            async for change in self.db.watch(SETTINGS_COLLECTION, on_open=self._activate_stream):
+                self._handle_change(change)
+
+            # DatabaseManager.watch only returns when the stream could not be opened or broke.
+            if self._stream_active:
+                logger.warning("Settings change stream closed. Falling back to TTL-based settings cache.")
+            self._stream_active = False
+            await asyncio.sleep(self.watch_retry)
+
+    def _activate_stream(self):
+        """Switches to change-stream freshness, discarding entries that may have missed events."""
+        self.clear()
+        self._stream_active = True
+        logger.info("Settings change stream active. Settings cache entries no longer expire.")
+
+    def _handle_change(self, change: Dict[str, Any]):
+        """Invalidates the guild affected by a change stream event."""
+        if change.get("operationType") == "invalidate":
+            self.clear()
+            return
+
+        full_document = change.get("fullDocument") or {}
+        doc_id = (change.get("documentKey") or {}).get("_id")
+        guild_id = full_document.get("guild_id", self._guild_by_doc_id.get(doc_id))
+        if guild_id is not None:
+            self.invalidate(guild_id)
+
+    # ========== INTERNALS ==========
+
+    def _store(self, guild_id: int, doc: Optional[Dict[str, Any]]):
+        self._entries[guild_id] = (doc, time.monotonic())
+        if doc and "_id" in doc:
+            self._guild_by_doc_id[doc["_id"]] = guild_id
+
+    def _is_fresh(self, entry: Tuple[Optional[Dict[str, Any]], float]) -> bool:
+        if self._stream_active:
+            return True
+        return time.monotonic() - entry[1] < self.ttl